@@ -11,6 +11,8 @@ from routes.admin_contact_routes import admin_contact_bp
 from routes.admin_auth_routes import admin_auth_bp  # ← ADDED THIS LINE
 
 app = Flask(__name__)
+# One pooled connection per request, returned at teardown
+DatabaseManager.init_app(app)
 # Configure CORS to allow preflight requests from all origins
 CORS(app, 
      origins="*",
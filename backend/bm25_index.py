@@ -0,0 +1,142 @@
+"""
+BM25 inverted index for FAQ retrieval
+Generates top-k FAQ candidates so the similarity blend in NLPProcessor
+only runs on a handful of FAQs instead of the whole table.
+"""
+
+import heapq
+import math
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        # doc_id -> {term: term frequency}, kept so documents can be removed
+        self.doc_terms: Dict[Hashable, Dict[str, int]] = {}
+        self.doc_lengths: Dict[Hashable, int] = {}
+        self.total_length = 0
+        # Terms whose postings dict this index may edit in place; the others
+        # are shared with a copy() and are copied before their first edit
+        self._owned: set = set()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        return doc_id in self.doc_lengths
+
+    def copy(self) -> "BM25Index":
+        """Copy-on-write copy; editing either index leaves the other untouched.
+
+        Per-term postings are shared until one side edits them, so a copy costs
+        one pointer per term and document instead of every posting.
+        doc_terms entries are never edited in place and are shared as they are.
+        """
+        clone = BM25Index(self.k1, self.b)
+        clone.postings = dict(self.postings)
+        clone.doc_terms = dict(self.doc_terms)
+        clone.doc_lengths = dict(self.doc_lengths)
+        clone.total_length = self.total_length
+        self._owned = set()
+        return clone
+
+    def clear(self):
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0
+        self._owned = set()
+
+    def _own_postings(self, term: str) -> Dict[Hashable, int]:
+        """Postings of term that this index may edit (copied first if shared)."""
+        docs = self.postings.get(term)
+        if docs is None or term not in self._owned:
+            docs = dict(docs or ())
+            self.postings[term] = docs
+            self._owned.add(term)
+        return docs
+
+    # ----------------------------
+    # Indexing
+    # ----------------------------
+    def add_document(self, doc_id: Hashable, tokens: Iterable[str]):
+        """Index a document. Re-adding an existing doc_id replaces it."""
+        if doc_id in self.doc_lengths:
+            self.remove_document(doc_id)
+
+        term_freqs = dict(Counter(tokens))
+        length = sum(term_freqs.values())
+
+        self.doc_terms[doc_id] = term_freqs
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, tf in term_freqs.items():
+            self._own_postings(term)[doc_id] = tf
+
+    def load_postings(self, postings: Dict[str, Dict[Hashable, int]], doc_ids: Iterable[Hashable] = ()):
+        """Replace the index with prebuilt postings (e.g. from an NLP snapshot).
+
+        doc_ids lists every document, so ones without any token still count.
+        """
+        self.clear()
+        self.postings = postings
+        self._owned = set(postings)
+        for doc_id in doc_ids:
+            self.doc_terms[doc_id] = {}
+            self.doc_lengths[doc_id] = 0
+        for term, docs in postings.items():
+            for doc_id, tf in docs.items():
+                self.doc_terms.setdefault(doc_id, {})[term] = tf
+                self.doc_lengths[doc_id] = self.doc_lengths.get(doc_id, 0) + tf
+        self.total_length = sum(self.doc_lengths.values())
+
+    def remove_document(self, doc_id: Hashable) -> bool:
+        term_freqs = self.doc_terms.pop(doc_id, None)
+        if term_freqs is None:
+            return False
+
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+        for term in term_freqs:
+            docs = self.postings.get(term)
+            if docs is None or doc_id not in docs:
+                continue
+            if len(docs) == 1:
+                del self.postings[term]
+                self._owned.discard(term)
+            else:
+                del self._own_postings(term)[doc_id]
+        return True
+
+    # ----------------------------
+    # Scoring
+    # ----------------------------
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_lengths)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query_tokens: Iterable[str], top_k: int = 50) -> List[Tuple[Hashable, float]]:
+        """Return up to top_k (doc_id, score) pairs, best first."""
+        if not self.doc_lengths:
+            return []
+
+        avg_length = self.total_length / len(self.doc_lengths) or 1.0
+        k1 = self.k1
+        b = self.b
+
+        scores: Dict[Hashable, float] = {}
+        for term in set(query_tokens):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in docs.items():
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,153 @@
+"""
+Write-behind queue for chat logs
+/chat hands each exchange to this queue and returns without waiting on
+MySQL; a background thread writes queued rows in batches
+(DatabaseManager.log_chats_batch). The queue is bounded: when it is full
+new rows are dropped and counted rather than slowing requests down. Rows
+still queued at shutdown are written by drain(), registered with atexit.
+"""
+
+import os
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+CHAT_LOG_ASYNC = os.getenv('CHAT_LOG_ASYNC', '1') != '0'
+CHAT_LOG_QUEUE_CAPACITY = int(os.getenv('CHAT_LOG_QUEUE_CAPACITY', '10000'))
+CHAT_LOG_BATCH_SIZE = int(os.getenv('CHAT_LOG_BATCH_SIZE', '200'))
+CHAT_LOG_FLUSH_SECONDS = float(os.getenv('CHAT_LOG_FLUSH_SECONDS', '0.5'))
+# A failed batch is retried this many times before its rows are given up on
+CHAT_LOG_RETRIES = 3
+
+
+class ChatLogQueue:
+    def __init__(self, writer: Callable[[List[tuple]], bool], capacity: int = CHAT_LOG_QUEUE_CAPACITY,
+                 batch_size: int = CHAT_LOG_BATCH_SIZE, flush_seconds: float = CHAT_LOG_FLUSH_SECONDS,
+                 retry_delay: float = 1.0):
+        self._writer = writer
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=capacity)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'written': 0, 'batches': 0, 'dropped': 0, 'failed': 0}
+
+    def _count(self, field: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[field] += n
+
+    def submit(self, user_message: str, bot_response: str, session_id: str = None) -> bool:
+        """Queue one exchange; False (and counted as dropped) if the queue is full or closed."""
+        if self._stopping.is_set():
+            self._count('dropped')
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((user_message, bot_response, session_id, datetime.now()))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='chat-log-writer', daemon=True)
+                    self._thread.start()
+
+    def _take_batch(self, timeout: Optional[float]) -> List[tuple]:
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[tuple]):
+        for attempt in range(CHAT_LOG_RETRIES):
+            try:
+                if self._writer(batch):
+                    self._count('written', len(batch))
+                    self._count('batches')
+                    return
+            except Exception as e:
+                print(f"⚠️ Chat log writer error: {e}")
+            if attempt + 1 < CHAT_LOG_RETRIES and not self._stopping.is_set():
+                time.sleep(self.retry_delay)
+        print(f"❌ Gave up on {len(batch)} chat log rows")
+        self._count('failed', len(batch))
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._take_batch(timeout=self.flush_seconds)
+            if batch:
+                self._write(batch)
+
+    def drain(self, timeout: float = 10.0):
+        """Stop accepting rows and write everything still queued (shutdown hook)."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            batch = self._take_batch(timeout=0)
+            if not batch:
+                break
+            self._write(batch)
+        remaining = self._queue.qsize()
+        if remaining:
+            print(f"⚠️ {remaining} chat log rows not written at shutdown")
+            self._count('dropped', remaining)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return dict(self._stats,
+                        pending=self._queue.qsize(),
+                        capacity=self.capacity,
+                        batch_size=self.batch_size,
+                        running=self._thread is not None and self._thread.is_alive())
+
+
+class _DatabaseWriter:
+    """DatabaseManager.log_chats_batch on a connection owned by the writer
+    thread (connections are not shared between threads), opened on first use."""
+
+    def __init__(self):
+        self._db = None
+
+    def __call__(self, rows: List[tuple]) -> bool:
+        if self._db is None:
+            from database import DatabaseManager
+            self._db = DatabaseManager()
+        return self._db.log_chats_batch(rows)
+
+
+_chat_log_queue = None
+_chat_log_lock = threading.Lock()
+
+
+def get_chat_log_queue() -> Optional[ChatLogQueue]:
+    """The process-wide queue, writing through its own DatabaseManager connection.
+    None when CHAT_LOG_ASYNC=0 (callers then log synchronously)."""
+    global _chat_log_queue
+    if not CHAT_LOG_ASYNC:
+        return None
+    if _chat_log_queue is None:
+        with _chat_log_lock:
+            if _chat_log_queue is None:
+                _chat_log_queue = ChatLogQueue(_DatabaseWriter())
+                atexit.register(_chat_log_queue.drain)
+    return _chat_log_queue
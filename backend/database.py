@@ -1,21 +1,52 @@
+import os
 import mysql.connector
 from mysql.connector import Error, pooling
 import json
+import threading
 from datetime import datetime
 import time
+import atexit
+from contextlib import contextmanager
+from flask import g, has_request_context
+from user_activity import UserActivityTracker
 
 
 class DatabaseManager:
     # Class-level connection pool
     _pool = None
     _pool_name = "lznk_pool"
+    # mysql-connector allows at most 32 connections per pool
+    POOL_SIZE = min(32, int(os.getenv('DB_POOL_SIZE', '5')))
+    # How long a checkout waits for a connection to be returned before giving up
+    POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+    _pool_lock = threading.Lock()
+    _pool_stats = {'checkouts': 0, 'waited': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+                   'timeouts': 0, 'returned': 0, 'in_use': 0}
+    # id() of every connection handed out by _checkout and not yet returned
+    _leased = set()
+
+    # Class-level FAQ cache, shared by every manager in the process (see get_faqs)
+    FAQ_CACHE_TTL = float(os.getenv('FAQ_CACHE_TTL', '30'))
+    _faq_cache = None
+    _faq_cache_version = None
+    _faq_cache_checked = 0.0
+    _faq_cache_lock = threading.Lock()
+    _faq_cache_stats = {'hits': 0, 'version_checks': 0, 'reloads': 0}
+
+    # Class-level session -> user id cache; last_activity writes are batched
+    # (see get_or_create_user / flush_user_activity)
+    _user_activity = UserActivityTracker()
+    _activity_flush_registered = False
+    # Manager owned by the background flusher thread, opened on first use
+    _activity_flusher = None
 
     def __init__(self, host=None, user=None, password=None, database=None):
         self.host = host or 'localhost'
         self.user = user or 'root'
         self.password = password or ''       
         self.database = database or 'lznk_chatbot'
-        self.connection = None
+        # Outside a Flask request; inside one, `connection` is the request's lease
+        self._connection = None
         self.max_retries = 3
         self.retry_delay = 2
 
@@ -23,6 +54,13 @@ class DatabaseManager:
         if DatabaseManager._pool is None:
             self._init_pool()
 
+        # Activity still pending at shutdown is written by the first manager;
+        # until then a background thread writes it every flush interval
+        if not DatabaseManager._activity_flush_registered:
+            DatabaseManager._activity_flush_registered = True
+            atexit.register(self.flush_user_activity, True)
+            DatabaseManager._user_activity.start_flusher(DatabaseManager._flush_from_thread)
+
     # -----------------------------------------------------------
     # INITIALIZE POOL 
     # -----------------------------------------------------------
@@ -33,7 +71,7 @@ class DatabaseManager:
             try:
                 DatabaseManager._pool = pooling.MySQLConnectionPool(
                     pool_name=self._pool_name,
-                    pool_size=5,
+                    pool_size=self.POOL_SIZE,
                     pool_reset_session=True,
                     host=self.host,
                     user=self.user,
@@ -57,21 +95,152 @@ class DatabaseManager:
                     DatabaseManager._pool = None
                     return False
 
+    # -----------------------------------------------------------
+    # CONNECTION LEASES
+    # -----------------------------------------------------------
+    # Inside a Flask request every DatabaseManager shares one pooled connection
+    # leased for that request (kept on flask.g, checked out on first use and
+    # returned by release_request_connection at teardown). Outside a request
+    # (startup, scripts, background threads) each manager keeps its own.
+    @property
+    def connection(self):
+        if has_request_context():
+            return g.get('_db_lease')
+        return getattr(self, '_connection', None)
+
+    @connection.setter
+    def connection(self, conn):
+        # A replaced connection (e.g. reconnecting after it dropped) goes back
+        # to the pool instead of leaking a slot
+        current = self.connection
+        if current is not None and current is not conn:
+            self._return(current)
+        if has_request_context():
+            g._db_lease = conn
+        else:
+            self._connection = conn
+
+    @classmethod
+    def _checkout(cls):
+        """A connection from the pool, waiting up to POOL_TIMEOUT for one to be
+        returned when all POOL_SIZE are in use. Raises PoolError on timeout."""
+        started = time.monotonic()
+        waited = False
+        while True:
+            try:
+                conn = cls._pool.get_connection()
+                break
+            except pooling.PoolError:
+                if time.monotonic() - started >= cls.POOL_TIMEOUT:
+                    with cls._pool_lock:
+                        cls._pool_stats['timeouts'] += 1
+                    raise
+                waited = True
+                time.sleep(0.02)
+        wait = time.monotonic() - started
+        with cls._pool_lock:
+            stats = cls._pool_stats
+            stats['checkouts'] += 1
+            stats['in_use'] += 1
+            cls._leased.add(id(conn))
+            if waited:
+                stats['waited'] += 1
+                stats['wait_seconds'] += wait
+                stats['max_wait_seconds'] = max(stats['max_wait_seconds'], wait)
+        return conn
+
+    @classmethod
+    def _return(cls, conn):
+        """Give a connection back: pooled ones go back to the pool, direct ones are closed."""
+        with cls._pool_lock:
+            leased = id(conn) in cls._leased
+            cls._leased.discard(id(conn))
+            if leased:
+                cls._pool_stats['returned'] += 1
+                cls._pool_stats['in_use'] -= 1
+        if not leased and isinstance(conn, pooling.PooledMySQLConnection):
+            # Already back in the pool; closing it again would make the pool
+            # open an extra connection
+            return
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"⚠️ Error returning connection: {e}")
+
+    @staticmethod
+    def release_request_connection(exc=None):
+        """teardown_request hook: return the request's leased connection to the pool."""
+        conn = g.pop('_db_lease', None)
+        if conn is not None:
+            DatabaseManager._return(conn)
+
+    @classmethod
+    def init_app(cls, app):
+        """Return each request's connection lease when the request ends."""
+        app.teardown_request(cls.release_request_connection)
+
+    @contextmanager
+    def lease(self):
+        """with db.lease() as conn: a connection for the duration of the block.
+
+        Inside a request this is the request's lease (returned at teardown);
+        elsewhere a connection is checked out and returned when the block exits.
+        """
+        if has_request_context():
+            if not self.ensure_connection():
+                raise Error("No database connection available")
+            yield self.connection
+            return
+        if DatabaseManager._pool is None:
+            raise Error("Connection pool not initialized")
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._return(conn)
+
+    @classmethod
+    def pool_stats(cls):
+        with cls._pool_lock:
+            stats = dict(cls._pool_stats)
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats['max_wait_seconds'] = round(stats['max_wait_seconds'], 3)
+        stats.update(pool_size=cls.POOL_SIZE, timeout_seconds=cls.POOL_TIMEOUT,
+                     initialized=cls._pool is not None)
+        return stats
+
     # -----------------------------------------------------------
     # CONNECT FUNCTION 
     # -----------------------------------------------------------
     def connect(self):
-        """Get connection from pool or fallback to direct connection with retry logic."""
+        """Get connection from pool or fallback to direct connection with retry logic.
+
+        Inside a request an already leased, live connection is reused.
+        """
+        if has_request_context():
+            current = self.connection
+            try:
+                if current is not None and current.is_connected():
+                    return True
+            except Exception:
+                pass
+
         retry_count = 0
         
         while retry_count < self.max_retries:
             # 1) Try pool first
             try:
                 if DatabaseManager._pool is not None:
-                    self.connection = DatabaseManager._pool.get_connection()
+                    self.connection = self._checkout()
                     if self.connection.is_connected():
-                        print(f"✅ Connection obtained from pool (attempt {retry_count + 1})")
+                        if not has_request_context():
+                            print(f"✅ Connection obtained from pool (attempt {retry_count + 1})")
                         return True
+            except pooling.PoolError as e:
+                # Every pooled connection is busy: opening direct ones would only
+                # pile more connections onto the server
+                print(f"❌ Connection pool exhausted after {self.POOL_TIMEOUT}s: {e}")
+                return False
             except Exception as e:
                 print(f"⚠️ Pool connection failed (attempt {retry_count + 1}): {e}")
 
@@ -203,6 +372,16 @@ class DatabaseManager:
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
             """)
 
+            # FAQ version counter: bumped by every FAQ write, polled by each
+            # worker's FAQ cache and NLP index (see _faq_version)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS faq_version (
+                    id TINYINT PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0
+                ) ENGINE=InnoDB
+            """)
+            cursor.execute("INSERT IGNORE INTO faq_version (id, version) VALUES (1, 0)")
+
             # Users Table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -530,9 +709,11 @@ class DatabaseManager:
                 INSERT INTO faqs (question, answer, category)
                 VALUES (%s, %s, %s)
             """, faqs)
+            self._bump_faq_version(cursor)
 
             self.connection.commit()
             cursor.close()
+            self.invalidate_faq_cache()
             print(f"✅ {len(faqs)} FAQ inserted successfully")
             return True
 
@@ -542,19 +723,112 @@ class DatabaseManager:
                 self.connection.rollback()
             return False
     
-    def get_faqs(self):
+    def get_faqs(self, force_refresh=False):
+        """All FAQs, served from the process-wide cache.
+
+        Within FAQ_CACHE_TTL seconds the cache is returned without touching the
+        database. After that a cheap version query decides whether the full
+        SELECT is needed, so edits made by other workers show up within one TTL.
+        CRUD in this process invalidates the cache immediately.
+        """
+        cls = DatabaseManager
+        with cls._faq_cache_lock:
+            fresh = time.monotonic() - cls._faq_cache_checked < cls.FAQ_CACHE_TTL
+            if cls._faq_cache is not None and fresh and not force_refresh:
+                cls._faq_cache_stats['hits'] += 1
+                return list(cls._faq_cache)
+
         if not self.ensure_connection():
             return []
         try:
+            self._end_read_snapshot()
             cursor = self.connection.cursor(dictionary=True)
+            version = self._faq_version(cursor)
+            with cls._faq_cache_lock:
+                cls._faq_cache_stats['version_checks'] += 1
+                if cls._faq_cache is not None and version == cls._faq_cache_version and not force_refresh:
+                    cls._faq_cache_checked = time.monotonic()
+                    cursor.close()
+                    return list(cls._faq_cache)
+
             cursor.execute("SELECT * FROM faqs ORDER BY category, question")
             data = cursor.fetchall()
             cursor.close()
-            return data
+            with cls._faq_cache_lock:
+                cls._faq_cache = data
+                cls._faq_cache_version = version
+                cls._faq_cache_checked = time.monotonic()
+                cls._faq_cache_stats['reloads'] += 1
+            return list(data)
         except Error as e:
             print(f"❌ FAQ fetch error: {e}")
             return []
 
+    def faq_version(self):
+        """Current version stamp of the faqs table, or None if the database is unreachable."""
+        if not self.ensure_connection():
+            return None
+        try:
+            self._end_read_snapshot()
+            cursor = self.connection.cursor(dictionary=True)
+            version = self._faq_version(cursor)
+            cursor.close()
+            return version
+        except Error as e:
+            print(f"❌ FAQ version check error: {e}")
+            return None
+
+    def _end_read_snapshot(self):
+        """Let the next read see other workers' commits.
+
+        A manager's own connection may sit in one REPEATABLE READ snapshot
+        indefinitely, so it is committed. A request's lease is shared by every
+        manager and checked out fresh per request, so it is left alone:
+        committing it could cut another manager's transaction in half.
+        """
+        if not has_request_context():
+            self.connection.commit()
+
+    @staticmethod
+    def _faq_version(cursor):
+        """Version of the FAQs: the faq_version counter, bumped in the same
+        transaction as every FAQ write (_bump_faq_version). A primary key read,
+        so it is cheap enough to poll. Databases created before the counter
+        fall back to row count and newest updated_at."""
+        try:
+            cursor.execute("SELECT version FROM faq_version WHERE id = 1")
+            row = cursor.fetchone()
+        except Error:
+            row = None
+        if row:
+            return row['version']
+        cursor.execute("SELECT COUNT(*) AS total, MAX(updated_at) AS updated FROM faqs")
+        row = cursor.fetchone() or {}
+        return (row.get('total'), row.get('updated'))
+
+    @staticmethod
+    def _bump_faq_version(cursor):
+        """Mark the FAQs changed for every worker; call before committing an FAQ write."""
+        try:
+            cursor.execute("UPDATE faq_version SET version = version + 1 WHERE id = 1")
+        except Error as e:
+            print(f"⚠️ Could not bump FAQ version: {e}")
+
+    @classmethod
+    def invalidate_faq_cache(cls):
+        """Drop the cached FAQs; the next get_faqs() reloads them."""
+        with cls._faq_cache_lock:
+            cls._faq_cache = None
+            cls._faq_cache_version = None
+
+    @classmethod
+    def faq_cache_stats(cls):
+        with cls._faq_cache_lock:
+            return dict(cls._faq_cache_stats,
+                        cached=cls._faq_cache is not None,
+                        size=len(cls._faq_cache or []),
+                        ttl=cls.FAQ_CACHE_TTL)
+
     def get_faq_by_id(self, faq_id):
         if not self.ensure_connection():
             return None
@@ -577,9 +851,11 @@ class DatabaseManager:
                 "INSERT INTO faqs (question, answer, category) VALUES (%s, %s, %s)",
                 (q, a, c)
             )
-            self.connection.commit()
             new_id = cursor.lastrowid
+            self._bump_faq_version(cursor)
+            self.connection.commit()
             cursor.close()
+            self.invalidate_faq_cache()
             return new_id
         except Error as e:
             print(f"❌ FAQ create error: {e}")
@@ -596,9 +872,12 @@ class DatabaseManager:
                 UPDATE faqs SET question=%s, answer=%s, category=%s
                 WHERE id_faq=%s
             """, (q, a, c, faq_id))
-            self.connection.commit()
             affected = cursor.rowcount
+            if affected:
+                self._bump_faq_version(cursor)
+            self.connection.commit()
             cursor.close()
+            self.invalidate_faq_cache()
             return affected > 0
         except Error as e:
             print(f"❌ FAQ update error: {e}")
@@ -612,9 +891,12 @@ class DatabaseManager:
         try:
             cursor = self.connection.cursor()
             cursor.execute("DELETE FROM faqs WHERE id_faq=%s", (faq_id,))
-            self.connection.commit()
             affected = cursor.rowcount
+            if affected:
+                self._bump_faq_version(cursor)
+            self.connection.commit()
             cursor.close()
+            self.invalidate_faq_cache()
             return affected > 0
         except Error as e:
             print(f"❌ FAQ delete error: {e}")
@@ -624,10 +906,23 @@ class DatabaseManager:
 
     # USER MANAGEMENT
     def get_or_create_user(self, session_id):
-        """Get or create a user by session_id."""
+        """Get or create a user by session_id.
+
+        Known sessions are answered from the class-level cache without a query;
+        their last_activity is recorded here and written by the flusher thread
+        (or at exit), never on the request path.
+        """
         if not session_id:
             return None
-            
+
+        tracker = DatabaseManager._user_activity
+        user_id = tracker.user_id(session_id)
+        if user_id is not None:
+            tracker.touch(user_id)
+            if tracker.write_through:
+                self.flush_user_activity()
+            return user_id
+
         if not self.ensure_connection():
             print("⚠️ Cannot get/create user - no database connection")
             return None
@@ -640,13 +935,11 @@ class DatabaseManager:
             
             if user_result:
                 user_id = user_result[0]
-                cursor.execute("""
-                    UPDATE users 
-                    SET last_activity = CURRENT_TIMESTAMP 
-                    WHERE id_user = %s
-                """, (user_id,))
-                self.connection.commit()
                 cursor.close()
+                tracker.remember(session_id, user_id)
+                tracker.touch(user_id)
+                if tracker.write_through:
+                    self.flush_user_activity()
                 return user_id
             else:
                 cursor.execute("""
@@ -656,6 +949,7 @@ class DatabaseManager:
                 user_id = cursor.lastrowid
                 self.connection.commit()
                 cursor.close()
+                tracker.remember(session_id, user_id)
                 print(f"✅ Created new user with session_id: {session_id[:8]}... (id: {user_id})")
                 return user_id
                 
@@ -665,6 +959,50 @@ class DatabaseManager:
                 self.connection.rollback()
             return None
 
+    def flush_user_activity(self, force=False):
+        """Write the recorded last_activity times in one transaction.
+
+        Does nothing until USER_ACTIVITY_FLUSH_SECONDS have passed since the
+        last flush, unless force (shutdown). Rows that fail to write are kept
+        for the next flush.
+        """
+        tracker = DatabaseManager._user_activity
+        rows = tracker.take_pending(force)
+        if not rows:
+            return True
+        if not self.ensure_connection():
+            tracker.restore(rows)
+            return False
+        try:
+            cursor = self.connection.cursor()
+            # GREATEST: another worker may already have written a later time
+            cursor.executemany("""
+                UPDATE users SET last_activity = GREATEST(last_activity, %s)
+                WHERE id_user = %s
+            """, rows)
+            self.connection.commit()
+            cursor.close()
+            tracker.flushed(rows)
+            return True
+        except Error as e:
+            print(f"❌ User activity flush error: {e}")
+            if self.connection:
+                self.connection.rollback()
+            tracker.restore(rows)
+            return False
+
+    @staticmethod
+    def _flush_from_thread():
+        """flush_user_activity() on the flusher thread's own manager (connections
+        are not shared between threads)."""
+        if DatabaseManager._activity_flusher is None:
+            DatabaseManager._activity_flusher = DatabaseManager()
+        DatabaseManager._activity_flusher.flush_user_activity()
+
+    @classmethod
+    def user_cache_stats(cls):
+        return cls._user_activity.stats()
+
     def log_chat(self, user_message, bot_response, session_id=None):
         if not self.ensure_connection():
             print("⚠️ Cannot log chat - no database connection")
@@ -689,9 +1027,81 @@ class DatabaseManager:
                 self.connection.rollback()
             return False
 
+    def log_chats_batch(self, rows):
+        """Write many chat log rows at once (used by the background chat log queue).
+
+        rows: (user_message, bot_response, session_id, created_at) tuples.
+        Sessions not in the user cache are inserted and looked up together,
+        then one multi-row INSERT into chat_logs, all in a single transaction.
+        last_activity is recorded for flush_user_activity().
+        """
+        if not rows:
+            return True
+        if not self.ensure_connection():
+            print("⚠️ Cannot log chats - no database connection")
+            return False
+        try:
+            cursor = self.connection.cursor()
+
+            tracker = DatabaseManager._user_activity
+            user_ids = {}
+            last_seen = {}
+            for _, _, session_id, created_at in rows:
+                if session_id:
+                    last_seen[session_id] = max(created_at, last_seen.get(session_id, created_at))
+            unknown = []
+            for session_id in sorted(last_seen):
+                user_id = tracker.user_id(session_id)
+                if user_id is None:
+                    unknown.append(session_id)
+                else:
+                    user_ids[session_id] = user_id
+            if unknown:
+                # New sessions only; last_activity of existing users goes through the tracker
+                cursor.executemany("""
+                    INSERT INTO users (session_id, created_at, last_activity)
+                    VALUES (%s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                    ON DUPLICATE KEY UPDATE session_id = session_id
+                """, [(session_id,) for session_id in unknown])
+                placeholders = ", ".join(["%s"] * len(unknown))
+                cursor.execute(
+                    f"SELECT session_id, id_user FROM users WHERE session_id IN ({placeholders})",
+                    unknown
+                )
+                for session_id, user_id in cursor.fetchall():
+                    tracker.remember(session_id, user_id)
+                    user_ids[session_id] = user_id
+
+            # executemany sends a single multi-row INSERT for this statement shape
+            cursor.executemany("""
+                INSERT INTO chat_logs (id_user, user_message, bot_response, session_id, created_at)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [
+                (user_ids.get(session_id), user_message, bot_response, session_id, created_at)
+                for user_message, bot_response, session_id, created_at in rows
+            ])
+            self.connection.commit()
+            cursor.close()
+            for session_id, user_id in user_ids.items():
+                tracker.touch(user_id, last_seen[session_id])
+            self.flush_user_activity()
+            return True
+        except Error as e:
+            print(f"❌ Chat log batch error: {e}")
+            if self.connection:
+                self.connection.rollback()
+            return False
+
     def close(self):
+        if has_request_context():
+            # Hand the request's lease back early; the next use leases a new one
+            conn = g.pop('_db_lease', None)
+            if conn is not None:
+                self._return(conn)
+            return
         if self.connection and self.connection.is_connected():
-            self.connection.close()
+            self._return(self.connection)
+            self._connection = None
             print("🔒 MySQL connection closed")
 
     def test_connection(self):
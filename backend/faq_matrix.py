@@ -0,0 +1,110 @@
+"""
+Vectorized FAQ scoring matrix (optional NumPy backend for NLPProcessor)
+Stores every FAQ's keyword and word sets as sparse CSR rows so the Jaccard
+terms of the similarity blend are computed for a query's BM25 candidate rows
+(or every row) in one pass.
+"""
+
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+# NumPy is optional; NLPProcessor falls back to the pure Python scorer
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None  # type: ignore
+    NUMPY_AVAILABLE = False
+
+
+class SparseTermMatrix:
+    """One row per term set, stored as CSR (indptr/indices) over a shared vocabulary."""
+
+    def __init__(self, rows: Sequence[FrozenSet[str]]):
+        vocab: Dict[str, int] = {}
+        indices: List[int] = []
+        indptr: List[int] = [0]
+        for terms in rows:
+            for term in terms:
+                indices.append(vocab.setdefault(term, len(vocab)))
+            indptr.append(len(indices))
+
+        self.vocab = vocab
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.row_sizes = np.diff(self.indptr)
+        # Row number of every stored entry, used to sum matches per row
+        self.row_ids = np.repeat(np.arange(len(rows)), self.row_sizes)
+
+    def jaccard(self, query_terms: Iterable[str], rows: "np.ndarray" = None) -> "np.ndarray":
+        """Jaccard similarity of query_terms against the given rows (default: every row)."""
+        query_terms = set(query_terms)
+        if rows is None:
+            row_sizes, row_ids, indices = self.row_sizes, self.row_ids, self.indices
+        else:
+            # Gather only the entries of the requested rows
+            row_sizes = self.row_sizes[rows]
+            row_ids = np.repeat(np.arange(len(rows)), row_sizes)
+            starts = np.repeat(self.indptr[rows] - (np.cumsum(row_sizes) - row_sizes), row_sizes)
+            indices = self.indices[starts + np.arange(len(row_ids))]
+        n_rows = len(row_sizes)
+        scores = np.zeros(n_rows, dtype=np.float64)
+        if not query_terms or not n_rows:
+            return scores
+
+        mask = np.zeros(len(self.vocab), dtype=np.float64)
+        cols = [self.vocab[t] for t in query_terms if t in self.vocab]
+        mask[cols] = 1.0
+
+        intersection = np.bincount(row_ids, weights=mask[indices], minlength=n_rows)
+        union = row_sizes + len(query_terms) - intersection
+        np.divide(intersection, union, out=scores, where=(row_sizes > 0) & (union > 0))
+        return scores
+
+
+class JaccardScores:
+    """Keyword/word Jaccard arrays for one query, indexed by position in the scored rows."""
+
+    def __init__(self, question_keywords, question_words, answer_keywords, answer_words):
+        self.question_keywords = question_keywords
+        self.question_words = question_words
+        self.answer_keywords = answer_keywords
+        self.answer_words = answer_words
+
+    def question(self, row: int) -> Tuple[float, float]:
+        return float(self.question_keywords[row]), float(self.question_words[row])
+
+    def answer(self, row: int) -> Tuple[float, float]:
+        return float(self.answer_keywords[row]), float(self.answer_words[row])
+
+
+class FAQScoringMatrix:
+    def __init__(self, keys: Sequence[Hashable], row_features: Sequence):
+        """keys: FAQ index keys; row_features: the matching FAQFeatures records."""
+        self.keys = list(keys)
+        self.rows: Dict[Hashable, int] = {key: row for row, key in enumerate(self.keys)}
+        self.row_features = list(row_features)
+        self.question_keywords = SparseTermMatrix([f.question.keywords for f in self.row_features])
+        self.question_words = SparseTermMatrix([f.question.words for f in self.row_features])
+        self.answer_keywords = SparseTermMatrix([f.answer.keywords for f in self.row_features])
+        self.answer_words = SparseTermMatrix([f.answer.words for f in self.row_features])
+
+    def __len__(self) -> int:
+        return len(self.row_features)
+
+    def row_of(self, key: Hashable, features) -> Optional[int]:
+        """Row for key, or None if the row was built from different features (stale)."""
+        row = self.rows.get(key)
+        if row is None or self.row_features[row] is not features:
+            return None
+        return row
+
+    def score(self, user_features, rows: Sequence[int] = None) -> JaccardScores:
+        """Jaccard terms for rows (row numbers; default every row), in that order."""
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        return JaccardScores(
+            self.question_keywords.jaccard(user_features.keywords, rows),
+            self.question_words.jaccard(user_features.words, rows),
+            self.answer_keywords.jaccard(user_features.keywords, rows),
+            self.answer_words.jaccard(user_features.words, rows),
+        )
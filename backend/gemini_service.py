@@ -4,278 +4,370 @@ Gemini Service - SMART MODE for ZAKIA Chatbot
 """
 
 import os
+import json
+import time
+import inspect
+import threading
+from collections import deque
+from datetime import datetime
 from dotenv import load_dotenv
 import google.generativeai as genai
 import re
 from typing import Tuple
 
-load_dotenv()
-
-class GeminiService:
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("❌ GEMINI_API_KEY not found in .env")
-
-        genai.configure(api_key=self.api_key)
+from lexicon import WordReplacer
+from llm_cache import cache_key
+from llm_guard import get_gemini_guard
+from prompt_templates import (
+    STRICT_INSTRUCTION, SMART_INSTRUCTION, FAQ_EXAMPLES, SMART_EXAMPLES,
+    topics_for, reference_block, examples_block
+)
 
-        # Try models in order of preference
-        models_to_try = [
-            "gemini-2.5-flash-lite",
-            "gemini-2.5-flash",
-        ]
+load_dotenv()
 
-        self.model = None
+# Standard Malay -> Kedah-style slang for replies
+KEDAH_REPLY_SLANG = WordReplacer({
+    'anda': 'hampa',
+    'saya': 'kami',
+    'apa': 'ape',
+    'boleh': 'boleh',
+    'kerana': 'sebab',
+    'kepada': 'kat',
+    'tak': 'dak',
+    'nanti': 'satgi',
+    'kenapa': 'pasai apa',
+    'hendak': 'nak',
+    'sebab': 'sebab',
+    'sudah': 'dah',
+})
+
+# Candidate models, most preferred first
+GEMINI_MODELS = [name.strip() for name in os.getenv(
+    'GEMINI_MODELS', 'gemini-2.5-flash-lite,gemini-2.5-flash').split(',') if name.strip()]
+# Last working model, reused across restarts without probing
+GEMINI_MODEL_CACHE_FILE = os.getenv('GEMINI_MODEL_CACHE_FILE', '.gemini_model.json')
+GEMINI_MODEL_CACHE_TTL = float(os.getenv('GEMINI_MODEL_CACHE_TTL', '86400'))
+# Seconds between background health probes (0 disables the probe thread)
+GEMINI_PROBE_INTERVAL = float(os.getenv('GEMINI_PROBE_INTERVAL', '300'))
+# After every candidate failed, requests fail fast for this long before retrying
+GEMINI_RETRY_SECONDS = 60
+
+
+class ModelResolver:
+    """Chooses the Gemini model lazily and keeps an eye on it.
+
+    Selection: the model recorded in the cache file if it is recent enough,
+    otherwise probe each candidate with a tiny prompt and record the first
+    that answers. The probe thread makes the first selection off the request
+    path and re-probes periodically, re-selecting if the model stops answering.
+    """
+
+    def __init__(self, candidates=None, cache_file: str = GEMINI_MODEL_CACHE_FILE,
+                 cache_ttl: float = GEMINI_MODEL_CACHE_TTL, probe_interval: float = GEMINI_PROBE_INTERVAL,
+                 model_factory=None):
+        self.candidates = list(candidates or GEMINI_MODELS)
+        self.cache_file = cache_file
+        self.cache_ttl = cache_ttl
+        self.probe_interval = probe_interval
+        self._model_factory = model_factory or genai.GenerativeModel
+        self._model = None
         self.model_name = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self.health = {'status': 'pending', 'source': None, 'checked_at': None, 'error': None}
+
+    def get(self):
+        """The selected model, selecting it now if nothing has yet."""
+        model = self._model
+        if model is None:
+            with self._lock:
+                if self._model is None:
+                    if self._failed_at and time.time() - self._failed_at < GEMINI_RETRY_SECONDS:
+                        raise ValueError("❌ No Gemini models available")
+                    self._select(use_cache=True)
+                model = self._model
+        return model
+
+    def _set_health(self, status: str, source: str = None, error: str = None):
+        self.health = {
+            'status': status,
+            'source': source,
+            'checked_at': datetime.now().isoformat(),
+            'error': error
+        }
 
-        print("🔍 Testing Gemini models...")
+    def _select(self, use_cache: bool):
+        name = self._cached_choice() if use_cache else None
+        if name:
+            self._model, self.model_name = self._model_factory(name), name
+            self._failed_at = None
+            self._set_health('ok', source='cache')
+            print(f"✅ Gemini model from cache: {name}")
+            return
 
-        for model_name in models_to_try:
+        print("🔍 Testing Gemini models...")
+        error = None
+        for name in self.candidates:
             try:
-                test_model = genai.GenerativeModel(model_name)
-                response = test_model.generate_content(
-                    "Say 'OK'",
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.3,
-                        max_output_tokens=50,
-                    )
-                )
-                
-                if response.text:
-                    self.model = test_model
-                    self.model_name = model_name
-                    print(f"✅ Connected to: {model_name}")
-                    break
-
+                model = self._model_factory(name)
+                if self._probe(model):
+                    self._model, self.model_name = model, name
+                    self._failed_at = None
+                    self._save_choice(name)
+                    self._set_health('ok', source='probe')
+                    print(f"✅ Connected to: {name}")
+                    return
             except Exception as e:
-                print(f"   ❌ {model_name}: {str(e)[:100]}")
-
-        if not self.model:
-            raise ValueError("❌ No Gemini models available")
-
-        # Enhanced system context for FAQ mode
-        self.strict_context = """Anda adalah ZAKIA, chatbot rasmi Lembaga Zakat Negeri Kedah (LZNK).
-
-🎯 MISI ANDA: Bantu pengguna faham zakat dengan cara yang MESRA dan MUDAH
-🗣️ Anda boleh faham dialek Kedah dan (jika sesuai) jawab menggunakan sedikit slang Kedah supaya lebih akrab dengan pengguna Kedah.
-📋 PERATURAN KETAT - FAQ MODE:
-
-WAJIB IKUT:
-✅ Tulis semula FAQ dengan bahasa yang lebih mesra dan mudah faham
-✅ KEKALKAN 100% semua fakta, nombor, kadar, dan hukum dari FAQ
-✅ Gunakan emoji yang sesuai untuk setiap topik
-✅ Format dalam bentuk point atau ayat pendek (mudah dibaca)
-✅ Ringkas tetapi lengkap (2-4 ayat)
-
-DILARANG:
-❌ Tambah maklumat baru yang TIDAK ada dalam FAQ
-❌ Ubah atau tukar nombor, peratusan, atau nilai
-❌ Guna kata: "biasanya", "mungkin", "kadang-kadang", "lebih kurang"
-❌ Buat ayat panjang yang susah faham
-
-🎨 EMOJI GUIDE:
-💰 - wang, zakat, bayaran
-📞 - hubungi, telefon
-✅ - betul, wajib, boleh
-❌ - salah, tidak boleh
-📝 - maklumat, dokumen
-🙏 - doa, ibadah
-✨ - penting, khas
-💡 - tips, idea
-🏦 - bank, pembayaran
-📱 - online, apps
-
-✨ CONTOH FORMAT TERBAIK:
-
-FAQ Original: "Nisab zakat pendapatan adalah RM15,000 setahun. Kadar zakat ialah 2.5% daripada pendapatan bersih."
-
-JAWAPAN ANDA:
-"Zakat pendapatan wajib bila pendapatan anda capai RM15,000 setahun ya 😊
-
-📌 Kadar: 2.5% dari pendapatan bersih
-📌 Contoh: Gaji RM20,000/tahun → Zakat = RM500
-
-Senang je kan? 💰✅"
-
-FAQ Original: "Untuk bayar zakat, boleh datang ke pejabat LZNK atau bayar online melalui portal."
-
-JAWAPAN ANDA:
-"Mudah je nak bayar zakat! Ada 2 cara 😊
-
-1️⃣ Datang ke pejabat LZNK
-2️⃣ Bayar online di portal rasmi
-
-Pilih yang paling senang untuk anda! 💻✅"
-"""
-
-        # Enhanced Smart Mode context
-        self.smart_context = """Anda adalah ZAKIA, chatbot pakar zakat dari Lembaga Zakat Negeri Kedah (LZNK).
-
-🎯 MISI ANDA: Jadi penasihat zakat yang MESRA, TEPAT, dan MEMBANTU
-
-💡 SMART MODE - Tiada FAQ Match:
-🗣️ Model juga perlu faham Bahasa Kedah dan boleh membalas menggunakan slang Kedah bila user guna dialek tersebut.
-KUASA ANDA:
-✅ Jawab soalan am tentang zakat berdasarkan hukum Islam yang sahih
-✅ Terangkan jenis-jenis zakat (fitrah, pendapatan, perniagaan, emas, pertanian, saham)
-✅ Bagi pengiraan zakat yang betul dengan contoh jelas
-✅ Jelaskan syarat wajib zakat, nisab, haul, dan kadar
-✅ Bantu pengguna faham konsep zakat dengan mudah
-✅ Bagi nasihat praktikal dan berguna
-✅ Jawab soalan kompleks dengan terperinci
-
-PANDUAN JAWAPAN:
-1️⃣ Mulakan dengan penjelasan ringkas dan jelas
-2️⃣ Sertakan contoh pengiraan jika relevan
-3️⃣ Gunakan emoji untuk mudah faham
-4️⃣ Format dalam bentuk point (mudah dibaca)
-5️⃣ Panjang: 3-6 ayat (bergantung kompleksiti soalan)
-6️⃣ Akhiri dengan tawaran bantuan lanjut jika perlu
-
-📊 MAKLUMAT ZAKAT STANDARD (gunakan bila perlu):
-
-ZAKAT PENDAPATAN:
-• Nisab: Ikut harga emas semasa yang ditetapkan LZNK
-• Kadar: 2.5% dari pendapatan bersih
-• Contoh: Gaji RM36,000/tahun → Zakat = RM900/tahun
-
-ZAKAT EMAS:
-• Nisab: 85 gram emas
-• Haul: 1 tahun (12 bulan Hijrah)
-• Kadar: 2.5% dari nilai emas
-
-ZAKAT WANG SIMPANAN:
-• Nisab: Setara nilai 85g emas (lebih kurang RM18,000+)
-• Haul: 1 tahun
-• Kadar: 2.5% dari jumlah simpanan
-
-ZAKAT PERNIAGAAN:
-• Nisab: Setara nilai 85g emas
-• Haul: 1 tahun
-• Kadar: 2.5% dari (aset semasa + untung - hutang)
-
-ZAKAT FITRAH:
-• Wajib: Setiap Muslim (dewasa & kanak-kanak)
-• Masa: Bulan Ramadan (sebelum Hari Raya)
-• Kadar: Ikut penetapan LZNK setiap tahun
-
-✨ CONTOH JAWAPAN BERKUALITI:
-
-Soalan: "Apa itu haul dalam zakat?"
-
-JAWAPAN TERBAIK:
-"Haul tu maksudnya tempoh genap SETAHUN (12 bulan Hijrah) kita pegang harta tersebut 😊
+                error = str(e)[:100]
+                print(f"   ❌ {name}: {error}")
+
+        self._failed_at = time.time()
+        self._set_health('unavailable', error=error)
+        raise ValueError("❌ No Gemini models available")
+
+    @staticmethod
+    def _probe(model) -> bool:
+        response = model.generate_content(
+            "Say 'OK'",
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.3,
+                max_output_tokens=50,
+            )
+        )
+        return bool(response.text)
 
-📌 Syarat penting untuk zakat harta seperti:
-• Wang simpanan 💰
-• Emas 👑
-• Harta perniagaan 🏪
+    def _cached_choice(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get('model') not in self.candidates:
+            return None
+        if time.time() - cached.get('checked_at', 0) > self.cache_ttl:
+            return None
+        return cached['model']
+
+    def _save_choice(self, name: str):
+        tmp_file = self.cache_file + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'model': name, 'checked_at': time.time()}, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f"⚠️ Could not save Gemini model choice: {e}")
+
+    def start_probe(self):
+        """Start the background probe thread once per process."""
+        if self.probe_interval <= 0 or self._probe_thread is not None:
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name='gemini-probe', daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        try:
+            self.get()
+        except Exception as e:
+            print(f"⚠️ Gemini model selection failed: {e}")
+        while True:
+            time.sleep(self.probe_interval)
+            self.check()
+
+    def check(self) -> bool:
+        """Probe the current model; re-select (ignoring the cache file) if it does not answer."""
+        model = self._model
+        if model is not None:
+            try:
+                if self._probe(model):
+                    self._set_health('ok', source='probe')
+                    return True
+            except Exception as e:
+                print(f"⚠️ Gemini health probe failed for {self.model_name}: {str(e)[:100]}")
+        with self._lock:
+            try:
+                self._select(use_cache=False)
+                return True
+            except Exception:
+                # Keep the previous model, if any: the outage may be temporary
+                return False
 
-Contoh: Kalau anda ada simpanan RM20,000 pada 1 Jan 2024, kena tunggu sampai 1 Jan 2025 (genap setahun) baru wajib kira zakat.
+    def stats(self) -> dict:
+        return dict(self.health, model=self.model_name, candidates=self.candidates,
+                    probe_interval=self.probe_interval)
 
-Senang faham kan? Ada soalan lagi? 😊✅"
 
-Soalan: "Macam mana kira zakat pendapatan?"
+_resolver = None
+_resolver_lock = threading.Lock()
 
-JAWAPAN TERBAIK:
-"Senang je kira zakat pendapatan! 😊 Saya tunjuk cara:
 
-📝 FORMULA:
-Zakat = Pendapatan Bersih × 2.5%
+def get_model_resolver() -> ModelResolver:
+    """The process-wide resolver shared by every GeminiService."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = ModelResolver()
+    return _resolver
 
-💡 CONTOH PENGIRAAN:
-Gaji setahun: RM48,000
-Tolak potongan: RM8,000 (KWSP, cukai, etc)
-Pendapatan bersih: RM40,000
 
-Zakat = RM40,000 × 2.5% = RM1,000/tahun
+# system_instruction arrived in google-generativeai 0.5; on older SDKs the
+# rules are sent inline at the top of the prompt instead
+SUPPORTS_SYSTEM_INSTRUCTION = 'system_instruction' in inspect.signature(genai.GenerativeModel.__init__).parameters
 
-✅ Syarat wajib: Pendapatan bersih mesti capai nisab RM15,456/tahun
 
-Dah faham? Cuba kira untuk pendapatan anda! 💰😊"
+class TokenUsage:
+    """Input/output token counts per prompt mode, from each response's usage_metadata."""
 
-Soalan: "Zakat saham macam mana?"
+    def __init__(self, recent: int = 50):
+        self._lock = threading.Lock()
+        self._modes = {}
+        self._recent = deque(maxlen=recent)
 
-JAWAPAN TERBAIK:
-"Zakat saham ada 2 cara bergantung niat pelaburan anda 😊
+    def record(self, mode: str, usage):
+        if usage is None:
+            return
+        call = {
+            'mode': mode,
+            'input_tokens': getattr(usage, 'prompt_token_count', 0) or 0,
+            'output_tokens': getattr(usage, 'candidates_token_count', 0) or 0,
+            'cached_tokens': getattr(usage, 'cached_content_token_count', 0) or 0,
+            'at': datetime.now().isoformat(timespec='seconds')
+        }
+        with self._lock:
+            totals = self._modes.setdefault(mode, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cached_tokens': 0})
+            totals['calls'] += 1
+            for field in ('input_tokens', 'output_tokens', 'cached_tokens'):
+                totals[field] += call[field]
+            self._recent.append(call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            modes = {
+                mode: dict(totals,
+                           avg_input_tokens=round(totals['input_tokens'] / totals['calls']),
+                           avg_output_tokens=round(totals['output_tokens'] / totals['calls']))
+                for mode, totals in self._modes.items()
+            }
+            return {'modes': modes, 'recent': list(self._recent)}
 
-1️⃣ PELABURAN JANGKA PANJANG (Simpan dapat dividen):
-• Zakat dari dividen sahaja: 10%
-• Contoh: Dapat dividen RM5,000 → Zakat RM500
 
-2️⃣ PELABURAN JUAL BELI (Trading):
-• Zakat dari nilai saham + keuntungan: 2.5%
-• Kira selepas genap 1 tahun (haul)
-• Contoh: Nilai saham RM30,000 → Zakat RM750
+# Token counts of every Gemini call made by this process
+TOKEN_USAGE = TokenUsage()
 
-📌 TIPS: Pastikan nilai saham capai nisab (setara 85g emas)
 
-Ada portfolio saham? Cuba kira mengikut kategori anda! 📈💰"
+class FallbackText(str):
+    """Canned reply returned in place of a Gemini answer (error or failed validation); never cached."""
 
-🎯 BILA SOALAN SPESIFIK TENTANG LZNK KEDAH:
-Jika soalan tentang prosedur khusus, lokasi pejabat, atau perkhidmatan LZNK yang anda tak pasti, cadangkan:
 
-"Untuk maklumat terperinci tentang [topik], saya cadangkan hubungi terus LZNK Kedah ya 😊
+class GeminiService:
+    def __init__(self, model=None, model_name: str = None, guard=None):
+        """model: use this GenerativeModel-like object (e.g. a local fake) instead of probing Gemini.
+        guard: GeminiGuard for admission control (default: the process-wide one)."""
+        self.guard = guard or get_gemini_guard()
+        self._model = model
+        self._model_name = model_name or (type(model).__name__ if model is not None else None)
+        self._resolver = None
+        if model is None:
+            self._connect()
+        self._init_contexts()
+
+    def _connect(self):
+        self.api_key = os.getenv("GEMINI_API_KEY")
+        if not self.api_key:
+            raise ValueError("❌ GEMINI_API_KEY not found in .env")
 
-📞 Talian Bebas Tol: 1800-88-1740
-📱 WhatsApp: 0194181740
-🌐 Portal: https://www.zakatkedah.com.my/
+        genai.configure(api_key=self.api_key)
 
-Mereka boleh bantu dengan lebih detail! ✅"
+        # No network here: the model is chosen on first use, or earlier by the
+        # background probe, and every GeminiService in the process shares it
+        self._resolver = get_model_resolver()
+        self._resolver.start_probe()
+
+    @property
+    def model(self):
+        if self._resolver is None:
+            return self._model
+        return self._resolver.get()
+
+    @property
+    def model_name(self):
+        if self._resolver is None:
+            return self._model_name
+        return self._resolver.model_name
+
+    def _model_for(self, system_instruction: str = None):
+        """(model, inline): the model carrying system_instruction, or for an
+        injected model or an SDK that cannot take one, the model and inline=True."""
+        if system_instruction is None:
+            return self.model, False
+        if self._resolver is None:
+            return self._model, True
+        if not SUPPORTS_SYSTEM_INSTRUCTION:
+            return self.model, True
+        self.model  # resolve the model name first
+        key = (self.model_name, system_instruction)
+        model = self._instruction_models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+            self._instruction_models[key] = model
+        return model, False
+
+    def _generate(self, prompt: str, system_instruction: str = None, mode: str = 'other', **kwargs):
+        """model.generate_content behind the guard (breaker, rate limit, concurrency cap)."""
+        def call():
+            model, inline = self._model_for(system_instruction)
+            text = f"{system_instruction}\n\n{prompt}" if inline else prompt
+            return model.generate_content(text, **kwargs)
+        response = self.guard.call(call)
+        TOKEN_USAGE.record(mode, getattr(response, 'usage_metadata', None))
+        return response
+
+    def model_status(self) -> dict:
+        if self._resolver is None:
+            return {'model': self._model_name, 'status': 'injected'}
+        return self._resolver.stats()
+
+    def _init_contexts(self):
+        # Fixed per-mode rules, sent as the model's system instruction
+        self.strict_context = STRICT_INSTRUCTION
+        self.smart_context = SMART_INSTRUCTION
+        self._instruction_models = {}
+
+        print(f"🎉 Gemini initialized: {self.model_name or 'model chosen on first use'} (ENHANCED MODE)")
 
-❌ JANGAN BUAT:
-• Jawab dengan ragu-ragu ("mungkin", "saya rasa")
-• Bagi nombor atau kadar yang tidak tepat
-• Tolak jawab soalan asas tentang zakat
-• Buat pengguna keliru dengan penjelasan berbelit
-• Lupa sertakan emoji (buat mesej jadi kering!)
+    def _convert_to_kedah_slang(self, text: str) -> str:
+        """Simple word-level replacement to give replies a Kedah flavour."""
+        return KEDAH_REPLY_SLANG(text)
 
-💪 INGAT: Anda adalah PAKAR zakat yang mesra dan membantu!
 
-🗣️ Balas mengguna sedikit SLANG KEDAH bila sesuai dan pengguna menulis dalam dialek.
-"""
+    # Generation settings per mode, shared by the blocking and streaming calls
+    FAQ_GENERATION = dict(temperature=0.3, max_output_tokens=500, top_p=0.8, top_k=40)  # Low for FAQ accuracy
+    SMART_GENERATION = dict(temperature=0.6, max_output_tokens=700, top_p=0.9, top_k=40)  # Balanced for helpful answers
 
-        print(f"🎉 Gemini initialized: {self.model_name} (ENHANCED MODE)")
+    def faq_prompt_fingerprint(self) -> str:
+        """Hash of the FAQ prompt template, generation settings and model, for response cache keys."""
+        template = self._faq_prompt('{question}', '{answer}')
+        return cache_key(self.strict_context, template, sorted(self.FAQ_GENERATION.items()), self.model_name)[:16]
 
-    def _convert_to_kedah_slang(self, text: str) -> str:
-        """Simple word-level replacement to give replies a Kedah flavour."""
-        if not text:
-            return text
-        # map standard Malay words to Kedah-style slang
-        result = text
-        slang_map = {
-            'anda': 'hampa',
-            'saya': 'kami',
-            'apa': 'ape',
-            'boleh': 'boleh',
-            'kerana': 'sebab',
-            'kepada': 'kat',
-            'tak': 'dak',
-            'nanti': 'satgi',
-            'kenapa': 'pasai apa',
-            'hendak': 'nak',
-            'sebab': 'sebab',
-            'sudah': 'dah',
-        }
-        for std, slang in slang_map.items():
-            result = re.sub(rf"\b{std}\b", slang, result, flags=re.IGNORECASE)
-        return result
+    def smart_prompt_fingerprint(self) -> str:
+        """Same as faq_prompt_fingerprint, for the Smart Mode prompt."""
+        template = self._smart_prompt('{question}', None)
+        return cache_key(self.smart_context, template, sorted(self.SMART_GENERATION.items()), self.model_name)[:16]
 
+    def _faq_prompt(self, user_question: str, faq_answer: str, context: dict = None) -> str:
+        # Add context if available
+        context_text = ""
+        if context and isinstance(context, dict):
+            if context.get('matched_keyword'):
+                context_text = f"\n\nKata kunci: {context['matched_keyword']}"
+            if context.get('confidence'):
+                context_text += f"\nKeyakinan: {context['confidence']}"
 
-    def enhance_faq_response(self, user_question: str, faq_answer: str, context: dict = None) -> str:
-        """
-        Enhanced FAQ mode with better formatting and validation
-        """
-        try:
-            # Add context if available
-            context_text = ""
-            if context and isinstance(context, dict):
-                if context.get('matched_keyword'):
-                    context_text = f"\n\nKata kunci: {context['matched_keyword']}"
-                if context.get('confidence'):
-                    context_text += f"\nKeyakinan: {context['confidence']}"
+        topics = topics_for(user_question, (context or {}).get('category'))
+        examples = examples_block(FAQ_EXAMPLES, topics, "✨ CONTOH FORMAT TERBAIK:", default_first=True)
 
-            prompt = f"""{self.strict_context}
+        return f"""{examples.lstrip()}
 
 📥 SOALAN PENGGUNA:
 "{user_question}"
@@ -294,57 +386,52 @@ Mereka boleh bantu dengan lebih detail! ✅"
 
 💬 JAWAPAN MESRA ANDA:
 """
+
+    def enhance_faq_response(self, user_question: str, faq_answer: str, context: dict = None) -> str:
+        """
+        Enhanced FAQ mode with better formatting and validation
+        """
+        try:
+            prompt = self._faq_prompt(user_question, faq_answer, context)
             
-            response = self.model.generate_content(
+            response = self._generate(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,  # Low for FAQ accuracy
-                    max_output_tokens=500,
-                    top_p=0.8,
-                    top_k=40,
-                )
+                system_instruction=self.strict_context,
+                mode='faq',
+                generation_config=genai.types.GenerationConfig(**self.FAQ_GENERATION)
             )
             
             answer = response.text.strip()            # convert to Kedah slang before returning
             answer = self._convert_to_kedah_slang(answer)
-            # Enhanced validation
-            if not self._validate_faq_answer(answer, faq_answer):
-                print("   ⚠️ Validation failed, using FAQ")
-                return self._format_basic_faq(faq_answer)
-            
-            # Ensure minimum quality
-            if len(answer) < 20 or not any(emoji in answer for emoji in ['😊', '💰', '✅', '📌', '💡', '🙏']):
-                return self._format_basic_faq(faq_answer)
-            
-            return answer
+            return self.finalize_faq_answer(answer, faq_answer)
 
         except Exception as e:
             print(f"   ⚠️ Enhancement error: {e}")
-            return self._format_basic_faq(faq_answer)
+            return FallbackText(self._format_basic_faq(faq_answer))
 
-    def answer_zakat_question(self, user_question: str, matched_questions=None, context: dict = None) -> str:
-        """
-        Enhanced Smart Mode with better structure and examples
-        """
-        try:
-            # Build suggestion text
-            suggestion_text = ""
-            if matched_questions and len(matched_questions) > 0:
-                suggestion_text = "\n\n💡 SOALAN BERKAITAN dalam FAQ (untuk rujukan):\n"
-                for i, q in enumerate(matched_questions[:3], 1):
-                    suggestion_text += f"   {i}. {q}\n"
-                suggestion_text += "\nINGAT: Soalan pengguna TIDAK match FAQ ini. Jawab berdasarkan pengetahuan zakat anda."
-
-            # Add context info
-            context_text = ""
-            if context:
-                context_text = "\n\nKONTEKS TAMBAHAN:\n"
-                if context.get('question_type'):
-                    context_text += f"Jenis soalan: {context['question_type']}\n"
-                if context.get('keywords'):
-                    context_text += f"Kata kunci: {', '.join(context['keywords'])}\n"
-
-            prompt = f"""{self.smart_context}
+    def _smart_prompt(self, user_question: str, matched_questions=None, context: dict = None) -> str:
+        # Build suggestion text
+        suggestion_text = ""
+        if matched_questions and len(matched_questions) > 0:
+            suggestion_text = "\n\n💡 SOALAN BERKAITAN dalam FAQ (untuk rujukan):\n"
+            for i, q in enumerate(matched_questions[:3], 1):
+                suggestion_text += f"   {i}. {q}\n"
+            suggestion_text += "\nINGAT: Soalan pengguna TIDAK match FAQ ini. Jawab berdasarkan pengetahuan zakat anda."
+
+        # Add context info
+        context_text = ""
+        if context:
+            context_text = "\n\nKONTEKS TAMBAHAN:\n"
+            if context.get('question_type'):
+                context_text += f"Jenis soalan: {context['question_type']}\n"
+            if context.get('keywords'):
+                context_text += f"Kata kunci: {', '.join(context['keywords'])}\n"
+
+        # Only the reference figures and worked example for this question's topics
+        topics = topics_for(user_question, (context or {}).get('category'))
+        reference = reference_block(topics) + examples_block(SMART_EXAMPLES, topics, "✨ CONTOH JAWAPAN BERKUALITI:")
+
+        return f"""{reference.lstrip()}
 
         📥 SOALAN PENGGUNA:
         "{user_question}"
@@ -370,21 +457,25 @@ Mereka boleh bantu dengan lebih detail! ✅"
         JAWAPAN PAKAR ANDA:
         """
 
-            response = self.model.generate_content(
+    def answer_zakat_question(self, user_question: str, matched_questions=None, context: dict = None) -> str:
+        """
+        Enhanced Smart Mode with better structure and examples
+        """
+        try:
+            prompt = self._smart_prompt(user_question, matched_questions, context)
+
+            response = self._generate(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.6,  # Balanced for helpful answers
-                    max_output_tokens=700,
-                    top_p=0.9,
-                    top_k=40,
-                )
+                system_instruction=self.smart_context,
+                mode='smart',
+                generation_config=genai.types.GenerationConfig(**self.SMART_GENERATION)
             )
             
             answer = response.text.strip()
             
             # Enhanced validation
             if not self._validate_smart_answer(answer, user_question):
-                return self._get_enhanced_fallback(user_question, matched_questions)
+                return FallbackText(self._get_enhanced_fallback(user_question, matched_questions))
             
             # Auto-enhance if needed
             answer = self._post_process_answer(answer, user_question)
@@ -394,7 +485,78 @@ Mereka boleh bantu dengan lebih detail! ✅"
 
         except Exception as e:
             print(f"   ⚠️ Smart answer error: {e}")
-            return self._get_enhanced_fallback(user_question, matched_questions)
+            return FallbackText(self._get_enhanced_fallback(user_question, matched_questions))
+
+    # ----------------------------
+    # Streaming (POST /chat/stream)
+    # ----------------------------
+    def _stream_text(self, prompt: str, generation: dict, system_instruction: str, mode: str,
+                     slang: bool = True):
+        """Yield the reply as Gemini produces it, converted to Kedah slang unless slang is False.
+
+        Text is released up to the last whitespace, so the slang replacer never
+        sees half a word and converting chunk by chunk equals converting the whole.
+        """
+        def start():
+            model, inline = self._model_for(system_instruction)
+            return model.generate_content(
+                f"{system_instruction}\n\n{prompt}" if inline else prompt,
+                generation_config=genai.types.GenerationConfig(**generation),
+                stream=True
+            )
+
+        pending = ""
+        usage = None
+        for chunk in self.guard.stream(start):
+            # Token counts arrive with the stream; the last chunk has the totals
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            try:
+                pending += chunk.text
+            except ValueError:
+                # Chunk without text (e.g. safety metadata only)
+                continue
+            cut = max(pending.rfind(' '), pending.rfind('\n'))
+            if cut >= 0:
+                ready, pending = pending[:cut + 1], pending[cut + 1:]
+                yield self._convert_to_kedah_slang(ready) if slang else ready
+        if pending:
+            yield self._convert_to_kedah_slang(pending) if slang else pending
+        TOKEN_USAGE.record(mode, usage)
+
+    def finalize_faq_answer(self, answer: str, faq_answer: str) -> str:
+        """The enhanced answer if it passes FAQ validation, else FallbackText with
+        the formatted FAQ. Shared by enhance_faq_response and the stream route."""
+        # Enhanced validation
+        if not self._validate_faq_answer(answer, faq_answer):
+            print("   ⚠️ Validation failed, using FAQ")
+            return FallbackText(self._format_basic_faq(faq_answer))
+
+        # Ensure minimum quality
+        if len(answer) < 20 or not any(emoji in answer for emoji in ['😊', '💰', '✅', '📌', '💡', '🙏']):
+            return FallbackText(self._format_basic_faq(faq_answer))
+
+        return answer
+
+    def finalize_smart_answer(self, answer: str, question: str, matched_questions=None) -> str:
+        """answer_zakat_question's validation, post-processing and slang conversion
+        for a streamed answer. answer is the raw model text (stream_zakat_answer):
+        the confusion markers are standard Malay and would miss 'kami tidak tahu'.
+        FallbackText if it fails validation."""
+        if not self._validate_smart_answer(answer, question):
+            return FallbackText(self._get_enhanced_fallback(question, matched_questions))
+        return self._convert_to_kedah_slang(self._post_process_answer(answer, question))
+
+    def stream_faq_response(self, user_question: str, faq_answer: str, context: dict = None):
+        """Streaming enhance_faq_response (validation is left to the caller)."""
+        return self._stream_text(self._faq_prompt(user_question, faq_answer, context), self.FAQ_GENERATION,
+                                 self.strict_context, 'faq')
+
+    def stream_zakat_answer(self, user_question: str, matched_questions=None, context: dict = None):
+        """Streaming answer_zakat_question. Yields the raw model text: the caller shows
+        each chunk through _convert_to_kedah_slang and passes the raw whole to
+        finalize_smart_answer, which validates before converting."""
+        return self._stream_text(self._smart_prompt(user_question, matched_questions, context), self.SMART_GENERATION,
+                                 self.smart_context, 'smart', slang=False)
 
     def _validate_faq_answer(self, answer: str, faq_answer: str) -> bool:
         """Enhanced validation for FAQ answers"""
@@ -613,8 +775,9 @@ Farewell: "Jumpa lagi! 🙏 Jangan segan bertanya bila-bila masa ya 😊"
 BALAS SEKARANG:
 """
             
-            response = self.model.generate_content(
+            response = self._generate(
                 prompt,
+                mode='chat',
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
                     max_output_tokens=150,
@@ -650,8 +813,9 @@ BALAS SEKARANG:
             
             results = []
             for prompt in test_prompts:
-                response = self.model.generate_content(
+                response = self._generate(
                     prompt,
+                    mode='test',
                     generation_config=genai.types.GenerationConfig(
                         temperature=0.3,
                         max_output_tokens=50,
@@ -0,0 +1,142 @@
+"""
+Compiled NLP lexicon (stopwords, typo corrections, synonyms)
+Loads nlp_lexicon.json once per process and compiles it into flat lookup
+tables so keyword extraction does constant-time work per token.
+"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Dict, FrozenSet, List, Tuple
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nlp_lexicon.json')
+
+# Marks the end of a phrase in the phrase trie
+_PHRASE_END = None
+
+
+class CompiledLexicon:
+    def __init__(self, stopwords: List[str], typo_corrections: Dict[str, List[str]],
+                 synonyms: Dict[str, List[str]]):
+        # Raw dictionaries, kept for callers that inspect them
+        self.stopwords: FrozenSet[str] = frozenset(stopwords)
+        self.typo_corrections = typo_corrections
+        self.synonyms = synonyms
+
+        # variant -> correct word (first entry in the file wins, as before)
+        self.typo_map: Dict[str, str] = {}
+        # token trie for multi-word variants such as 'macam mana'
+        self.phrase_trie: Dict = {}
+        for correct, variants in typo_corrections.items():
+            for variant in variants:
+                tokens = variant.lower().split()
+                if len(tokens) == 1:
+                    self.typo_map.setdefault(tokens[0], correct)
+                elif tokens:
+                    node = self.phrase_trie
+                    for token in tokens:
+                        node = node.setdefault(token, {})
+                    node.setdefault(_PHRASE_END, correct)
+
+        self.synonym_map: Dict[str, Tuple[str, ...]] = {
+            word: tuple(expansions) for word, expansions in synonyms.items()
+        }
+
+        # Identifies this exact lexicon, so persisted indexes built with a
+        # different one can be detected
+        canonical = json.dumps([sorted(self.stopwords), typo_corrections, synonyms],
+                               ensure_ascii=False, sort_keys=True)
+        self.fingerprint = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    def correct_tokens(self, words: List[str]) -> List[str]:
+        """Apply phrase (longest match first) and single-word typo corrections."""
+        corrected = []
+        i = 0
+        n = len(words)
+        while i < n:
+            node = self.phrase_trie
+            match = None
+            j = i
+            while j < n and words[j] in node:
+                node = node[words[j]]
+                j += 1
+                if _PHRASE_END in node:
+                    match = (node[_PHRASE_END], j)
+            if match:
+                corrected.append(match[0])
+                i = match[1]
+            else:
+                corrected.append(self.typo_map.get(words[i], words[i]))
+                i += 1
+        return corrected
+
+    def expand_synonyms(self, keywords) -> set:
+        expanded = set(keywords)
+        for kw in list(expanded):
+            expanded.update(self.synonym_map.get(kw, ()))
+        return expanded
+
+
+class WordReplacer:
+    """Replace whole words (case-insensitive) from a mapping in a single regex pass.
+
+    Build instances at import time; the alternation regex is compiled once and
+    replacements are dispatched through a dict lookup.
+    """
+
+    def __init__(self, mapping: Dict[str, str]):
+        self.mapping = {word.lower(): replacement for word, replacement in mapping.items()}
+        # Longest first so overlapping alternatives prefer the full word
+        words = sorted(self.mapping, key=len, reverse=True)
+        self.pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, words)) + r")\b", re.IGNORECASE)
+
+    def __call__(self, text: str) -> str:
+        if not text:
+            return text
+        return self.pattern.sub(lambda m: self.mapping[m.group(0).lower()], text)
+
+
+# path -> (mtime, compiled lexicon)
+_cache: Dict[str, Tuple[float, CompiledLexicon]] = {}
+_cache_lock = threading.Lock()
+
+
+def get_lexicon(path: str = None) -> CompiledLexicon:
+    """Return the compiled lexicon for path, shared by every caller in the process.
+
+    The file's mtime is part of the cache key, so an edited lexicon is picked
+    up by the next NLPProcessor that is created.
+    """
+    path = os.path.abspath(path or os.getenv('NLP_LEXICON_PATH') or DEFAULT_LEXICON_PATH)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = -1.0
+
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, _load(path))
+            _cache[path] = cached
+        return cached[1]
+
+
+def _load(path: str) -> CompiledLexicon:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        print(f"✅ NLP lexicon loaded from {os.path.basename(path)}")
+    except FileNotFoundError:
+        print(f"⚠️ Lexicon file not found: {path}")
+        data = {}
+    except Exception as e:
+        print(f"❌ Error loading lexicon: {e}")
+        data = {}
+
+    return CompiledLexicon(
+        stopwords=data.get('stopwords', []),
+        typo_corrections=data.get('typo_corrections', {}),
+        synonyms=data.get('synonyms', {})
+    )
@@ -0,0 +1,287 @@
+"""
+Response caches for Gemini answers
+
+ResponseCache       FAQ enhancements. Near-identical questions ('apa itu
+                    zakat', 'zakat tu apa') normalize to the same key, so an
+                    enhancement is generated once and then served from here.
+                    In-process LRU with a TTL; LLM_CACHE_DISK_PATH adds an
+                    SQLite tier that survives restarts and is shared by every
+                    worker on the host.
+SmartAnswerCache    Smart Mode answers (no confident FAQ match). Looked up by
+                    similarity instead of an exact key: a paraphrase within
+                    SMART_CACHE_RADIUS of a cached question reuses its answer.
+"""
+
+import os
+import time
+import heapq
+import hashlib
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def cache_key(*parts) -> str:
+    """Stable key from the parts that decide the answer."""
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def content_version(text: str) -> str:
+    """Short hash of an FAQ answer: any edit to the answer gives a new key."""
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()[:12]
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 86400, disk_path: str = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        # key -> (stored_at, reply), least recently used first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._disk = None
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: str):
+        try:
+            self._disk = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, reply TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._disk.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM cache disk tier unavailable ({e}) - memory only")
+            self._disk = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _fresh(self, stored_at: float) -> bool:
+        return time.time() - stored_at <= self.ttl_seconds
+
+    def _remember(self, key: str, stored_at: float, reply: str):
+        self._entries[key] = (stored_at, reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry[0]):
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._disk is not None:
+                try:
+                    row = self._disk.execute(
+                        "SELECT stored_at, reply FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"⚠️ LLM cache disk read failed: {e}")
+                    row = None
+                if row and self._fresh(row[0]):
+                    self._remember(key, row[0], row[1])
+                    self._stats['disk_hits'] += 1
+                    return row[1]
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key: str, reply: str):
+        if not reply:
+            return
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, reply)
+            self._stats['stores'] += 1
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, reply, stored_at) VALUES (?, ?, ?)",
+                        (key, reply, stored_at)
+                    )
+                    # Expired rows are pruned on write so the file stays bounded
+                    self._disk.execute("DELETE FROM llm_cache WHERE stored_at < ?", (stored_at - self.ttl_seconds,))
+                    self._disk.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ LLM cache disk write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                try:
+                    self._disk.execute("DELETE FROM llm_cache")
+                    self._disk.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ LLM cache disk clear failed: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats,
+                        entries=len(self._entries),
+                        max_entries=self.max_entries,
+                        ttl_seconds=self.ttl_seconds,
+                        disk=self.disk_path if self._disk is not None else None)
+
+
+def create_response_cache() -> ResponseCache:
+    """Build the cache from LLM_CACHE_* environment settings."""
+    return ResponseCache(
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '2000')),
+        ttl_seconds=float(os.getenv('LLM_CACHE_TTL_SECONDS', '86400')),
+        disk_path=os.getenv('LLM_CACHE_DISK_PATH') or None
+    )
+
+
+class SmartAnswerCache:
+    """Smart Mode answers keyed by question features rather than exact text.
+
+    features_fn and similarity_fn come from NLPProcessor (text_features /
+    features_similarity), so "close enough" means the same thing here as in
+    FAQ matching. scope separates answers made with different prompts or models.
+    """
+
+    def __init__(self, radius: float = 0.85, max_entries: int = 1000, ttl_seconds: float = 21600,
+                 max_candidates: int = 32):
+        self.radius = radius
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Entries scored per lookup, those sharing the most keywords first
+        self.max_candidates = max_candidates
+        # entry id -> (stored_at, scope, question, features, answer), oldest first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # keyword -> entry ids, so a lookup only scores entries sharing a keyword
+        self._by_keyword: Dict[str, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'purged': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for keyword in entry[3].keywords:
+            ids = self._by_keyword.get(keyword)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._by_keyword[keyword]
+
+    def lookup(self, question: str, scope: str, features_fn: Callable,
+               similarity_fn: Callable) -> Optional[Tuple[str, str, float]]:
+        """(answer, cached question, similarity) of the closest entry within the radius.
+
+        Only the max_candidates entries sharing the most keywords with the
+        question are scored, and scoring runs outside the lock so concurrent
+        lookups and stores do not queue behind it.
+        """
+        features = features_fn(question)
+        now = time.time()
+        with self._lock:
+            shared = Counter()
+            for keyword in features.keywords:
+                shared.update(self._by_keyword.get(keyword, ()))
+            live = []
+            for entry_id, count in shared.items():
+                stored_at, entry_scope = self._entries[entry_id][:2]
+                if now - stored_at > self.ttl_seconds:
+                    self._drop(entry_id)
+                elif entry_scope == scope:
+                    live.append((count, entry_id))
+            candidates = [(entry_id,) + self._entries[entry_id][2:]
+                          for _, entry_id in heapq.nlargest(self.max_candidates, live)]
+
+        best = None
+        for entry_id, cached_question, cached_features, answer in candidates:
+            score = similarity_fn(features, cached_features)
+            if score >= self.radius and (best is None or score > best[2]):
+                best = (answer, cached_question, score, entry_id)
+
+        with self._lock:
+            # A purge may have dropped the entry while it was being scored
+            if best is None or best[3] not in self._entries:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(best[3])
+            self._stats['hits'] += 1
+            return best[:3]
+
+    def store(self, question: str, scope: str, answer: str, features_fn: Callable):
+        if not answer:
+            return
+        features = features_fn(question)
+        if not features.keywords:
+            # Nothing to find it by again
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (time.time(), scope, question, features, answer)
+            for keyword in features.keywords:
+                self._by_keyword.setdefault(keyword, set()).add(entry_id)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def purge(self, contains: str = None) -> int:
+        """Drop every entry, or only those whose question contains `contains`."""
+        with self._lock:
+            if contains:
+                needle = contains.lower()
+                doomed = [i for i, entry in self._entries.items() if needle in entry[2].lower()]
+            else:
+                doomed = list(self._entries)
+            for entry_id in doomed:
+                self._drop(entry_id)
+            self._stats['purged'] += len(doomed)
+            return len(doomed)
+
+    def questions(self, limit: int = 100) -> List[Dict]:
+        """Most recently used entries first, for the admin view."""
+        with self._lock:
+            entries = list(self._entries.values())[-limit:]
+        return [
+            {'question': question, 'answer': answer, 'age_seconds': round(time.time() - stored_at)}
+            for stored_at, _, question, _, answer in reversed(entries)
+        ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats,
+                        entries=len(self._entries),
+                        radius=self.radius,
+                        max_entries=self.max_entries,
+                        max_candidates=self.max_candidates,
+                        ttl_seconds=self.ttl_seconds)
+
+
+_smart_cache: Optional[SmartAnswerCache] = None
+_smart_cache_lock = threading.Lock()
+
+
+def get_smart_answer_cache() -> SmartAnswerCache:
+    """The process-wide Smart Mode cache shared by the chat and admin blueprints."""
+    global _smart_cache
+    if _smart_cache is None:
+        with _smart_cache_lock:
+            if _smart_cache is None:
+                _smart_cache = SmartAnswerCache(
+                    radius=float(os.getenv('SMART_CACHE_RADIUS', '0.85')),
+                    max_entries=int(os.getenv('SMART_CACHE_MAX_ENTRIES', '1000')),
+                    ttl_seconds=float(os.getenv('SMART_CACHE_TTL_SECONDS', '21600')),
+                    max_candidates=int(os.getenv('SMART_CACHE_MAX_CANDIDATES', '32'))
+                )
+    return _smart_cache
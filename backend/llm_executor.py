@@ -0,0 +1,116 @@
+"""
+Deadline-bounded executor for Gemini calls
+Runs LLM calls on a shared thread pool so a request waits at most until its
+deadline; after that the caller falls back to the FAQ answer and the late
+Gemini result is discarded.
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict
+
+GEMINI_DEADLINE_SECONDS = float(os.getenv('GEMINI_DEADLINE_SECONDS', '8'))
+GEMINI_STREAM_DEADLINE_SECONDS = float(os.getenv('GEMINI_STREAM_DEADLINE_SECONDS', '30'))
+GEMINI_MAX_WORKERS = int(os.getenv('GEMINI_MAX_WORKERS', '8'))
+
+_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS, thread_name_prefix='gemini')
+_stats_lock = threading.Lock()
+_stats = {'calls': 0, 'completed': 0, 'timeouts': 0, 'errors': 0}
+
+
+class GeminiTimeout(Exception):
+    """The Gemini call did not finish before the request deadline."""
+
+
+def _count(field: str):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+class LLMDeadline:
+    """One per request: every Gemini call made with it shares the same deadline."""
+
+    def __init__(self, seconds: float = None):
+        self.seconds = GEMINI_DEADLINE_SECONDS if seconds is None else seconds
+        self.expires_at = time.monotonic() + self.seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) on the Gemini pool; raises GeminiTimeout past the deadline."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            _count('timeouts')
+            raise GeminiTimeout(f"deadline of {self.seconds:.1f}s already passed")
+
+        _count('calls')
+        future = _executor.submit(fn, *args, **kwargs)
+        try:
+            result = future.result(timeout=remaining)
+        except FutureTimeout:
+            # Drops it if still queued; a call already in flight finishes on
+            # the pool thread and its result is ignored
+            future.cancel()
+            _count('timeouts')
+            raise GeminiTimeout(f"Gemini did not answer within {self.seconds:.1f}s")
+        except Exception:
+            _count('errors')
+            raise
+        _count('completed')
+        return result
+
+    def stream(self, fn: Callable, *args, **kwargs):
+        """Iterate fn(*args, **kwargs) on the Gemini pool.
+
+        Raises GeminiTimeout if the deadline passes before the next item; the
+        producer stops at its next item once the consumer has gone away.
+        """
+        if self.remaining() <= 0:
+            _count('timeouts')
+            raise GeminiTimeout(f"deadline of {self.seconds:.1f}s already passed")
+
+        items = queue.Queue()
+        stop = threading.Event()
+        finished = object()
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    if stop.is_set():
+                        return
+                    items.put((item, None))
+            except Exception as e:
+                items.put((None, e))
+                return
+            items.put((finished, None))
+
+        _count('calls')
+        _executor.submit(produce)
+        try:
+            while True:
+                try:
+                    item, error = items.get(timeout=self.remaining())
+                except queue.Empty:
+                    _count('timeouts')
+                    raise GeminiTimeout(f"Gemini stream stalled past the {self.seconds:.1f}s deadline")
+                if error is not None:
+                    _count('errors')
+                    raise error
+                if item is finished:
+                    _count('completed')
+                    return
+                yield item
+        finally:
+            stop.set()
+
+
+def executor_stats() -> Dict:
+    with _stats_lock:
+        return dict(_stats,
+                    deadline_seconds=GEMINI_DEADLINE_SECONDS,
+                    stream_deadline_seconds=GEMINI_STREAM_DEADLINE_SECONDS,
+                    max_workers=GEMINI_MAX_WORKERS)
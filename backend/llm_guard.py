@@ -0,0 +1,239 @@
+"""
+Admission control for Gemini calls
+Every GeminiService generate_content call passes through one process-wide
+GeminiGuard, which turns calls away immediately when:
+    - the circuit breaker is open (recent calls kept failing or were too slow)
+    - the token bucket is empty (our own rate limit, below Gemini's quota)
+    - GEMINI_MAX_CONCURRENCY calls are already in flight and no slot frees
+      up within GEMINI_QUEUE_TIMEOUT seconds
+A rejected call raises GeminiUnavailable, so callers fall back to the FAQ
+answer straight away instead of piling up behind a slow or rate-limited API.
+"""
+
+import os
+import time
+import threading
+from typing import Callable, Dict
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', '1'))
+GEMINI_RATE_PER_MINUTE = float(os.getenv('GEMINI_RATE_PER_MINUTE', '120'))  # 0 disables
+GEMINI_RATE_BURST = int(os.getenv('GEMINI_RATE_BURST', '10'))
+GEMINI_BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', '5'))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv('GEMINI_BREAKER_RESET_SECONDS', '30'))
+# A call that succeeds but takes longer than this counts as a failure
+# (for streams: the wait for the first chunk, not the whole answer)
+GEMINI_SLOW_CALL_SECONDS = float(os.getenv('GEMINI_SLOW_CALL_SECONDS', '8'))
+
+
+class GeminiUnavailable(Exception):
+    """The call was not attempted (breaker open, rate limited or too busy)."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Gemini call rejected: {reason}")
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_seconds`, letting one trial call through;
+    half_open -> closed on its success, back to open on its failure."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _current_state(self) -> str:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+        return self.state
+
+    def allows_calls(self) -> bool:
+        """Would a call be let through now? (No side effects; used to skip Gemini up front.)"""
+        with self._lock:
+            state = self._current_state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("✅ Gemini circuit closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"🔌 Gemini circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """The half-open trial was admitted but never ran (rejected further down)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at)), 1)
+            return {
+                'state': state,
+                'consecutive_failures': self.failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_seconds': self.reset_seconds,
+                'retry_in_seconds': retry_in
+            }
+
+
+class GeminiGuard:
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY, queue_timeout: float = GEMINI_QUEUE_TIMEOUT,
+                 rate_per_minute: float = GEMINI_RATE_PER_MINUTE, burst: int = GEMINI_RATE_BURST,
+                 failure_threshold: int = GEMINI_BREAKER_FAILURES, reset_seconds: float = GEMINI_BREAKER_RESET_SECONDS,
+                 slow_call_seconds: float = GEMINI_SLOW_CALL_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'slow_calls': 0,
+                       'rejected_open': 0, 'rejected_rate': 0, 'rejected_busy': 0}
+
+    def _count(self, field: str, delta: int = 1):
+        with self._stats_lock:
+            self._stats[field] += delta
+
+    def allows_calls(self) -> bool:
+        return self.breaker.allows_calls()
+
+    def _admit(self):
+        if not self.breaker.try_acquire():
+            self._count('rejected_open')
+            raise GeminiUnavailable('circuit open')
+        if not self.bucket.try_acquire():
+            self.breaker.release_trial()
+            self._count('rejected_rate')
+            raise GeminiUnavailable('rate limited')
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.breaker.release_trial()
+            self._count('rejected_busy')
+            raise GeminiUnavailable('too many concurrent calls')
+        with self._stats_lock:
+            self._stats['calls'] += 1
+            self._in_flight += 1
+
+    def _finish(self, latency: float, error: Exception = None):
+        with self._stats_lock:
+            self._in_flight -= 1
+        self._slots.release()
+        if error is not None:
+            self._count('failures')
+            self.breaker.record_failure()
+        elif latency > self.slow_call_seconds:
+            self._count('slow_calls')
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) if admitted; GeminiUnavailable otherwise."""
+        self._admit()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._finish(time.monotonic() - started, e)
+            raise
+        self._finish(time.monotonic() - started)
+        return result
+
+    def stream(self, fn: Callable, *args, **kwargs):
+        """Like call() for a streaming fn; the slot is held until the stream ends.
+
+        A long answer that keeps flowing is healthy, so the slow-call rule
+        applies to the wait for the first chunk only.
+        """
+        self._admit()
+        started = time.monotonic()
+        first_chunk = None
+        try:
+            for item in fn(*args, **kwargs):
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - started
+                yield item
+        except GeneratorExit:
+            # Consumer went away (client disconnected or deadline): not Gemini's
+            # fault, unless it was still waiting for the first chunk too long
+            self._finish(first_chunk if first_chunk is not None else time.monotonic() - started)
+            raise
+        except Exception as e:
+            self._finish(time.monotonic() - started, e)
+            raise
+        self._finish(first_chunk if first_chunk is not None else time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats, in_flight=self._in_flight, max_concurrency=self.max_concurrency)
+        stats['breaker'] = self.breaker.stats()
+        return stats
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_gemini_guard() -> GeminiGuard:
+    """The process-wide guard shared by every GeminiService."""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = GeminiGuard()
+    return _guard
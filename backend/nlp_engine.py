@@ -0,0 +1,263 @@
+"""
+Shared NLP engine for ZAKIA Chatbot
+One NLPProcessor per process, used by the chat and admin blueprints and NLPService.
+Index changes are copy-on-write: a writer edits or retrains a fork of the
+current processor and publishes it with a single reference swap, so /chat
+readers never wait for (or see half of) a retrain.
+Every index records the database FAQ version it was built from (also kept
+in the snapshot file). Changes made outside this process (another worker's
+admin edit, a seed or migration, a stale snapshot file) are picked up by
+sync(), which compares that version with the database's at most every
+NLP_FAQ_SYNC_SECONDS; /chat runs it on a background thread
+(sync_in_background) while the current index keeps serving.
+"""
+
+import os
+import time
+import atexit
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from nlp_processor import NLPProcessor
+
+SNAPSHOT_FILE = 'nlp_index.bin'
+TRAINING_FILE = 'training_data.json'
+NLP_FAQ_SYNC_SECONDS = float(os.getenv('NLP_FAQ_SYNC_SECONDS', '30'))
+# Edits are written to the snapshot/training files this long after the last
+# one, so a bulk import rewrites them once rather than once per FAQ (0: at once)
+NLP_PERSIST_DELAY_SECONDS = float(os.getenv('NLP_PERSIST_DELAY_SECONDS', '2'))
+
+
+def _default_processor() -> NLPProcessor:
+    # /chat makes its own Gemini calls under a deadline (llm_executor), so the
+    # shared processor matches FAQs only and never blocks on Gemini itself
+    return NLPProcessor(enable_gemini=False)
+
+
+class NLPEngine:
+    def __init__(self, factory: Callable[[], NLPProcessor] = _default_processor,
+                 snapshot_file: str = SNAPSHOT_FILE, training_file: str = TRAINING_FILE,
+                 sync_seconds: float = NLP_FAQ_SYNC_SECONDS,
+                 persist_delay: float = NLP_PERSIST_DELAY_SECONDS):
+        self._factory = factory
+        self.snapshot_file = snapshot_file
+        self.training_file = training_file
+        self._current: Optional[NLPProcessor] = None
+        # Guards the first load; writers serialize on _write_lock. Readers take no lock.
+        self._init_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self.generation = 0
+        self.swapped_at = None
+        # Last database FAQ version check (None: never checked)
+        self.sync_seconds = sync_seconds
+        self._synced_at = None
+        self._sync_lock = threading.Lock()
+        self._sync_thread = None
+        # Pending file writes (see _persist / flush)
+        self.persist_delay = persist_delay
+        self._dirty = False
+        self._persist_timer = None
+        self._persist_registered = False
+        self._persist_state_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    def get(self) -> NLPProcessor:
+        """Current processor. Hold on to it for the whole request for a consistent view."""
+        processor = self._current
+        if processor is None:
+            with self._init_lock:
+                if self._current is None:
+                    processor = self._factory()
+                    self._load_files(processor)
+                    self._publish(processor)
+                processor = self._current
+        return processor
+
+    def _publish(self, processor: NLPProcessor):
+        # Build the scoring matrix before readers can see the processor
+        processor._ensure_scoring_matrix()
+        self._current = processor
+        self.generation += 1
+        self.swapped_at = datetime.now()
+
+    def _load_files(self, processor: NLPProcessor) -> bool:
+        """Snapshot first, then the JSON export (re-snapshotted for next time)."""
+        if processor.load_snapshot(self.snapshot_file):
+            return True
+        if processor.load_training_data(self.training_file):
+            processor.save_snapshot(self.snapshot_file)
+            return True
+        return False
+
+    def is_trained(self) -> bool:
+        return bool(self.get().faq_store)
+
+    @property
+    def faq_version(self) -> Optional[str]:
+        """Database FAQ version the current index was built from (None: unknown)."""
+        processor = self._current
+        return processor.faq_version if processor is not None else None
+
+    # ----------------------------
+    # Writers
+    # ----------------------------
+    def initialize(self, faq_loader: Callable[[], List[Dict]]) -> bool:
+        """Make sure an index is loaded, training from faq_loader() if no file has one."""
+        with self._write_lock:
+            if self.is_trained():
+                return True
+            faqs = faq_loader()
+            if not faqs:
+                print("⚠️ No FAQ data available for training")
+                return False
+            return self.retrain(faqs)
+
+    def retrain(self, faqs: List[Dict], persist: bool = True, faq_version=None) -> bool:
+        """Train a fresh index off to the side, swap it in and persist it.
+        faq_version is the database FAQ version faqs were read at, if known."""
+        with self._write_lock:
+            fresh = self.get().fork(copy_index=False)
+            if not fresh.train_from_faqs(faqs):
+                return False
+            fresh.faq_version = _version_str(faq_version)
+            self._publish(fresh)
+            if persist:
+                self._persist(fresh)
+        return True
+
+    def _sync_due(self) -> bool:
+        return self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_seconds
+
+    def sync(self, version_fn: Callable[[], object], faq_loader: Callable[[], List[Dict]],
+             on_change: Optional[Callable[[], None]] = None) -> bool:
+        """Retrain from faq_loader() if version_fn() differs from the version the
+        current index (or its snapshot file) was built from, then call on_change().
+        Checked at most once per sync_seconds, by one thread; others keep serving
+        the current index. True if it retrained."""
+        if not self._sync_due():
+            return False
+        if not self._sync_lock.acquire(blocking=False):
+            return False
+        try:
+            if not self._sync_due():
+                return False
+            first_check = self._synced_at is None
+            self._synced_at = time.monotonic()
+            version = _version_str(version_fn())
+            previous = self.get().faq_version
+            if version is None or version == previous:
+                return False
+            faqs = faq_loader()
+            # Only the worker that made an edit rewrites the files, unless the
+            # file this process started from was itself out of date
+            if not faqs or not self.retrain(faqs, persist=first_check, faq_version=version):
+                return False
+            changed = previous is not None
+            print(f"🔄 NLP index synced to database ({len(faqs)} FAQs{', FAQs changed' if changed else ''})")
+            if on_change is not None:
+                on_change()
+            return True
+        except Exception as e:
+            print(f"⚠️ NLP index sync failed: {e}")
+            return False
+        finally:
+            self._sync_lock.release()
+
+    def sync_in_background(self, version_fn: Callable[[], object], faq_loader: Callable[[], List[Dict]],
+                           on_change: Optional[Callable[[], None]] = None) -> bool:
+        """Run sync() on a daemon thread when a check is due, so the request that
+        notices a change never waits for the retrain. True if a check started."""
+        if not self._sync_due() or self._sync_lock.locked():
+            return False
+        if self._sync_thread is not None and self._sync_thread.is_alive():
+            return False
+        # Two requests racing here start two threads; sync() lets only one check
+        self._sync_thread = threading.Thread(target=self.sync, args=(version_fn, faq_loader, on_change),
+                                             name='nlp-faq-sync', daemon=True)
+        self._sync_thread.start()
+        return True
+
+    def update(self, edit: Callable[[NLPProcessor], bool], faq_version=None) -> bool:
+        """Apply edit() (e.g. update_faq/remove_faq) to a copy of the index and swap it in.
+        faq_version is the database FAQ version right after the edit was written:
+        recorded only if it is the one write after the index's version, since a
+        larger jump means another worker's edit this index does not have yet."""
+        with self._write_lock:
+            draft = self.get().fork()
+            changed = edit(draft)
+            if _follows(draft.faq_version, faq_version):
+                draft.faq_version = _version_str(faq_version)
+                changed = True
+            if changed:
+                self._publish(draft)
+                self._persist(draft)
+        return changed
+
+    def _persist(self, processor: NLPProcessor):
+        """Mark the files stale; flush() rewrites them persist_delay seconds later
+        (and at exit), from whatever index is current by then."""
+        with self._persist_state_lock:
+            self._dirty = True
+            if not self._persist_registered:
+                self._persist_registered = True
+                atexit.register(self.flush)
+            if self.persist_delay > 0 and self._persist_timer is None:
+                self._persist_timer = threading.Timer(self.persist_delay, self.flush)
+                self._persist_timer.daemon = True
+                self._persist_timer.start()
+        if self.persist_delay <= 0:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Write the current index to the snapshot and training files if edits are pending."""
+        with self._persist_state_lock:
+            self._persist_timer = None
+            if not self._dirty:
+                return False
+            self._dirty = False
+        # Published processors are never edited, so no write lock is needed
+        processor = self._current
+        with self._file_lock:
+            saved = processor.save_snapshot(self.snapshot_file)
+            saved = processor.save_training_data(self.training_file) and saved
+        if not saved:
+            # Retried by the next edit's flush, or at exit
+            with self._persist_state_lock:
+                self._dirty = True
+        return saved
+
+    def stats(self) -> Dict:
+        return {
+            'generation': self.generation,
+            'swapped_at': self.swapped_at.isoformat() if self.swapped_at else None,
+            'faq_version': self.faq_version,
+            'sync_seconds': self.sync_seconds
+        }
+
+
+def _version_str(version) -> Optional[str]:
+    # Versions are compared as strings, the form the snapshot file stores
+    return str(version) if version is not None else None
+
+
+def _follows(previous, version) -> bool:
+    """version is the FAQ counter one write after previous."""
+    try:
+        return int(version) == int(previous) + 1
+    except (TypeError, ValueError):
+        return False
+
+
+_engine: Optional[NLPEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_nlp_engine() -> NLPEngine:
+    """The process-wide engine shared by every blueprint."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = NLPEngine()
+    return _engine
@@ -2,14 +2,25 @@
 Backend NLP processor with FAQ training, keyword extraction, similarity scoring,
 """
 
+import os
 import re
+import copy
 import json
+import heapq
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from difflib import SequenceMatcher
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, FrozenSet, Hashable, NamedTuple
 from datetime import datetime
-from collections import defaultdict
+from functools import lru_cache, partial
 import unicodedata
 
+from bm25_index import BM25Index
+from faq_matrix import FAQScoringMatrix, NUMPY_AVAILABLE
+from lexicon import CompiledLexicon, WordReplacer, get_lexicon
+from session_store import create_session_store
+import nlp_snapshot
+
 # Try optional import of GeminiService (non-fatal if missing)
 try:
     from gemini_service import GeminiService
@@ -18,103 +29,103 @@ except Exception:
     GEMINI_AVAILABLE = False
     GeminiService = None  # type: ignore
 
+# Kedah slang -> standard Malay, applied before matching
+KEDAH_SLANG_NORMALIZER = WordReplacer({
+    "hang": "hampa",
+    "ape": "apa",
+    "mano": "mana",
+    "tak": "tak",
+    "bleh": "boleh",
+    "kite": "kita",
+    "saye": "kami",
+})
+
+
+class TextFeatures(NamedTuple):
+    """Tokenized view of one piece of text, as used by the similarity scorer."""
+    text: str                    # preprocess_text() output
+    keywords: FrozenSet[str]     # extract_keywords() output (unigrams, bigrams, synonyms)
+    words: FrozenSet[str]        # whitespace tokens of the preprocessed text
+    trigrams: FrozenSet[str]     # character trigrams of text (trigram mode only)
+
+
+class FAQFeatures(NamedTuple):
+    """Precomputed features for one FAQ, built once at training time."""
+    question: TextFeatures
+    answer: TextFeatures
+
+
 class NLPProcessor:
-    def __init__(self, enable_gemini: bool = True):
-        # Training data storage
-        self.training_pairs: List[Dict] = []
-        self.keyword_index: Dict[str, List[int]] = {}
-        
-        # Conversation context
-        self.conversation_history = defaultdict(list)
-        self.context_keywords = defaultdict(dict)
-        
-        # Stopwords (Malay + English)
-        self.stopwords = {
-            'yang', 'dan', 'atau', 'dengan', 'untuk', 'dari', 'ke', 'di', 'pada',
-            'adalah', 'ialah', 'ini', 'itu', 'saya', 'anda', 'kami', 'mereka',
-            'akan', 'telah', 'sudah', 'boleh', 'dapat', 'ada', 'mana', 'bila',
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for','perlu','mesti','kena','perlu','need to','must','required','mandatory'
-        }
-        
-        # Typo corrections
-        self.typo_corrections = {
-            'zakat': ['zakat', 'zakah', 'zakt', 'zkat', 'zaket'],
-            # common Kedah variants
-            'hang': ['hang', 'hange', 'hanggi'],
-            'ape': ['ape', 'ap'],
-            'mano': ['mano', 'manno'],
-            'bayar': ['bayar', 'bayr', 'byr', 'membayar', 'pembayaran', 'pay', 'payment'],
-            'bagaimana': ['bagaimana', 'bgaimana', 'bgmn', 'bagaimanakah', 'mcm mana', 'macam mana', 'how'],
-            'apa': ['apa', 'ap', 'apakah', 'pe', 'what', 'maksud'],
-            'siapa': ['siapa', 'sipa', 'siapakah', 'sape', 'who'],
-            'berapa': ['berapa', 'brp', 'brpa', 'berapakah', 'brape', 'how much', 'how many'],
-            'bila': ['bila', 'bl', 'bilakah', 'bile', 'when'],
-            'mana': ['mana', 'mn', 'manakah', 'mne', 'where'],
-            'kenapa': ['kenapa', 'knp', 'kenapakah', 'nape', 'why','mengapa'],
-            'lznk': ['lznk', 'lembaga zakat', 'lembaga zakat negeri kedah', 'lembaga'],
-            'nisab': ['nisab', 'threshold'],
-            'fitrah': ['fitrah', 'fitr'],
-            'emas': ['emas', 'gold'],
-            'wang': ['wang', 'duit', 'money', 'cash'],
-            'pejabat': ['pejabat', 'office', 'kaunter', 'cawangan', 'branch'],
-            'bantuan': ['bantuan', 'help', 'tolong', 'assist', 'aid'],
-            'mohon': ['mohon', 'apply', 'permohonan', 'application'],
-            'syarat': ['syarat', 'syrt', 'syart'],
-            'khairiat': ['khairiat', 'khairat', 'khairiat', 'kheiriyat'],
-            'saya': ['saya', 'sy', 'aku', 'i', 'me'],
-            'anda': ['anda', 'akau', 'you', 'u'],
-            'kami': ['kami', 'kmi', 'we', 'us'],
-            'mereka': ['mereka', 'mrk', 'they', 'them'],
-            'fidyah': ['fidyah', 'fidyah', 'fidya'],
-        }
-        
-        # Synonyms
-        self.synonyms = {
-            # add a few Kedah slang synonyms to help interpretation
-            'anda': ['anda','hampa'],
-            'apa': ['apa','ape'],
-            'mana': ['mana','mano'],
-            'boleh': ['boleh','bleh'],
-            'tidak': ['tidak','tak'],
-            'cara': ['cara', 'kaedah', 'method', 'bagaimana', 'how', 'steps','cara-cara'],
-            'lokasi': ['lokasi', 'tempat', 'alamat', 'mana', 'location', 'address', 'where'],
-            'waktu': ['waktu', 'masa', 'tempoh', 'bila', 'time', 'when', 'period'],
-            'jumlah': ['jumlah', 'berapa', 'nilai', 'kadar', 'amount', 'rate'],
-            'wajib': ['wajib', 'mesti', 'perlu', 'kena', 'must', 'required', 'mandatory'],
-            'bayar': ['bayar', 'membayar', 'pembayaran', 'selesai', 'pay', 'payment'],
-            'bantuan': ['bantuan', 'help', 'tolong', 'assist', 'aid', 'support'],
-            'pejabat': ['pejabat', 'office', 'kaunter', 'cawangan', 'branch'],
-            'mohon': ['mohon', 'apply', 'permohonan', 'application', 'request'],
-            'kena': ['kena', 'perlu', 'wajib', 'mesti', 'need to', 'must'],
-            'menerima': ['menerima', 'terima', 'dapat', 'receive', 'get', 'obtain'],
-            'sehingga': ['sehingga', 'sampai', 'hingga', 'until', 'up to', 'till'],
-            'segera' :['cepat', 'pantas', 'laju', 'urgent', 'immediately', 'asap'],
-            'informasi': ['info', 'maklumat', 'information', 'details', 'data'],
-            'muallaf':['mualaf','new convert','new muslim','convert', 'convert to islam', 'newly converted','baru convert'],
-            'pembelajaran':['belajar','study','learning','education','pendidikan'],
-            'polisi':['policy','peraturan','rules','guidelines','garis panduan'],
-            'insurans':['insurance','takaful','coverage','protection','insurans', 'insurans takaful','insuran'],
-            'isteri': ['isteri', 'wife', 'spouse', 'pasangan', 'ibu'],
-            'pinjam': ['pinjaman', 'loan', 'borrow', 'hutang', 'debt'],
-            'menampung' : ['tampung','support','sokong','cover','sara'],
-            'Fixed Deposit' : ['fixed deposit','fd','deposit tetap','simpanan tetap','fixed deposit account'],
-            'pinjaman' : ['loan','pinjam','hutang','debt','borrow'],
-            'setahun' : ['setahun','1 tahun','one year','1 year','setahun sekali','once a year' ,'annually', 'satu tahun'],
-            'lewat' : ['lewat','terlewat','late','overdue','delay','terlambat','melewatkan', 'menunda', 'melewatkan'],
-            'faqir': ['fakir', 'poor', 'needy', 'destitute'],
-            'bapa': ['bapa', 'ayah', 'father', 'dad', 'parent'],
-            'saya mempunyai': ['saya ada', 'saya punya' 'i have', 'i own', 'i possess', 'i got'],
-            'khairiat kematian': ['khairat', 'khairiat', 'funeral fund', 'funeral assistance'],
-            'perbezaan': ['perbezaan', 'bezanya', 'difference', 'distinction', 'variety', 'beza'],
-            'apakah' : ['apakah','apa itu','what is','define','meaning of', 'apa itu', 'maksud'],
-            'apa itu' : ['apa itu','apakah','what is','define','meaning of', 'maksud'],
-            'telefon' : ['telefon','no telefon','nombor telefon','phone','phone number','contact number','telefon bimbit','no tel'],
-            'whatsapp' : ['whatsapp','no whatsapp','nombor whatsapp','whatsap','whats app','whatsapps', 'ws' ,'no ws'],
-            # include some Kedah slang equivalents
-            'ape': ['ape','apek','ape?'],
-            'mano': ['mano','manno'],
+    # Question keywords count double in the BM25 document so a hit on the
+    # question outranks the same word buried in a long answer
+    QUESTION_FIELD_WEIGHT = 2
+    # Questions per process pool task in match_batch
+    BATCH_CHUNK_SIZE = 500
+    # Share of scoring matrix rows left stale by edits before it is rebuilt
+    MATRIX_REBUILD_FRACTION = 0.1
     
-        }
+    # Similarity blend weights
+    SEQUENCE_WEIGHT = 0.4
+    KEYWORD_WEIGHT = 0.45
+    WORD_WEIGHT = 0.15
+    
+    def __init__(self, enable_gemini: bool = True, candidate_pool_size: int = 50,
+                 scoring_backend: str = None, similarity_mode: str = None,
+                 lexicon_path: str = None, cache_size: int = None, session_store=None):
+        # Training data storage, keyed by id_faq (see _faq_key)
+        self.faq_store: Dict[Hashable, Dict] = {}
+        self.keyword_index: Dict[str, List[Hashable]] = {}
+        # Keywords whose keyword_index list this processor may edit in place (see fork)
+        self._owned_keywords: set = set()
+        # BM25 retrieval over faq_store keys; only the top candidate_pool_size
+        # hits go through the full similarity blend
+        self.bm25 = BM25Index()
+        self.candidate_pool_size = candidate_pool_size
+        
+        # 'python' scores set overlaps per FAQ; 'numpy' computes the keyword and
+        # word Jaccard terms for every FAQ in one vectorized pass
+        self.scoring_backend = (scoring_backend or os.getenv('NLP_SCORING_BACKEND', 'python')).lower()
+        if self.scoring_backend == 'numpy' and not NUMPY_AVAILABLE:
+            print("⚠️ NumPy not installed — falling back to python scoring backend")
+            self.scoring_backend = 'python'
+        self.scoring_matrix = None
+        # Index edits since the matrix was built (see _ensure_scoring_matrix)
+        self._matrix_stale_rows = 0
+        # Database FAQ version this index was built from (set by NLPEngine)
+        self.faq_version = None
+        
+        # Sequence term of the blend: 'difflib' is the exact SequenceMatcher ratio
+        # (quadratic in text length); 'trigram' is a Dice coefficient over
+        # precomputed character trigrams, linear in text length
+        self.similarity_mode = (similarity_mode or os.getenv('NLP_SIMILARITY_MODE', 'difflib')).lower()
+        if self.similarity_mode not in ('difflib', 'trigram'):
+            print(f"⚠️ Unknown similarity mode '{self.similarity_mode}' — using difflib")
+            self.similarity_mode = 'difflib'
+        
+        # Per-FAQ feature cache keyed by (question, answer) so static FAQ text
+        # is only tokenized once, not on every request
+        self._faq_features: Dict[Tuple[str, str], FAQFeatures] = {}
+        
+        # Conversation context (history + keyword counts per session), bounded
+        # by session count, idle TTL and memory; see session_store
+        self.sessions = session_store if session_store is not None else create_session_store()
+        
+        # Stopwords, typo corrections and synonyms live in nlp_lexicon.json and
+        # are compiled once per process into flat lookup tables
+        self.lexicon = get_lexicon(lexicon_path)
+        self.stopwords = self.lexicon.stopwords
+        self.typo_corrections = self.lexicon.typo_corrections
+        self.synonyms = self.lexicon.synonyms
+        
+        # preprocess_text/extract_keywords are pure for a given lexicon, and the
+        # same message passes through them several times per request; memoize
+        # them with bounded, thread-safe LRU caches. The cached functions take
+        # the lexicon rather than self, so forks share the caches (the lexicon
+        # is shared too) without keeping this processor's index alive.
+        if cache_size is None:
+            cache_size = int(os.getenv('NLP_CACHE_SIZE', '4096'))
+        self._preprocess_cached = lru_cache(maxsize=cache_size)(self._preprocess_text_uncached)
+        self._keywords_cached = lru_cache(maxsize=cache_size)(partial(self._extract_keywords_uncached, self.lexicon))
         
         # Optional Gemini integration
         self.gemini = None
@@ -134,140 +145,307 @@ class NLPProcessor:
     # ----------------------------
     # Utilities
     # ----------------------------
-    def _normalize_unicode(self, text: str) -> str:
+    @staticmethod
+    def _normalize_unicode(text: str) -> str:
         nfkd = unicodedata.normalize('NFKD', text)
         return ''.join([c for c in nfkd if not unicodedata.combining(c)])
 
-    def _normalize_kedah_slang(self, text: str) -> str:
+    @staticmethod
+    def _normalize_kedah_slang(text: str) -> str:
         """Replace common Kedah slang terms with their standard equivalents for processing."""
-        if not text:
-            return text
-        slang_map = {
-            r"\bhang\b": "hampa",
-            r"\bape\b": "apa",
-            r"\bmano\b": "mana",
-            r"\btak\b": "tak",
-            r"\bbleh\b": "boleh",
-            r"\bkite\b": "kita",
-            r"\bsaye\b": "kami",
-        }
-        result = text
-        for pattern, std in slang_map.items():
-            result = re.sub(pattern, std, result, flags=re.IGNORECASE)
-        return result
+        return KEDAH_SLANG_NORMALIZER(text)
     
     # ----------------------------
     # Training
     # ----------------------------
+    @property
+    def training_pairs(self) -> List[Dict]:
+        return list(self.faq_store.values())
+    
+    @staticmethod
+    def _faq_key(faq: Dict, position: int) -> Hashable:
+        """FAQs are keyed by id_faq; legacy records without one fall back to their position."""
+        faq_id = faq.get('id_faq')
+        return faq_id if faq_id is not None else position
+    
     def train_from_faqs(self, faqs: List[Dict]) -> bool:
         print(f"🎓 Training NLP with {len(faqs)} FAQs...")
         
-        self.training_pairs = []
-        self.keyword_index = {}
+        self._reset_index()
         
         if not faqs:
             print("⚠️ No FAQs provided for training")
             return False
         
-        for faq in faqs:
-            question = faq.get('question', '')
-            answer = faq.get('answer', '')
-            category = faq.get('category', 'Umum')
-            
-            if not question or not answer:
-                continue
-            
-            keywords = self.extract_keywords(question)
-            
-            self.training_pairs.append({
-                'question': question,
-                'answer': answer,
-                'category': category,
-                'keywords': keywords
-            })
-            
-            for keyword in keywords:
-                if keyword not in self.keyword_index:
-                    self.keyword_index[keyword] = []
-                self.keyword_index[keyword].append(len(self.training_pairs) - 1)
+        for position, faq in enumerate(faqs):
+            self._index_faq(self._faq_key(faq, position), faq)
+        
+        print(f"Training complete! Pairs: {len(self.faq_store)}, Unique keywords: {len(self.keyword_index)}")
+        return True
+    
+    def fork(self, copy_index: bool = True) -> "NLPProcessor":
+        """New processor sharing this one's sessions, lexicon, caches and Gemini.
+        
+        The index is copied (or left empty when copy_index is False), so the
+        fork can be edited or retrained while readers keep using this one.
+        The copy is copy-on-write: keyword lists and BM25 postings stay shared
+        until the fork edits them, so forking for one FAQ edit is cheap.
+        """
+        clone = copy.copy(self)
+        if copy_index:
+            clone.faq_store = dict(self.faq_store)
+            clone.keyword_index = dict(self.keyword_index)
+            clone._owned_keywords = set()
+            self._owned_keywords = set()
+            clone._faq_features = dict(self._faq_features)
+            clone.bm25 = self.bm25.copy()
+        else:
+            clone._reset_index()
+        return clone
+    
+    def _reset_index(self):
+        # Fresh containers rather than clear(): a fork may still share the old ones
+        self.faq_store = {}
+        self.keyword_index = {}
+        self._owned_keywords = set()
+        self._faq_features = {}
+        self.bm25 = BM25Index(self.bm25.k1, self.bm25.b)
+        self.scoring_matrix = None
+        self._matrix_stale_rows = 0
+        self.faq_version = None
+    
+    def _index_faq(self, key: Hashable, faq: Dict) -> bool:
+        question = faq.get('question', '')
+        answer = faq.get('answer', '')
+        category = faq.get('category', 'Umum')
+        
+        if key in self.faq_store:
+            self._unindex_faq(key)
+        
+        if not question or not answer:
+            return False
+        
+        features = self._get_faq_features(faq)
+        keywords = sorted(features.question.keywords)
+        
+        self.faq_store[key] = {
+            'id_faq': faq.get('id_faq'),
+            'question': question,
+            'answer': answer,
+            'category': category,
+            'keywords': keywords
+        }
+        
+        for keyword in keywords:
+            self._own_keyword_keys(keyword).append(key)
+        
+        self.bm25.add_document(key, self._bm25_tokens(features))
+        self._matrix_stale_rows += 1
+        return True
+    
+    def _own_keyword_keys(self, keyword: str) -> List[Hashable]:
+        """keyword_index list this processor may edit (copied first if a fork shares it)."""
+        keys = self.keyword_index.get(keyword)
+        if keys is None or keyword not in self._owned_keywords:
+            keys = list(keys or ())
+            self.keyword_index[keyword] = keys
+            self._owned_keywords.add(keyword)
+        return keys
+    
+    def _unindex_faq(self, key: Hashable) -> bool:
+        pair = self.faq_store.pop(key, None)
+        if pair is None:
+            return False
+        
+        for keyword in pair['keywords']:
+            keys = self.keyword_index.get(keyword)
+            if keys and key in keys:
+                if len(keys) == 1:
+                    del self.keyword_index[keyword]
+                    self._owned_keywords.discard(keyword)
+                else:
+                    self._own_keyword_keys(keyword).remove(key)
         
-        print(f"Training complete! Pairs: {len(self.training_pairs)}, Unique keywords: {len(self.keyword_index)}")
+        self.bm25.remove_document(key)
+        self._faq_features.pop((pair['question'], pair['answer']), None)
+        self._matrix_stale_rows += 1
         return True
     
+    # ----------------------------
+    # Incremental index updates (admin FAQ CRUD)
+    # ----------------------------
+    def add_faq(self, faq: Dict) -> bool:
+        """Index one FAQ by its id_faq without retraining the rest."""
+        if faq.get('id_faq') is None:
+            print("⚠️ Cannot index FAQ without id_faq")
+            return False
+        return self._index_faq(faq['id_faq'], faq)
+    
+    def update_faq(self, faq: Dict) -> bool:
+        """Re-index one FAQ in place; only its own postings change."""
+        return self.add_faq(faq)
+    
+    def remove_faq(self, faq_id) -> bool:
+        return self._unindex_faq(faq_id)
+    
     # ----------------------------
     # Keyword extraction
     # ----------------------------
     def extract_keywords(self, text: str) -> List[str]:
+        return list(self._keywords_cached(text))
+    
+    @staticmethod
+    def _extract_keywords_uncached(lexicon: CompiledLexicon, text: str) -> Tuple[str, ...]:
         if not text:
-            return []
+            return ()
         
-        text = self._normalize_unicode(text)
+        text = NLPProcessor._normalize_unicode(text)
         text = text.lower().strip()
         text = re.sub(r'[^\w\s]', ' ', text)
         text = re.sub(r'\s+', ' ', text)
         
         words = text.split()
+        corrected_words = lexicon.correct_tokens(words)
         
-        corrected_words = []
-        for word in words:
-            corrected = word
-            for correct, variants in self.typo_corrections.items():
-                if word in variants:
-                    corrected = correct
-                    break
-            corrected_words.append(corrected)
-        
-        keywords = [w for w in corrected_words if w not in self.stopwords and len(w) > 2]
+        keywords = [w for w in corrected_words if w not in lexicon.stopwords and len(w) > 2]
         
         bigrams = []
         for i in range(len(keywords) - 1):
             bigram = f"{keywords[i]} {keywords[i+1]}"
             bigrams.append(bigram)
         
-        expanded = set(keywords + bigrams)
-        for kw in list(expanded):
-            if kw in self.synonyms:
-                expanded.update(self.synonyms[kw])
+        expanded = lexicon.expand_synonyms(keywords + bigrams)
         
-        return list(expanded)
+        return tuple(expanded)
     
     # ----------------------------
     # Preprocessing & similarity
     # ----------------------------
     def preprocess_text(self, text: str) -> str:
+        return self._preprocess_cached(text)
+    
+    def normalize_question(self, text: str) -> str:
+        """Order-insensitive form of a question for cache keys ('apa itu zakat' == 'zakat tu apa')."""
+        words = re.sub(r'[^\w\s]', ' ', self.preprocess_text(text)).split()
+        return ' '.join(sorted({w for w in self.lexicon.correct_tokens(words) if w not in self.stopwords and len(w) > 2}))
+    
+    @staticmethod
+    def _preprocess_text_uncached(text: str) -> str:
         if not text:
             return ""
-        text = self._normalize_unicode(text)
+        text = NLPProcessor._normalize_unicode(text)
         text = text.lower().strip()
         # convert Kedah slang words to standard Malay before further processing
-        text = self._normalize_kedah_slang(text)
+        text = NLPProcessor._normalize_kedah_slang(text)
         text = re.sub(r'[^\w\s\?]', ' ', text)
         text = re.sub(r'\s+', ' ', text).strip()
         return text
     
+    def _text_features(self, text: str) -> TextFeatures:
+        processed = self.preprocess_text(text)
+        return TextFeatures(
+            text=processed,
+            keywords=frozenset(self._keywords_cached(text)),
+            words=frozenset(processed.split()),
+            trigrams=self._char_trigrams(processed) if self.similarity_mode == 'trigram' else frozenset()
+        )
+    
+    @staticmethod
+    def _char_trigrams(text: str) -> FrozenSet[str]:
+        if not text:
+            return frozenset()
+        padded = f"  {text} "
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+    
+    def _get_faq_features(self, faq: Dict) -> FAQFeatures:
+        """Return cached features for an FAQ, computing them on first sight."""
+        question = faq.get('question', '') or ''
+        answer = faq.get('answer', '') or ''
+        key = (question, answer)
+        features = self._faq_features.get(key)
+        if features is None:
+            features = FAQFeatures(
+                question=self._text_features(question),
+                answer=self._text_features(answer)
+            )
+            self._faq_features[key] = features
+        return features
+    
+    def _ensure_scoring_matrix(self):
+        """Build the vectorized matrix if there is none, or once edits have made
+        more than MATRIX_REBUILD_FRACTION of its rows stale. Until then an edited
+        FAQ's row no longer matches its features (see row_of) and that FAQ is
+        scored by the Python path, so a single edit does not rebuild the matrix
+        and a bulk import rebuilds it a logarithmic number of times."""
+        if self.scoring_backend != 'numpy':
+            return
+        matrix = self.scoring_matrix
+        if matrix is not None and self._matrix_stale_rows <= len(matrix) * self.MATRIX_REBUILD_FRACTION:
+            return
+        self._matrix_stale_rows = 0
+        self.scoring_matrix = None
+        if self.faq_store:
+            keys = list(self.faq_store)
+            self.scoring_matrix = FAQScoringMatrix(
+                keys, [self._get_faq_features(self.faq_store[key]) for key in keys]
+            )
+    
+    def _bm25_tokens(self, features: FAQFeatures) -> List[str]:
+        return list(features.question.keywords) * self.QUESTION_FIELD_WEIGHT + list(features.answer.keywords)
+    
+    def _candidate_keys(self, user_keywords, faq_lookup: Dict[Hashable, Dict]) -> List[Hashable]:
+        """Top BM25 candidates that are present in faq_lookup.
+        
+        Falls back to scanning every FAQ only when there is no index yet or the
+        list is no bigger than the candidate pool anyway. Otherwise a question
+        that shares no keyword with any FAQ (e.g. "hello", or a typo missing
+        from the lexicon) gets no candidates and scores 0.0, even where a full
+        character-level scan might have found a weak match.
+        """
+        hits = self.bm25.search(user_keywords, self.candidate_pool_size) if user_keywords else []
+        candidates = [key for key, _ in hits if key in faq_lookup]
+        if not candidates and (not len(self.bm25) or len(faq_lookup) <= self.candidate_pool_size):
+            candidates = list(faq_lookup)
+        return candidates
+    
     def calculate_similarity(self, text1: str, text2: str, context_boost: float = 0.0) -> float:
-        t1 = self.preprocess_text(text1)
-        t2 = self.preprocess_text(text2)
+        return self._score_features(self._text_features(text1), self._text_features(text2), context_boost)
+    
+    def text_features(self, text: str) -> TextFeatures:
+        """Features of one question, for callers that compare many texts (SmartAnswerCache)."""
+        return self._text_features(text)
+    
+    def features_similarity(self, f1: TextFeatures, f2: TextFeatures) -> float:
+        """calculate_similarity() on precomputed features."""
+        return self._score_features(f1, f2)
+    
+    def _sequence_ratio(self, f1: TextFeatures, f2: TextFeatures) -> float:
+        if self.similarity_mode == 'trigram':
+            if not f1.trigrams or not f2.trigrams:
+                return 1.0 if f1.text == f2.text else 0.0
+            return 2 * len(f1.trigrams & f2.trigrams) / (len(f1.trigrams) + len(f2.trigrams))
+        return SequenceMatcher(None, f1.text, f2.text).ratio()
+    
+    @staticmethod
+    def _jaccard(set1: FrozenSet[str], set2: FrozenSet[str]) -> float:
+        if not set1 or not set2:
+            return 0.0
+        return len(set1 & set2) / len(set1 | set2)
+    
+    def _score_features(self, f1: TextFeatures, f2: TextFeatures, context_boost: float = 0.0,
+                        jaccards: Tuple[float, float] = None) -> float:
+        """Blend sequence, keyword and word similarity.
         
-        sequence_sim = SequenceMatcher(None, t1, t2).ratio() * 0.4
+        jaccards, if given, are the precomputed (keyword, word) Jaccard terms
+        from the vectorized backend.
+        """
+        if jaccards is None:
+            jaccards = (self._jaccard(f1.keywords, f2.keywords), self._jaccard(f1.words, f2.words))
+        keyword_jaccard, word_jaccard = jaccards
         
-        keywords1 = set(self.extract_keywords(text1))
-        keywords2 = set(self.extract_keywords(text2))
-        if keywords1 and keywords2:
-            intersection = len(keywords1.intersection(keywords2))
-            union = len(keywords1.union(keywords2))
-            keyword_sim = (intersection / union) * 0.45 if union > 0 else 0
-        else:
-            keyword_sim = 0
-        
-        words1 = set(t1.split())
-        words2 = set(t2.split())
-        if words1 and words2:
-            word_intersection = len(words1.intersection(words2))
-            word_union = len(words1.union(words2))
-            word_sim = (word_intersection / word_union) * 0.15 if word_union > 0 else 0
-        else:
-            word_sim = 0
+        sequence_sim = self._sequence_ratio(f1, f2) * self.SEQUENCE_WEIGHT
+        keyword_sim = keyword_jaccard * self.KEYWORD_WEIGHT
+        word_sim = word_jaccard * self.WORD_WEIGHT
         
         final_score = sequence_sim + keyword_sim + word_sim + context_boost
         return min(final_score, 1.0)
@@ -275,68 +453,163 @@ class NLPProcessor:
     # ----------------------------
     # Matching & response
     # ----------------------------
-    def find_best_match(self, user_input: str, faqs: List[Dict], session_id: str = None) -> Tuple[Dict, float]:
-        if not faqs:
-            return None, 0.0
-        
-        context_boost_map = {}
-        if session_id and session_id in self.context_keywords:
-            context_keywords = set(self.context_keywords[session_id].keys())
-            for idx, faq in enumerate(faqs):
-                faq_keywords = set(self.extract_keywords(faq.get('question', '')))
-                context_overlap = len(faq_keywords.intersection(context_keywords))
-                if context_overlap > 0:
-                    context_boost_map[idx] = min(context_overlap * 0.05, 0.15)
+    def _faq_lookup(self, faqs: List[Dict] = None) -> Dict[Hashable, Dict]:
+        """FAQs to match against by key: the trained store, or an explicit list keyed the same way."""
+        if faqs is None:
+            return self.faq_store
+        return {self._faq_key(faq, position): faq for position, faq in enumerate(faqs)}
+    
+    def find_best_match(self, user_input: str, faqs: List[Dict] = None,
+                        session_id: str = None) -> Tuple[Dict, float]:
+        """Best FAQ for user_input. Served from the trained store unless faqs is given."""
+        best_match, best_score, _ = self.rank_matches(user_input, self._faq_lookup(faqs), session_id, top_n=0)
+        return best_match, best_score
+    
+    def rank_matches(self, user_input: str, faq_lookup: Dict[Hashable, Dict] = None,
+                     session_id: str = None, top_n: int = 3) -> Tuple[Dict, float, List[str]]:
+        """One scoring pass: (best FAQ, its score, top_n suggested questions).
+        
+        Suggestions are ranked by question similarity alone (no context boost)
+        in a bounded heap and kept only above 0.2.
+        """
+        if faq_lookup is None:
+            faq_lookup = self.faq_store
+        if not faq_lookup:
+            return None, 0.0, []
+        
+        context_keywords = set(self.sessions.keywords(session_id)) if session_id else set()
         
         best_match = None
         best_score = 0.0
-        
-        candidates = []
-        user_keywords = self.extract_keywords(user_input)
-        if self.keyword_index and user_keywords:
-            for keyword in user_keywords:
-                if keyword in self.keyword_index:
-                    candidates.extend(self.keyword_index[keyword])
-            candidates = list(set(candidates))
-        
-        if not candidates:
-            candidates = list(range(len(faqs)))
-        
-        for idx in candidates:
-            if idx >= len(faqs):
-                continue
-            faq = faqs[idx]
-            question = faq.get('question', '')
-            answer = faq.get('answer', '')
-            context_boost = context_boost_map.get(idx, 0.0)
-            q_score = self.calculate_similarity(user_input, question, context_boost)
-            a_score = self.calculate_similarity(user_input, answer, context_boost * 0.5) * 0.3
-            user_kw_set = set(user_keywords)
-            faq_kw_set = set(self.extract_keywords(question))
-            exact_matches = len(user_kw_set.intersection(faq_kw_set))
-            keyword_boost = min(exact_matches * 0.1, 0.25)
-            total_score = q_score + a_score + keyword_boost
+        # Min-heap of (question score, -candidate order, key); earlier candidates win ties
+        top = []
+        candidates = self._score_candidates(self._text_features(user_input), faq_lookup, context_keywords)
+        for order, (key, total_score, question_score) in enumerate(candidates):
             if total_score > best_score:
                 best_score = total_score
-                best_match = faq
-        
-        return best_match, best_score
+                best_match = faq_lookup[key]
+            if top_n > 0:
+                item = (question_score, -order, key)
+                if len(top) < top_n:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+        
+        suggestions = [
+            faq_lookup[key].get('question', '')
+            for score, _, key in sorted(top, reverse=True) if score > 0.2
+        ]
+        return best_match, best_score, suggestions
+    
+    def _score_candidates(self, user_features: TextFeatures, faq_lookup: Dict[Hashable, Dict],
+                          context_keywords: set = frozenset()):
+        """Yield (key, total score, question-only score) for every BM25 candidate, in candidate order.
+        
+        The question-only score has no context boost; it ranks suggestions.
+        """
+        user_keywords = user_features.keywords
+        self._ensure_scoring_matrix()
+        candidates = [(key, self._get_faq_features(faq_lookup[key]))
+                      for key in self._candidate_keys(user_keywords, faq_lookup)]
+        
+        # Vectorized Jaccard terms for the candidates that have an up-to-date matrix row
+        positions = {}
+        row_scores = None
+        matrix = self.scoring_matrix
+        if matrix is not None and candidates:
+            rows = []
+            for key, features in candidates:
+                row = matrix.row_of(key, features)
+                if row is not None:
+                    positions[key] = len(rows)
+                    rows.append(row)
+            if rows:
+                row_scores = matrix.score(user_features, rows)
+        
+        for key, features in candidates:
+            context_boost = 0.0
+            if context_keywords:
+                context_overlap = len(features.question.keywords & context_keywords)
+                if context_overlap > 0:
+                    context_boost = min(context_overlap * 0.05, 0.15)
+            q_jaccards = a_jaccards = None
+            position = positions.get(key)
+            if position is not None:
+                q_jaccards, a_jaccards = row_scores.question(position), row_scores.answer(position)
+            question_score = self._score_features(user_features, features.question, 0.0, q_jaccards)
+            q_score = min(question_score + context_boost, 1.0) if context_boost else question_score
+            a_score = self._score_features(user_features, features.answer, context_boost * 0.5, a_jaccards) * 0.3
+            exact_matches = len(user_keywords & features.question.keywords)
+            keyword_boost = min(exact_matches * 0.1, 0.25)
+            yield key, q_score + a_score + keyword_boost, question_score
+    
+    def match_batch(self, questions: List[str], top_k: int = 3, workers: int = None) -> List[Dict]:
+        """Top-k FAQ matches for many questions (offline evaluation, chat log triage).
+        
+        Each distinct set of question features is scored once against the
+        precomputed FAQ features; no session context is applied. Keywords come
+        from the raw text, so two questions that normalize to the same text are
+        only shared when their keywords match too.
+        workers > 1 splits the batch across a process pool.
+        """
+        if workers and workers > 1 and len(questions) > self.BATCH_CHUNK_SIZE:
+            return self._match_batch_parallel(questions, top_k, workers)
+        
+        faq_lookup = self.faq_store
+        by_features: Dict[TextFeatures, List[Tuple[Hashable, float]]] = {}
+        results = []
+        for question in questions:
+            features = self._text_features(question or '')
+            ranked = by_features.get(features)
+            if ranked is None:
+                scored = [(key, score) for key, score, _ in self._score_candidates(features, faq_lookup) if score > 0]
+                ranked = by_features[features] = heapq.nlargest(top_k, scored, key=lambda item: item[1])
+            matches = [{
+                'id_faq': faq_lookup[key].get('id_faq'),
+                'question': faq_lookup[key]['question'],
+                'category': faq_lookup[key].get('category'),
+                'score': round(score, 4)
+            } for key, score in ranked]
+            results.append({
+                'question': question,
+                'matches': matches,
+                'confidence': matches[0]['score'] if matches else 0.0
+            })
+        return results
+    
+    def _match_batch_parallel(self, questions: List[str], top_k: int, workers: int) -> List[Dict]:
+        chunks = [questions[i:i + self.BATCH_CHUNK_SIZE] for i in range(0, len(questions), self.BATCH_CHUNK_SIZE)]
+        options = {
+            'similarity_mode': self.similarity_mode,
+            'scoring_backend': self.scoring_backend,
+            'candidate_pool_size': self.candidate_pool_size,
+        }
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(self.training_pairs, options)) as pool:
+            for chunk_results in pool.map(_match_batch_chunk, chunks, [top_k] * len(chunks)):
+                results.extend(chunk_results)
+        return results
     
-    def generate_response(self, user_input: str, faqs: List[Dict], 
+    @staticmethod
+    def confidence_level(score: float) -> str:
+        """Label for a match score that passed the response threshold."""
+        if score >= 0.75:
+            return "high"
+        elif score >= 0.55:
+            return "medium"
+        return "low"
+    
+    def generate_response(self, user_input: str, faqs: List[Dict] = None, 
                          session_id: str = None, threshold: float = 0.35) -> Dict:
         if session_id:
             self.add_to_context(session_id, user_input, 'user')
         
-        best_match, score = self.find_best_match(user_input, faqs, session_id)
+        best_match, score, similar_questions = self.rank_matches(user_input, self._faq_lookup(faqs), session_id)
         
         # If good match, possibly enhance with Gemini
         if best_match and score >= threshold:
-            if score >= 0.75:
-                confidence_level = "high"
-            elif score >= 0.55:
-                confidence_level = "medium"
-            else:
-                confidence_level = "low"
+            confidence_level = self.confidence_level(score)
             
             reply_text = best_match['answer']
             use_gemini_flag = (score < 0.65) and (self.gemini is not None)
@@ -354,12 +627,14 @@ class NLPProcessor:
             
             response = {
                 'reply': reply_text,
+                'id_faq': best_match.get('id_faq'),
                 'matched_question': best_match['question'],
                 'confidence': float(score),
                 'confidence_level': confidence_level,
                 'category': best_match.get('category', 'Umum'),
                 'use_gemini': use_gemini_flag,
-                'matched': True
+                'matched': True,
+                'similar_questions': similar_questions
             }
             
             if session_id:
@@ -367,7 +642,6 @@ class NLPProcessor:
             return response
         
         # No good match -> fallback (use Gemini to craft helpful reply if available)
-        similar_questions = self._get_similar_questions(user_input, faqs, top_n=3)
         reply_text = None
         if self.gemini:
             try:
@@ -397,14 +671,8 @@ class NLPProcessor:
     # ----------------------------
     # Helpers for suggestions & fallback
     # ----------------------------
-    def _get_similar_questions(self, user_input: str, faqs: List[Dict], top_n: int = 3) -> List[str]:
-        scored_questions = []
-        for faq in faqs:
-            question = faq.get('question', '')
-            score = self.calculate_similarity(user_input, question)
-            scored_questions.append((question, score))
-        scored_questions.sort(key=lambda x: x[1], reverse=True)
-        return [q for q, s in scored_questions[:top_n] if s > 0.2]
+    def _get_similar_questions(self, user_input: str, faqs: List[Dict] = None, top_n: int = 3) -> List[str]:
+        return self.rank_matches(user_input, self._faq_lookup(faqs), top_n=top_n)[2]
     
     def _generate_fallback(self, similar_questions: List[str] = None) -> str:
         fallback = "Maaf, saya kurang faham soalan anda.\n\n"
@@ -424,30 +692,19 @@ class NLPProcessor:
     # Conversation context
     # ----------------------------
     def add_to_context(self, session_id: str, message: str, role: str):
-        self.conversation_history[session_id].append({
+        keywords = self.extract_keywords(message) if role == 'user' else []
+        self.sessions.append(session_id, {
             'role': role,
             'message': message,
             'timestamp': datetime.now().isoformat(),
-            'keywords': self.extract_keywords(message) if role == 'user' else []
-        })
-        if len(self.conversation_history[session_id]) > 15:
-            self.conversation_history[session_id] = self.conversation_history[session_id][-15:]
-        if role == 'user':
-            keywords = self.extract_keywords(message)
-            for keyword in keywords:
-                if keyword not in self.context_keywords[session_id]:
-                    self.context_keywords[session_id][keyword] = 1
-                else:
-                    self.context_keywords[session_id][keyword] += 1
+            'keywords': keywords
+        }, keywords)
     
     def get_conversation_history(self, session_id: str) -> List[Dict]:
-        return self.conversation_history.get(session_id, [])
+        return self.sessions.history(session_id)
     
     def clear_session_context(self, session_id: str):
-        if session_id in self.conversation_history:
-            del self.conversation_history[session_id]
-        if session_id in self.context_keywords:
-            del self.context_keywords[session_id]
+        self.sessions.clear(session_id)
     
     # ----------------------------
     # Intent detection
@@ -504,12 +761,97 @@ class NLPProcessor:
             print(f"❌ Error saving training data: {e}")
             return False
     
+    def _index_fingerprint(self) -> bytes:
+        """Everything that changes the features of an FAQ; snapshots must match it."""
+        parts = [
+            str(nlp_snapshot.VERSION),
+            self.lexicon.fingerprint,
+            self.similarity_mode,
+            repr(sorted(KEDAH_SLANG_NORMALIZER.mapping.items())),
+        ]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).digest()
+    
+    def save_snapshot(self, filename: str = 'nlp_index.bin') -> bool:
+        """Write the built index as a binary snapshot (see nlp_snapshot)."""
+        try:
+            records = [(key, pair, self._get_faq_features(pair)) for key, pair in self.faq_store.items()]
+            nlp_snapshot.write_snapshot(filename, self._index_fingerprint(), records, self.bm25.postings,
+                                        self.faq_version)
+            print(f"✅ NLP index snapshot saved to {filename}")
+            return True
+        except Exception as e:
+            print(f"❌ Error saving NLP index snapshot: {e}")
+            return False
+    
+    def load_snapshot(self, filename: str = 'nlp_index.bin') -> bool:
+        """Restore the index from a binary snapshot without re-tokenizing any FAQ."""
+        try:
+            with nlp_snapshot.Snapshot(filename) as snapshot:
+                if snapshot.fingerprint != self._index_fingerprint():
+                    print(f"⚠️ Snapshot {filename} was built with a different lexicon or mode — ignoring")
+                    return False
+                
+                strings = snapshot.strings()
+                faqs = snapshot.faqs()
+                offsets = snapshot.feature_offsets()
+                tokens = snapshot.tokens()
+                
+                self._reset_index()
+                self.faq_version = snapshot.faq_version()
+                keys = []
+                n_sets = len(nlp_snapshot.FEATURE_SETS)
+                for row in range(snapshot.faq_count):
+                    stored_key, flags, question, answer, category, q_text, a_text = \
+                        faqs[row * nlp_snapshot.FAQ_FIELDS:(row + 1) * nlp_snapshot.FAQ_FIELDS]
+                    key = snapshot.faq_key(stored_key, flags, strings)
+                    sets = [
+                        frozenset(strings[t] for t in tokens[offsets[row * n_sets + i]:offsets[row * n_sets + i + 1]])
+                        for i in range(n_sets)
+                    ]
+                    features = FAQFeatures(
+                        question=TextFeatures(strings[q_text], sets[0], sets[1], sets[2]),
+                        answer=TextFeatures(strings[a_text], sets[3], sets[4], sets[5])
+                    )
+                    pair = {
+                        'id_faq': key if flags & nlp_snapshot.HAS_ID else None,
+                        'question': strings[question],
+                        'answer': strings[answer],
+                        'category': strings[category] if category >= 0 else None,
+                        'keywords': sorted(features.question.keywords)
+                    }
+                    keys.append(key)
+                    self.faq_store[key] = pair
+                    self._faq_features[(pair['question'], pair['answer'])] = features
+                    for keyword in pair['keywords']:
+                        self._own_keyword_keys(keyword).append(key)
+                
+                term_ids, posting_offsets, posting_rows, posting_tfs = snapshot.postings()
+                postings = {}
+                for i, term_id in enumerate(term_ids):
+                    start, end = posting_offsets[i], posting_offsets[i + 1]
+                    postings[strings[term_id]] = {
+                        keys[row]: tf for row, tf in zip(posting_rows[start:end], posting_tfs[start:end])
+                    }
+                self.bm25.load_postings(postings, keys)
+            
+            print(f"✅ NLP index snapshot loaded from {filename} ({len(self.faq_store)} FAQs)")
+            return True
+        except FileNotFoundError:
+            print(f"⚠️ Snapshot file not found: {filename}")
+            return False
+        except Exception as e:
+            print(f"❌ Error loading NLP index snapshot: {e}")
+            self._reset_index()
+            return False
+    
     def load_training_data(self, filename: str = 'training_data.json') -> bool:
         try:
             with open(filename, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-            self.training_pairs = data.get('training_pairs', [])
-            self.keyword_index = data.get('keyword_index', {})
+            # Postings are rebuilt from the pairs so they match the current lexicon
+            self._reset_index()
+            for position, pair in enumerate(data.get('training_pairs', [])):
+                self._index_faq(self._faq_key(pair, position), pair)
             print(f"✅ Training data loaded from {filename}")
             return True
         except FileNotFoundError:
@@ -519,10 +861,44 @@ class NLPProcessor:
             print(f"❌ Error loading training data: {e}")
             return False
     
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters of the text normalization caches."""
+        stats = {}
+        for name, cached in (('preprocess_text', self._preprocess_cached),
+                             ('extract_keywords', self._keywords_cached)):
+            info = cached.cache_info()
+            lookups = info.hits + info.misses
+            stats[name] = {
+                'hits': info.hits,
+                'misses': info.misses,
+                'size': info.currsize,
+                'maxsize': info.maxsize,
+                'hit_rate': round(info.hits / lookups, 3) if lookups else 0.0
+            }
+        return stats
+    
     def get_stats(self) -> Dict:
         return {
             'training_pairs': len(self.training_pairs),
             'unique_keywords': len(self.keyword_index),
-            'active_sessions': len(self.conversation_history),
-            'total_context_keywords': sum(len(k) for k in self.context_keywords.values())
+            'active_sessions': len(self.sessions),
+            'sessions': self.sessions.stats(),
+            'cache': self.cache_stats()
         }
+
+
+# ----------------------------
+# match_batch process pool workers
+# ----------------------------
+_batch_worker = None
+
+
+def _init_batch_worker(training_pairs: List[Dict], options: Dict):
+    global _batch_worker
+    _batch_worker = NLPProcessor(enable_gemini=False, **options)
+    for position, pair in enumerate(training_pairs):
+        _batch_worker._index_faq(_batch_worker._faq_key(pair, position), pair)
+
+
+def _match_batch_chunk(questions: List[str], top_k: int) -> List[Dict]:
+    return _batch_worker.match_batch(questions, top_k)
@@ -0,0 +1,236 @@
+"""
+Binary snapshot of the trained NLP index
+Versioned binary file holding an interned string table, per-FAQ feature
+token ranges and the BM25 postings, so a worker restores the index without
+re-tokenizing any FAQ. The file is read in one call and decoded into the
+processor's own dicts; nothing stays mapped or shared between workers.
+JSON (save_training_data) stays the export format.
+
+Layout (little-endian):
+    header   magic, version, index fingerprint, section count
+    sections name, byte offset, byte length  (one entry per section)
+    STRO/STRB  string offsets (uint32) + UTF-8 blob
+    FAQS     FAQ_FIELDS int64 per FAQ
+    FOFF/TOKS  per-FAQ feature set offsets (uint32) + string ids (uint32)
+    PTRM/POFF/PDOC/PTF_  postings: term string ids, offsets, FAQ rows, term frequencies
+    FVER     database FAQ version the index was built from, UTF-8 (optional)
+"""
+
+import os
+import sys
+import struct
+import tempfile
+from array import array
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+MAGIC = b'ZKNLPIDX'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sH20sI')
+_SECTION = struct.Struct('<4sQQ')
+_ALIGN = 8
+
+# Per-FAQ record: key, flags, question, answer, category, question text, answer text
+# (all but the first two are string ids; category is -1 when NULL). The key is
+# stored as is when it is an int and as a string id when it is a str (KEY_IS_STRING).
+FAQ_FIELDS = 7
+HAS_ID = 1
+KEY_IS_STRING = 2
+# Feature token sets stored per FAQ, in this order
+FEATURE_SETS = (
+    ('question', 'keywords'), ('question', 'words'), ('question', 'trigrams'),
+    ('answer', 'keywords'), ('answer', 'words'), ('answer', 'trigrams'),
+)
+
+
+def _check_byteorder():
+    if sys.byteorder != 'little':
+        raise ValueError("NLP snapshots are only supported on little-endian hosts")
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, text: str) -> int:
+        sid = self.ids.get(text)
+        if sid is None:
+            sid = self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return sid
+
+
+def write_snapshot(path: str, fingerprint: bytes, records: Iterable[Tuple[int, Dict, object]],
+                   postings: Dict[str, Dict[Hashable, int]], faq_version: str = None):
+    """Write records ((key, pair, FAQFeatures) per FAQ) and BM25 postings to path atomically."""
+    _check_byteorder()
+    strings = _StringTable()
+    faqs = array('q')
+    feature_offsets = array('I', [0])
+    tokens = array('I')
+    rows: Dict[Hashable, int] = {}
+
+    for row, (key, pair, features) in enumerate(records):
+        rows[key] = row
+        flags = HAS_ID if pair.get('id_faq') is not None else 0
+        if isinstance(key, str):
+            flags |= KEY_IS_STRING
+            stored_key = strings.add(key)
+        elif isinstance(key, int) and not isinstance(key, bool):
+            stored_key = key
+        else:
+            raise ValueError(f"FAQ key {key!r} is neither an int nor a str")
+        category = pair.get('category')
+        faqs.extend([
+            stored_key,
+            flags,
+            strings.add(pair['question']),
+            strings.add(pair['answer']),
+            strings.add(category) if category is not None else -1,
+            strings.add(features.question.text),
+            strings.add(features.answer.text),
+        ])
+        for side, field in FEATURE_SETS:
+            tokens.extend(strings.add(t) for t in sorted(getattr(getattr(features, side), field)))
+            feature_offsets.append(len(tokens))
+
+    term_ids = array('I')
+    posting_offsets = array('I', [0])
+    posting_rows = array('I')
+    posting_tfs = array('I')
+    for term in sorted(postings):
+        docs = [(rows[key], tf) for key, tf in postings[term].items() if key in rows]
+        if not docs:
+            continue
+        term_ids.append(strings.add(term))
+        for row, tf in sorted(docs):
+            posting_rows.append(row)
+            posting_tfs.append(tf)
+        posting_offsets.append(len(posting_rows))
+
+    blob = bytearray()
+    string_offsets = array('I', [0])
+    for text in strings.strings:
+        blob += text.encode('utf-8')
+        string_offsets.append(len(blob))
+
+    sections = [
+        (b'STRO', string_offsets.tobytes()),
+        (b'STRB', bytes(blob)),
+        (b'FAQS', faqs.tobytes()),
+        (b'FOFF', feature_offsets.tobytes()),
+        (b'TOKS', tokens.tobytes()),
+        (b'PTRM', term_ids.tobytes()),
+        (b'POFF', posting_offsets.tobytes()),
+        (b'PDOC', posting_rows.tobytes()),
+        (b'PTF_', posting_tfs.tobytes()),
+    ]
+    if faq_version is not None:
+        sections.append((b'FVER', str(faq_version).encode('utf-8')))
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for name, payload in sections:
+        offset += -offset % _ALIGN
+        table.append((name, offset, len(payload)))
+        offset += len(payload)
+
+    # Unique temp name: workers saving at the same time must not share one file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, fingerprint, len(sections)))
+            for entry in table:
+                f.write(_SECTION.pack(*entry))
+            for (name, payload), (_, section_offset, _) in zip(sections, table):
+                f.write(b'\0' * (section_offset - f.tell()))
+                f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class Snapshot:
+    """Read-only view of a snapshot file, read into memory in one call. Use as a context manager."""
+
+    def __init__(self, path: str):
+        _check_byteorder()
+        with open(path, 'rb') as f:
+            self._data = f.read()
+        self._views: List[memoryview] = []
+
+        magic, version, fingerprint, section_count = _HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError("not an NLP index snapshot")
+        if version != VERSION:
+            raise ValueError(f"unsupported snapshot version {version} (expected {VERSION})")
+        self.version = version
+        self.fingerprint = fingerprint
+        self.sections: Dict[bytes, Tuple[int, int]] = {}
+        for i in range(section_count):
+            name, offset, length = _SECTION.unpack_from(self._data, _HEADER.size + i * _SECTION.size)
+            if offset + length > len(self._data):
+                raise ValueError(f"truncated snapshot section {name!r}")
+            self.sections[name] = (offset, length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Release derived views before the views they were cast from
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._data = b''
+
+    def _view(self, name: bytes, typecode: str = 'B') -> memoryview:
+        offset, length = self.sections[name]
+        raw = memoryview(self._data)[offset:offset + length]
+        self._views.append(raw)
+        if typecode == 'B':
+            return raw
+        view = raw.cast(typecode)
+        self._views.append(view)
+        return view
+
+    def strings(self) -> List[str]:
+        offsets = self._view(b'STRO', 'I')
+        blob = self._view(b'STRB')
+        return [sys.intern(str(blob[offsets[i]:offsets[i + 1]], 'utf-8')) for i in range(len(offsets) - 1)]
+
+    @property
+    def faq_count(self) -> int:
+        return self.sections[b'FAQS'][1] // (8 * FAQ_FIELDS)
+
+    def faqs(self) -> memoryview:
+        """FAQ_FIELDS int64 per FAQ; see faq_key for the first two."""
+        return self._view(b'FAQS', 'q')
+
+    @staticmethod
+    def faq_key(stored_key: int, flags: int, strings: List[str]) -> Hashable:
+        return strings[stored_key] if flags & KEY_IS_STRING else stored_key
+
+    def feature_offsets(self) -> memoryview:
+        return self._view(b'FOFF', 'I')
+
+    def tokens(self) -> memoryview:
+        return self._view(b'TOKS', 'I')
+
+    def faq_version(self) -> Optional[str]:
+        """Database FAQ version recorded by the writer, or None if it had none."""
+        if b'FVER' not in self.sections:
+            return None
+        return str(self._view(b'FVER'), 'utf-8')
+
+    def postings(self) -> Tuple[memoryview, memoryview, memoryview, memoryview]:
+        return (self._view(b'PTRM', 'I'), self._view(b'POFF', 'I'),
+                self._view(b'PDOC', 'I'), self._view(b'PTF_', 'I'))
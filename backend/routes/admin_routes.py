@@ -3,25 +3,34 @@ Fixed Admin Routes for ZAKIA Chatbot
 Handles FAQ management with proper NLP retraining
 """
 
+import os
+import time
 from flask import Blueprint, request, jsonify
 from database import DatabaseManager
-from nlp_processor import NLPProcessor
+from nlp_engine import get_nlp_engine
+from llm_cache import get_smart_answer_cache
 
 # Create blueprint
 admin_bp = Blueprint('admin', __name__)
 
 # Initialize components
 db = DatabaseManager()
-nlp = NLPProcessor()
+# Shared with the chat blueprint: retraining here is what /chat serves next
+nlp_engine = get_nlp_engine()
+
+# Upper bound on questions per /admin/nlp/match-batch request
+MATCH_BATCH_LIMIT = 20000
 
 def retrain_nlp_model():
     """Retrain NLP model after FAQ changes"""
     try:
         print("🔄 Retraining NLP model...")
+        # Read first: an edit landing in between makes the next sync retrain again
+        version = db.faq_version()
         faqs = db.get_faqs()
-        if faqs:
-            nlp.train_from_faqs(faqs)
-            nlp.save_training_data('training_data.json')
+        if faqs and nlp_engine.retrain(faqs, faq_version=version):
+            # Questions answered from general knowledge may have an FAQ now
+            get_smart_answer_cache().purge()
             print("✅ NLP model retrained successfully")
             return True
         return False
@@ -29,6 +38,28 @@ def retrain_nlp_model():
         print(f"⚠️ Error retraining NLP: {e}")
         return False
 
+def sync_nlp_faq(faq_id, faq=None):
+    """Apply a single FAQ change to the NLP index (faq=None means it was deleted)"""
+    try:
+        # First edit after startup: the index has never been built here
+        if not nlp_engine.is_trained():
+            return retrain_nlp_model()
+        
+        # The version this write bumped to, so the next sync does not retrain for it
+        version = db.faq_version()
+        if faq:
+            changed = nlp_engine.update(lambda nlp: nlp.update_faq(faq), faq_version=version)
+        else:
+            changed = nlp_engine.update(lambda nlp: nlp.remove_faq(faq_id), faq_version=version)
+        if changed:
+            print(f"✅ NLP index updated for FAQ {faq_id}")
+        # A cached general-knowledge answer may now have an FAQ (or lost one)
+        get_smart_answer_cache().purge()
+        return True
+    except Exception as e:
+        print(f"⚠️ Error updating NLP index: {e}")
+        return False
+
 @admin_bp.route("/admin/faqs", methods=["GET"])
 def admin_list_faqs():
     """List all FAQs"""
@@ -133,11 +164,10 @@ def admin_create_faq():
         
         print(f"✅ FAQ created with ID: {new_id}")
         
-        # Retrain NLP model with new FAQ
-        retrain_nlp_model()
-        
-        # Get the created FAQ
+        # Get the created FAQ and index it
         faq = db.get_faq_by_id(new_id)
+        if faq:
+            sync_nlp_faq(new_id, faq)
         
         return jsonify({
             "success": True,
@@ -206,11 +236,10 @@ def admin_update_faq(faq_id):
         
         print(f"✅ FAQ {faq_id} updated successfully")
         
-        # Retrain NLP model
-        retrain_nlp_model()
-        
-        # Get updated FAQ
+        # Get updated FAQ and re-index it
         faq = db.get_faq_by_id(faq_id)
+        if faq:
+            sync_nlp_faq(faq_id, faq)
         
         return jsonify({
             "success": True,
@@ -260,8 +289,8 @@ def admin_delete_faq(faq_id):
         
         print(f"✅ FAQ {faq_id} deleted successfully")
         
-        # Retrain NLP model
-        retrain_nlp_model()
+        # Drop it from the NLP index
+        sync_nlp_faq(faq_id)
         
         return jsonify({
             "success": True,
@@ -290,7 +319,7 @@ def admin_retrain_model():
                 "success": True,
                 "message": "NLP model retrained successfully",
                 "faqs_count": len(db.get_faqs()),
-                "keywords_indexed": len(nlp.keyword_index)
+                "keywords_indexed": len(nlp_engine.get().keyword_index)
             })
         else:
             return jsonify({
@@ -305,6 +334,75 @@ def admin_retrain_model():
             "error": str(e)
         }), 500
 
+@admin_bp.route("/admin/nlp/match-batch", methods=["POST"])
+def admin_match_batch():
+    """Top-k FAQ matches for a list of questions (evaluation / chat log triage)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        questions = data.get("questions")
+        if not isinstance(questions, list) or not questions:
+            return jsonify({
+                "success": False,
+                "error": "'questions' must be a non-empty list"
+            }), 400
+        if len(questions) > MATCH_BATCH_LIMIT:
+            return jsonify({
+                "success": False,
+                "error": f"At most {MATCH_BATCH_LIMIT} questions per request"
+            }), 400
+        
+        top_k = max(1, min(int(data.get("top_k", 3)), 20))
+        workers = data.get("workers") or 0
+        if isinstance(workers, bool) or not isinstance(workers, int) or workers < 0:
+            return jsonify({
+                "success": False,
+                "error": "'workers' must be a non-negative integer"
+            }), 400
+        # One process per core at most; more only adds pool start-up cost
+        workers = min(workers, os.cpu_count() or 1) or None
+        
+        started = time.perf_counter()
+        results = nlp_engine.get().match_batch([str(q) for q in questions], top_k=top_k, workers=workers)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        return jsonify({
+            "success": True,
+            "count": len(results),
+            "top_k": top_k,
+            "elapsed_ms": round(elapsed_ms, 1),
+            "results": results
+        })
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": f"Invalid parameters: {e}"}), 400
+    except Exception as e:
+        print(f"❌ Error in batch matching: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@admin_bp.route("/admin/smart-cache", methods=["GET"])
+def admin_smart_cache():
+    """Smart Mode answer cache: stats and the most recently used entries"""
+    smart_cache = get_smart_answer_cache()
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    return jsonify({
+        "success": True,
+        "stats": smart_cache.stats(),
+        "entries": smart_cache.questions(limit)
+    })
+
+@admin_bp.route("/admin/smart-cache/purge", methods=["POST"])
+def admin_purge_smart_cache():
+    """Drop cached Smart Mode answers (all, or those whose question contains 'contains')"""
+    data = request.get_json(silent=True) or {}
+    purged = get_smart_answer_cache().purge(data.get("contains"))
+    print(f"🧹 Purged {purged} Smart Mode cached answers")
+    return jsonify({
+        "success": True,
+        "purged": purged
+    })
+
 @admin_bp.route("/admin/stats", methods=["GET"])
 def admin_stats():
     """Get admin statistics"""
@@ -318,6 +416,7 @@ def admin_stats():
                 }), 500
         
         faqs = db.get_faqs()
+        nlp = nlp_engine.get()
         
         # Count by category
         categories = {}
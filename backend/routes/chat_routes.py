@@ -4,18 +4,33 @@ Chat Routes - SMART MODE
 - TIADA FAQ: Gemini jawab berdasarkan pengetahuan zakat
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import re
+import json
 import uuid
 import traceback
 from database import DatabaseManager
-from nlp_processor import NLPProcessor
-from gemini_service import GeminiService
+from nlp_engine import get_nlp_engine
+from gemini_service import GeminiService, FallbackText, TOKEN_USAGE
+from llm_executor import LLMDeadline, GeminiTimeout, executor_stats, GEMINI_STREAM_DEADLINE_SECONDS
+from llm_guard import GeminiUnavailable
+from chat_log_queue import get_chat_log_queue
+from llm_cache import create_response_cache, get_smart_answer_cache, cache_key, content_version
 # Create blueprint
 chat_bp = Blueprint('chat', __name__)
 
 # Initialize components
 db = DatabaseManager()
-nlp = NLPProcessor()
+# Chat logs are written in batches by a background thread (None: written inline)
+chat_log = get_chat_log_queue()
+# Process-wide NLP engine shared with the admin blueprint; each request reads
+# the processor once so a concurrent retrain never changes it mid-request
+nlp_engine = get_nlp_engine()
+
+# Gemini FAQ enhancements, reused for rephrasings of the same question
+response_cache = create_response_cache()
+# Smart Mode answers, reused for close paraphrases (shared with admin purge)
+smart_cache = get_smart_answer_cache()
 
 # Initialize Gemini
 gemini = None
@@ -42,6 +57,54 @@ def add_emoji_if_missing(text: str) -> str:
     return text
 
 
+def log_chat(user_input: str, reply: str, session_id: str):
+    """Queue the exchange for the background writer, or write it now if the queue is disabled."""
+    if chat_log is not None:
+        chat_log.submit(user_input, reply, session_id)
+    else:
+        db.log_chat(user_input, reply, session_id)
+
+
+def current_nlp():
+    """The shared processor. If the FAQs changed in the database (checked at most
+    every NLP_FAQ_SYNC_SECONDS) a background thread retrains and swaps in a new
+    one; this request keeps the current index (see NLPEngine.sync_in_background)."""
+    # Questions answered from general knowledge may have an FAQ after a sync
+    nlp_engine.sync_in_background(db.faq_version, lambda: db.get_faqs(force_refresh=True),
+                                  on_change=smart_cache.purge)
+    return nlp_engine.get()
+
+
+def gemini_ready() -> bool:
+    """Gemini is configured and its circuit breaker is letting calls through."""
+    return gemini is not None and gemini.guard.allows_calls()
+
+
+def enhancement_cache_key(nlp, user_input: str, response_data: dict) -> str:
+    """Normalized question + matched FAQ (id and answer version) + prompt template."""
+    return cache_key(
+        nlp.normalize_question(user_input),
+        response_data.get('id_faq'),
+        content_version(response_data['reply']),
+        gemini.faq_prompt_fingerprint()
+    )
+
+
+def smart_mode_answer(nlp, llm, user_input: str, similar_questions) -> tuple:
+    """Gemini Smart Mode answer, or the cached answer to a close paraphrase. Returns (reply, from_cache)."""
+    scope = gemini.smart_prompt_fingerprint()
+    hit = smart_cache.lookup(user_input, scope, nlp.text_features, nlp.features_similarity)
+    if hit:
+        answer, cached_question, similarity = hit
+        print(f"   ⚡ Smart answer from cache ({similarity:.2f} ~ \"{cached_question[:50]}\")")
+        return answer, True
+
+    reply = llm.run(gemini.answer_zakat_question, user_input, matched_questions=similar_questions)
+    if not isinstance(reply, FallbackText):
+        smart_cache.store(user_input, scope, reply, nlp.text_features)
+    return reply, False
+
+
 def maybe_apply_kedah_slang(text: str) -> str:
     """Convert static responses to Kedah slang if Gemini service is available."""
     if gemini:
@@ -71,15 +134,21 @@ def chat():
         
         print(f"\n💬 [{session_id[:8]}] User: {user_input}")
         
+        nlp = current_nlp()
+        # Every Gemini call below shares this request's deadline; past it the
+        # FAQ / static answer is returned and the late Gemini reply is dropped
+        llm = LLMDeadline()
+        
         # Analyze intent
         intent = nlp.analyze_user_intent(user_input)
         print(f"   🎯 Intent: {intent}")
         
         # Handle greetings
         if intent['is_greeting']:
-            if gemini:
+            if gemini_ready():
                 try:
-                    greeting = gemini.generate_conversational_response(
+                    greeting = llm.run(
+                        gemini.generate_conversational_response,
                         user_input, 
                         context="User is greeting ZAKIA chatbot"
                     )
@@ -107,13 +176,13 @@ def chat():
                     "intent": "greeting"
                 }
             
-            db.log_chat(user_input, response['reply'], session_id)
+            log_chat(user_input, response['reply'], session_id)
             return jsonify(response)
         
         # Handle thanks
         if intent['is_thanks']:
             reply = maybe_apply_kedah_slang("Sama-sama! 😊 Saya gembira dapat membantu. Ada lagi soalan?")
-            db.log_chat(user_input, reply, session_id)
+            log_chat(user_input, reply, session_id)
             return jsonify({
                 "reply": reply,
                 "session_id": session_id,
@@ -123,7 +192,7 @@ def chat():
         # Handle goodbye
         if intent['is_goodbye']:
             reply = maybe_apply_kedah_slang("Terima kasih! Semoga bermanfaat. Jumpa lagi! 👋")
-            db.log_chat(user_input, reply, session_id)
+            log_chat(user_input, reply, session_id)
             nlp.clear_session_context(session_id)
             return jsonify({
                 "reply": reply,
@@ -131,27 +200,31 @@ def chat():
                 "intent": "goodbye"
             })
         
-        # Ensure database connection
-        if not db.connection or not db.connection.is_connected():
-            print("   ⚠️ Reconnecting to database...")
-            if not db.connect():
-                return jsonify({
-                "reply": maybe_apply_kedah_slang("Maaf, sistem sedang mengalami masalah. Sila cuba lagi. 😅"),
-                }), 500
+        # FAQs are served from the shared index; the database is only read
+        # here when no snapshot or training file has been built yet
+        if not nlp.faq_store:
+            if not db.connection or not db.connection.is_connected():
+                print("   ⚠️ Reconnecting to database...")
+                if not db.connect():
+                    return jsonify({
+                    "reply": maybe_apply_kedah_slang("Maaf, sistem sedang mengalami masalah. Sila cuba lagi. 😅"),
+                    }), 500
+            
+            faqs = db.get_faqs()
+            if faqs and nlp_engine.initialize(lambda: faqs):
+                nlp = nlp_engine.get()
         
-        # Get FAQs
-        faqs = db.get_faqs()
-        if not faqs:
+        if not nlp.faq_store:
             print("   ❌ No FAQs available")
             
             # Use Gemini to answer directly (no FAQ available)
-            if gemini:
+            if gemini_ready():
                 try:
                     print("   🤖 No FAQs - Using Gemini knowledge...")
-                    reply = gemini.answer_zakat_question(user_input, matched_questions=None)
+                    reply = llm.run(gemini.answer_zakat_question, user_input, matched_questions=None)
                     reply = add_emoji_if_missing(reply)
                     
-                    db.log_chat(user_input, reply, session_id)
+                    log_chat(user_input, reply, session_id)
                     return jsonify({
                         "reply": reply,
                         "session_id": session_id,
@@ -168,12 +241,11 @@ def chat():
                 "session_id": session_id
             }), 500
         
-        print(f"   📚 Loaded {len(faqs)} FAQs")
+        print(f"   📚 {len(nlp.faq_store)} FAQs indexed")
         
         # Find best FAQ match
         response_data = nlp.generate_response(
             user_input, 
-            faqs, 
             session_id=session_id,
             threshold=0.25
         )
@@ -189,30 +261,42 @@ def chat():
         # DECISION TREE
         final_reply = faq_answer
         enhanced_by_gemini = False
+        from_cache = False
         answer_source = "faq"
         
-        if gemini:
+        if gemini_ready():
             try:
                 # HIGH CONFIDENCE (0.75+) = FAQ match found - enhance it
                 if confidence >= 0.75 and matched_question:
-                    print(f"   ✅ Good FAQ match - Enhancing with Gemini...")
-                    enhanced_reply = gemini.enhance_faq_response(
-                        user_input,
-                        faq_answer,
-                        context={'matched_question': matched_question, 'confidence': confidence}
-                    )
-                    
-                    # Validate enhancement
-                    import re
-                    faq_numbers = set(re.findall(r'\d+(?:\.\d+)?', faq_answer))
-                    enhanced_numbers = set(re.findall(r'\d+(?:\.\d+)?', enhanced_reply))
-                    
-                    if enhanced_numbers - faq_numbers:
-                        print(f"   ⚠️ Enhancement changed numbers, using FAQ")
-                        final_reply = add_emoji_if_missing(faq_answer)
-                    else:
-                        final_reply = add_emoji_if_missing(enhanced_reply)
+                    enhance_key = enhancement_cache_key(nlp, user_input, response_data)
+                    cached_reply = response_cache.get(enhance_key)
+                    if cached_reply is not None:
+                        print("   ⚡ Good FAQ match - enhanced answer from cache")
+                        final_reply = add_emoji_if_missing(cached_reply)
                         enhanced_by_gemini = True
+                        from_cache = True
+                    else:
+                        print(f"   ✅ Good FAQ match - Enhancing with Gemini...")
+                        enhanced_reply = llm.run(
+                            gemini.enhance_faq_response,
+                            user_input,
+                            faq_answer,
+                            context={'matched_question': matched_question, 'confidence': confidence,
+                                     'category': response_data.get('category')}
+                        )
+                        
+                        # Validate enhancement
+                        faq_numbers = set(re.findall(r'\d+(?:\.\d+)?', faq_answer))
+                        enhanced_numbers = set(re.findall(r'\d+(?:\.\d+)?', enhanced_reply))
+                        
+                        if enhanced_numbers - faq_numbers:
+                            print(f"   ⚠️ Enhancement changed numbers, using FAQ")
+                            final_reply = add_emoji_if_missing(faq_answer)
+                        else:
+                            final_reply = add_emoji_if_missing(enhanced_reply)
+                            enhanced_by_gemini = True
+                            if not isinstance(enhanced_reply, FallbackText):
+                                response_cache.put(enhance_key, enhanced_reply)
                     
                     answer_source = "faq_enhanced"
                 
@@ -225,10 +309,7 @@ def chat():
                     similar_questions = response_data.get('similar_questions', [])
                     
                     # Use Gemini's smart answering
-                    smart_reply = gemini.answer_zakat_question(
-                        user_input,
-                        matched_questions=similar_questions
-                    )
+                    smart_reply, from_cache = smart_mode_answer(nlp, llm, user_input, similar_questions)
                     
                     final_reply = add_emoji_if_missing(smart_reply)
                     enhanced_by_gemini = True
@@ -243,21 +324,28 @@ def chat():
                     similar_questions = response_data.get('similar_questions', [])
                     
                     # Gemini answers using its knowledge
-                    smart_reply = gemini.answer_zakat_question(
-                        user_input,
-                        matched_questions=similar_questions
-                    )
+                    smart_reply, from_cache = smart_mode_answer(nlp, llm, user_input, similar_questions)
                     
                     final_reply = add_emoji_if_missing(smart_reply)
                     enhanced_by_gemini = True
                     answer_source = "gemini_knowledge"
                 
+            except GeminiTimeout as timeout:
+                print(f"   ⏱️ {timeout} - using FAQ answer")
+                final_reply = add_emoji_if_missing(faq_answer)
+                enhanced_by_gemini = False
+                answer_source = "faq_timeout"
             except Exception as gemini_error:
                 print(f"   ❌ Gemini error: {gemini_error}")
                 traceback.print_exc()
                 final_reply = add_emoji_if_missing(faq_answer)
                 enhanced_by_gemini = False
                 answer_source = "faq_fallback"
+        elif gemini:
+            # Breaker open: answer now instead of queueing behind a failing API
+            print("   🔌 Gemini circuit open, using FAQ only")
+            final_reply = add_emoji_if_missing(faq_answer)
+            answer_source = "faq_circuit_open"
         else:
             print(f"   ℹ️ Gemini not available, using FAQ only")
             final_reply = add_emoji_if_missing(faq_answer)
@@ -265,7 +353,7 @@ def chat():
         
         # Log chat
         try:
-            db.log_chat(user_input, final_reply, session_id)
+            log_chat(user_input, final_reply, session_id)
         except Exception as log_error:
             print(f"   ⚠️ Log error: {log_error}")
         
@@ -279,6 +367,7 @@ def chat():
             "category": response_data.get('category', 'Umum'),
             "enhanced_by_gemini": enhanced_by_gemini,
             "answer_source": answer_source,
+            "from_cache": from_cache,
             "gemini_available": gemini is not None,
             "intent": intent
         })
@@ -293,11 +382,196 @@ def chat():
             "error": str(e)
         }), 500
 
+def _sse(event: str, data: dict) -> str:
+    """One Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@chat_bp.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    Frames, in order:
+        faq      FAQ match (sent before any Gemini call)
+        token    reply text as Gemini produces it (repeated)
+        replace  the streamed text must not stand (timeout, error, or an answer
+                 failing the validation /chat applies); the client shows `text`
+        done     final metadata; `replace` says whether the reply was replaced
+    """
+    data = request.get_json(silent=True) or {}
+    user_input = (data.get("message") or "").strip()
+    session_id = data.get("session_id") or str(uuid.uuid4())
+
+    def stream_reply():
+        if not user_input:
+            yield _sse("token", {"text": "Sila masukkan soalan anda. 😊"})
+            yield _sse("done", {"session_id": session_id, "answer_source": "none", "replace": False})
+            return
+
+        print(f"\n💬 [{session_id[:8]}] User (stream): {user_input}")
+        nlp = current_nlp()
+        intent = nlp.analyze_user_intent(user_input)
+
+        # Greetings, thanks and goodbyes are short static replies
+        static_reply = None
+        if intent['is_greeting']:
+            static_reply, intent_name = "Assalamualaikum! 👋 Saya ZAKIA dari LZNK. Bagaimana saya boleh membantu anda? 😊", "greeting"
+        elif intent['is_thanks']:
+            static_reply, intent_name = "Sama-sama! 😊 Saya gembira dapat membantu. Ada lagi soalan?", "thanks"
+        elif intent['is_goodbye']:
+            static_reply, intent_name = "Terima kasih! Semoga bermanfaat. Jumpa lagi! 👋", "goodbye"
+            nlp.clear_session_context(session_id)
+        if static_reply:
+            reply = maybe_apply_kedah_slang(static_reply)
+            yield _sse("token", {"text": reply})
+            yield _sse("done", {"session_id": session_id, "intent": intent_name, "replace": False})
+            log_chat(user_input, reply, session_id)
+            return
+
+        if not nlp.faq_store and nlp_engine.initialize(db.get_faqs):
+            nlp = nlp_engine.get()
+
+        response_data = nlp.generate_response(user_input, session_id=session_id, threshold=0.25)
+        confidence = response_data.get('confidence', 0)
+        matched_question = response_data.get('matched_question')
+        faq_answer = response_data['reply']
+        similar_questions = response_data.get('similar_questions', [])
+
+        yield _sse("faq", {
+            "session_id": session_id,
+            "matched_question": matched_question if confidence >= 0.45 else None,
+            "confidence": round(confidence, 3),
+            "confidence_level": response_data.get('confidence_level', 'none'),
+            "category": response_data.get('category', 'Umum'),
+            "similar_questions": similar_questions
+        })
+
+        enhancing = confidence >= 0.75 and matched_question is not None
+        streamed = []
+        # Reply text the client has been sent as tokens
+        sent = ""
+        replace = False
+        enhanced_by_gemini = False
+        cached_reply = None
+        if gemini and enhancing:
+            enhance_key = enhancement_cache_key(nlp, user_input, response_data)
+            cached_reply = response_cache.get(enhance_key)
+        elif gemini:
+            smart_scope = gemini.smart_prompt_fingerprint()
+            hit = smart_cache.lookup(user_input, smart_scope, nlp.text_features, nlp.features_similarity)
+            cached_reply = hit[0] if hit else None
+        if cached_reply is not None:
+            final_reply, enhanced_by_gemini = cached_reply.strip(), True
+            answer_source = "faq_enhanced" if enhancing else "gemini_knowledge"
+            sent = final_reply
+            yield _sse("token", {"text": final_reply})
+        elif gemini_ready():
+            llm = LLMDeadline(GEMINI_STREAM_DEADLINE_SECONDS)
+            shown = lambda text: text
+            try:
+                if enhancing:
+                    chunks = llm.stream(
+                        gemini.stream_faq_response,
+                        user_input,
+                        faq_answer,
+                        context={'matched_question': matched_question, 'confidence': confidence,
+                                 'category': response_data.get('category')}
+                    )
+                    answer_source = "faq_enhanced"
+                else:
+                    # Raw model text: validated before the slang conversion, as in /chat
+                    chunks = llm.stream(gemini.stream_zakat_answer, user_input, matched_questions=similar_questions)
+                    answer_source = "gemini_knowledge"
+                    shown = gemini._convert_to_kedah_slang
+
+                for text in chunks:
+                    streamed.append(text)
+                    yield _sse("token", {"text": shown(text)})
+                sent = "".join(shown(text) for text in streamed).strip()
+                final_reply = "".join(streamed).strip()
+                enhanced_by_gemini = True
+
+                # Same checks as /chat before the streamed text is kept
+                if enhancing and set(re.findall(r'\d+(?:\.\d+)?', final_reply)) - set(re.findall(r'\d+(?:\.\d+)?', faq_answer)):
+                    print("   ⚠️ Enhancement changed numbers, using FAQ")
+                    final_reply, replace, enhanced_by_gemini = faq_answer, True, False
+                elif enhancing:
+                    final_reply = gemini.finalize_faq_answer(final_reply, faq_answer)
+                    # Only text that passed /chat's validation is shared through the cache
+                    if not isinstance(final_reply, FallbackText):
+                        response_cache.put(enhance_key, final_reply)
+                else:
+                    final_reply = gemini.finalize_smart_answer(final_reply, user_input, similar_questions)
+                    if not isinstance(final_reply, FallbackText):
+                        smart_cache.store(user_input, smart_scope, final_reply, nlp.text_features)
+                if isinstance(final_reply, FallbackText):
+                    print("   ⚠️ Streamed answer failed validation, replacing it")
+                    replace, enhanced_by_gemini = True, False
+                    if enhancing:
+                        answer_source = "faq_fallback"
+            except GeminiTimeout as timeout:
+                print(f"   ⏱️ {timeout} - using FAQ answer")
+                final_reply, replace, answer_source = faq_answer, True, "faq_timeout"
+            except GeminiUnavailable as unavailable:
+                print(f"   🔌 {unavailable} - using FAQ answer")
+                final_reply, replace, answer_source = faq_answer, True, "faq_circuit_open"
+            except Exception as gemini_error:
+                print(f"   ❌ Gemini error: {gemini_error}")
+                final_reply, replace, answer_source = faq_answer, True, "faq_fallback"
+        else:
+            final_reply = faq_answer
+            answer_source = "faq_circuit_open" if gemini else "faq_only"
+            sent = final_reply
+            yield _sse("token", {"text": final_reply})
+
+        reply = add_emoji_if_missing(final_reply)
+        if not replace and not reply.startswith(sent):
+            # Finalizing rewrote the streamed text rather than appending to it
+            replace = True
+        if replace:
+            yield _sse("replace", {"text": reply})
+        elif len(reply) > len(sent):
+            yield _sse("token", {"text": reply[len(sent):]})
+
+        yield _sse("done", {
+            "session_id": session_id,
+            "reply": reply,
+            "replace": replace,
+            "enhanced_by_gemini": enhanced_by_gemini,
+            "from_cache": cached_reply is not None,
+            "answer_source": answer_source,
+            "gemini_available": gemini is not None,
+            "intent": intent
+        })
+
+        try:
+            log_chat(user_input, reply, session_id)
+        except Exception as log_error:
+            print(f"   ⚠️ Log error: {log_error}")
+
+    def generate():
+        try:
+            yield from stream_reply()
+        except Exception as e:
+            # Whatever was streamed so far is replaced rather than left cut off
+            print(f"\n❌ CHAT STREAM ERROR: {e}")
+            traceback.print_exc()
+            reply = "Maaf, berlaku ralat. Sila cuba lagi. 😅"
+            yield _sse("replace", {"text": reply})
+            yield _sse("done", {"session_id": session_id, "reply": reply, "replace": True,
+                                "answer_source": "error", "error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @chat_bp.route("/chat/history/<session_id>", methods=["GET"])
 def get_chat_history(session_id):
     """Get conversation history"""
     try:
-        history = nlp.get_conversation_history(session_id)
+        history = nlp_engine.get().get_conversation_history(session_id)
         return jsonify({
             "success": True,
             "session_id": session_id,
@@ -311,7 +585,7 @@ def get_chat_history(session_id):
 def clear_chat_context(session_id):
     """Clear conversation context"""
     try:
-        nlp.clear_session_context(session_id)
+        nlp_engine.get().clear_session_context(session_id)
         return jsonify({
             "success": True,
             "message": "Context cleared",
@@ -324,8 +598,9 @@ def clear_chat_context(session_id):
 def health_check():
     """Health check"""
     try:
-        db_status = "connected" if (db.connection and db.connection.is_connected()) else "disconnected"
+        db_status = "connected" if db.ensure_connection() else "disconnected"
         gemini_status = "enabled" if gemini else "disabled"
+        nlp = nlp_engine.get()
         nlp_trained = len(nlp.training_pairs) > 0
         
         faq_count = 0
@@ -339,16 +614,32 @@ def health_check():
             "status": "healthy",
             "message": "ZAKIA Chatbot - SMART MODE",
             "components": {
-                "database": {"status": db_status, "faq_count": faq_count},
+                "database": {
+                    "status": db_status,
+                    "faq_count": faq_count,
+                    "faq_cache": DatabaseManager.faq_cache_stats(),
+                    "user_cache": DatabaseManager.user_cache_stats(),
+                    "pool": DatabaseManager.pool_stats(),
+                    "chat_log_queue": chat_log.stats() if chat_log is not None else {"mode": "sync"}
+                },
                 "nlp": {
                     "trained": nlp_trained,
                     "training_pairs": len(nlp.training_pairs),
-                    "keywords": len(nlp.keyword_index)
+                    "keywords": len(nlp.keyword_index),
+                    "cache": nlp.cache_stats(),
+                    "sessions": nlp.sessions.stats(),
+                    "engine": nlp_engine.stats()
                 },
                 "gemini": {
                     "status": gemini_status,
                     "enabled": gemini is not None,
                     "mode": "smart_fallback",
+                    "model": gemini.model_status() if gemini else None,
+                    "guard": gemini.guard.stats() if gemini else None,
+                    "tokens": TOKEN_USAGE.stats(),
+                    "executor": executor_stats(),
+                    "response_cache": response_cache.stats(),
+                    "smart_cache": smart_cache.stats(),
                     "description": "FAQ tersedia = guna FAQ | FAQ tiada = guna pengetahuan Gemini"
                 }
             },
@@ -373,6 +664,7 @@ def test_gemini():
     
     try:
         result = gemini.test_connection()
+        result["guard"] = gemini.guard.stats()
         return jsonify(result)
     except Exception as e:
         return jsonify({
@@ -398,12 +690,11 @@ def test_smart_mode():
                 "question": test_question
             }), 503
         
-        # Get FAQs
-        faqs = db.get_faqs() if db.connection else []
-        
-        # Try to match FAQ
+        # Try to match FAQ against the shared index
+        nlp = nlp_engine.get()
+        faqs = nlp.training_pairs
         if faqs:
-            response_data = nlp.generate_response(test_question, faqs, threshold=0.25)
+            response_data = nlp.generate_response(test_question, threshold=0.25)
             confidence = response_data.get('confidence', 0)
             matched_faq = response_data.get('matched_question')
             
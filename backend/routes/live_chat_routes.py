@@ -114,9 +114,9 @@ def get_pending_response():
         # CRITICAL FIX: Get a fresh connection to ensure we see the latest committed data
         # The admin route uses a different connection, so we need to ensure we see its commits
         try:
-            # Close existing connection to force a new one from the pool
+            # Return the current lease to force a new one from the pool
             if db.connection and db.connection.is_connected():
-                db.connection.close()
+                db.close()
                 logger.info("   🔄 Closed existing connection to get fresh one")
             
             # Get a new connection that will see the latest commits
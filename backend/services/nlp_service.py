@@ -3,32 +3,33 @@ NLP Service for ZAKIA Chatbot
 Handles NLP initialization and training
 """
 
-from nlp_processor import NLPProcessor
+from nlp_engine import get_nlp_engine
 from database import DatabaseManager
 
 class NLPService:
     def __init__(self):
-        self.nlp = NLPProcessor()
+        self.engine = get_nlp_engine()
         self.db = DatabaseManager()
-    
+
+    @property
+    def nlp(self):
+        return self.engine.get()
+
     def initialize_nlp(self):
         """Initialize and train the NLP model"""
         print("🚀 Initializing NLP model...")
-        
-        # Try to load pre-trained data
-        if self.nlp.load_training_data('training_data.json'):
+
+        # The engine loads the binary snapshot or training_data.json on first
+        # use; train from the database only when neither exists
+        if self.engine.is_trained():
             print("✅ Loaded pre-trained model")
         else:
-            # Train from scratch
             print("📚 Training model from FAQ data...")
-            faqs = self.db.get_faqs()
-            if faqs:
-                self.nlp.train_from_faqs(faqs)
-                self.nlp.save_training_data('training_data.json')
+            if self.engine.initialize(self.db.get_faqs):
                 print("✅ Model trained and saved")
             else:
                 print("⚠️ No FAQ data available for training")
-    
+
     def get_nlp_processor(self):
         """Get the NLP processor instance"""
-        return self.nlp
+        return self.engine.get()
@@ -0,0 +1,259 @@
+"""
+Session context store for NLPProcessor
+Keeps each session's recent messages and keyword counts (used for the
+context boost in FAQ matching) with bounded memory: max sessions, idle TTL,
+LRU eviction and an approximate byte ceiling.
+
+Backends:
+    memory  in-process OrderedDict (default)
+    redis   any Redis-compatible server, so context is shared by every
+            gunicorn worker; idle TTL is a key expiry and the memory ceiling
+            is the server's own maxmemory / allkeys-lru policy; while the
+            server is unreachable requests get no session context
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# redis-py is optional; only needed for SESSION_STORE_BACKEND=redis
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None  # type: ignore
+    REDIS_AVAILABLE = False
+
+# What a Redis outage raises: redis-py's errors, or socket errors from other clients
+REDIS_ERRORS = (redis.RedisError, OSError) if REDIS_AVAILABLE else (OSError,)
+
+# Rough per-object overheads used for the memory estimate
+_ENTRY_OVERHEAD = 240
+_KEYWORD_OVERHEAD = 80
+_SESSION_OVERHEAD = 512
+
+
+class _Session:
+    __slots__ = ('history', 'keywords', 'last_seen', 'size')
+
+    def __init__(self):
+        self.history: List[Dict] = []
+        self.keywords: Dict[str, int] = {}
+        self.last_seen = time.monotonic()
+        self.size = _SESSION_OVERHEAD
+
+
+def _entry_size(entry: Dict) -> int:
+    return _ENTRY_OVERHEAD + len(entry.get('message', '')) + sum(len(k) for k in entry.get('keywords', ()))
+
+
+class InMemorySessionStore:
+    backend = 'memory'
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: float = 1800,
+                 max_bytes: int = 64 * 1024 * 1024, max_history: int = 15):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_history = max_history
+        # session_id -> _Session, least recently used first
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = {'lru': 0, 'ttl': 0, 'memory': 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _live(self, session_id: str) -> Optional[_Session]:
+        """Session if present and not idle past the TTL; marks it most recently used."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_seen > self.ttl_seconds:
+            self._drop(session_id, 'ttl')
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id: str, reason: str = None):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.size
+            if reason:
+                self._evictions[reason] += 1
+
+    def _evict(self):
+        now = time.monotonic()
+        # Idle sessions first; the oldest are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen <= self.ttl_seconds:
+                break
+            self._drop(session_id, 'ttl')
+        while len(self._sessions) > self.max_sessions:
+            self._drop(next(iter(self._sessions)), 'lru')
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)), 'memory')
+
+    def append(self, session_id: str, entry: Dict, keywords: List[str] = ()):
+        """Add one message to the session history and count its keywords."""
+        with self._lock:
+            session = self._live(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session()
+                self._bytes += session.size
+            session.last_seen = time.monotonic()
+
+            added = _entry_size(entry)
+            session.history.append(entry)
+            while len(session.history) > self.max_history:
+                added -= _entry_size(session.history.pop(0))
+            for keyword in keywords:
+                if keyword not in session.keywords:
+                    added += _KEYWORD_OVERHEAD + len(keyword)
+                session.keywords[keyword] = session.keywords.get(keyword, 0) + 1
+            session.size += added
+            self._bytes += added
+            self._evict()
+
+    def history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            session = self._live(session_id)
+            return list(session.history) if session else []
+
+    def keywords(self, session_id: str) -> Dict[str, int]:
+        with self._lock:
+            session = self._live(session_id)
+            return dict(session.keywords) if session else {}
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'sessions': len(self._sessions),
+                'approx_bytes': self._bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'evictions': dict(self._evictions)
+            }
+
+
+class RedisSessionStore:
+    backend = 'redis'
+
+    def __init__(self, client, ttl_seconds: float = 1800, max_history: int = 15,
+                 prefix: str = 'zakia:session:'):
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds)
+        self.max_history = max_history
+        self.prefix = prefix
+        # Sorted set of session ids scored by last activity, so counting
+        # sessions does not scan the keyspace
+        self.active_key = f"{prefix}active"
+
+    def _keys(self, session_id: str):
+        return f"{self.prefix}{session_id}:history", f"{self.prefix}{session_id}:keywords"
+
+    @staticmethod
+    def _unavailable(action: str, error: Exception):
+        # A Redis outage costs the request its context, not the request itself
+        print(f"⚠️ Redis session store {action} failed ({error}) — continuing without session context")
+
+    def __len__(self) -> int:
+        """Sessions active within the TTL (sessions the server evicted early still count)."""
+        try:
+            pipe = self.client.pipeline()
+            pipe.zremrangebyscore(self.active_key, '-inf', time.time() - self.ttl_seconds)
+            pipe.zcard(self.active_key)
+            return int(pipe.execute()[-1])
+        except REDIS_ERRORS as e:
+            self._unavailable('count', e)
+            return 0
+
+    def append(self, session_id: str, entry: Dict, keywords: List[str] = ()):
+        history_key, keywords_key = self._keys(session_id)
+        try:
+            pipe = self.client.pipeline()
+            pipe.zadd(self.active_key, {session_id: time.time()})
+            pipe.expire(self.active_key, self.ttl_seconds)
+            pipe.rpush(history_key, json.dumps(entry, ensure_ascii=False))
+            pipe.ltrim(history_key, -self.max_history, -1)
+            for keyword in keywords:
+                pipe.hincrby(keywords_key, keyword, 1)
+            pipe.expire(history_key, self.ttl_seconds)
+            pipe.expire(keywords_key, self.ttl_seconds)
+            pipe.execute()
+        except REDIS_ERRORS as e:
+            self._unavailable('write', e)
+
+    def history(self, session_id: str) -> List[Dict]:
+        history_key, _ = self._keys(session_id)
+        try:
+            items = self.client.lrange(history_key, 0, -1)
+        except REDIS_ERRORS as e:
+            self._unavailable('read', e)
+            return []
+        return [json.loads(item) for item in items]
+
+    def keywords(self, session_id: str) -> Dict[str, int]:
+        _, keywords_key = self._keys(session_id)
+        try:
+            counts = self.client.hgetall(keywords_key)
+        except REDIS_ERRORS as e:
+            self._unavailable('read', e)
+            return {}
+        return {(k.decode('utf-8') if isinstance(k, bytes) else k): int(v) for k, v in counts.items()}
+
+    def clear(self, session_id: str):
+        try:
+            pipe = self.client.pipeline()
+            pipe.delete(*self._keys(session_id))
+            pipe.zrem(self.active_key, session_id)
+            pipe.execute()
+        except REDIS_ERRORS as e:
+            self._unavailable('clear', e)
+
+    def stats(self) -> Dict:
+        stats = {'backend': self.backend, 'ttl_seconds': self.ttl_seconds}
+        try:
+            info = self.client.info('stats')
+            stats['evictions'] = {'server': info.get('evicted_keys', 0), 'ttl': info.get('expired_keys', 0)}
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+
+def create_session_store():
+    """Build the store selected by SESSION_STORE_BACKEND (memory or redis)."""
+    ttl = float(os.getenv('SESSION_TTL_SECONDS', '1800'))
+    max_history = int(os.getenv('SESSION_MAX_HISTORY', '15'))
+    backend = os.getenv('SESSION_STORE_BACKEND', 'memory').lower()
+
+    if backend == 'redis':
+        if not REDIS_AVAILABLE:
+            print("⚠️ redis package not installed — using in-process session store")
+        else:
+            url = os.getenv('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+            try:
+                client = redis.Redis.from_url(url)
+                client.ping()
+                print(f"✅ Session store: redis ({url})")
+                return RedisSessionStore(client, ttl_seconds=ttl, max_history=max_history)
+            except Exception as e:
+                print(f"⚠️ Redis session store unavailable ({e}) — using in-process session store")
+
+    return InMemorySessionStore(
+        max_sessions=int(os.getenv('SESSION_MAX_SESSIONS', '10000')),
+        ttl_seconds=ttl,
+        max_bytes=int(os.getenv('SESSION_MAX_BYTES', str(64 * 1024 * 1024))),
+        max_history=max_history
+    )
@@ -6,9 +6,15 @@ Handles all database operations using SQL Server instead of MySQL
 import pyodbc
 from sqlalchemy import create_engine, text
 import pandas as pd
+import atexit
 from datetime import datetime
+from user_activity import UserActivityTracker
 
 class SQLServerDatabaseManager:
+    # Class-level session -> user id cache; last_activity writes are batched
+    _user_activity = UserActivityTracker()
+    _activity_flush_registered = False
+
     def __init__(self, server=None, database=None, username=None, password=None):
         # SQL Server connection settings
         self.server = server or 'localhost'
@@ -16,6 +22,13 @@ class SQLServerDatabaseManager:
         self.username = username or 'sa'
         self.password = password or ''  # Change this to your SQL Server password
         self.engine = None
+
+        if not SQLServerDatabaseManager._activity_flush_registered:
+            SQLServerDatabaseManager._activity_flush_registered = True
+            atexit.register(self.flush_user_activity, True)
+            # The SQLAlchemy engine pools its own connections, so the flusher
+            # thread can write through this manager once it has connected
+            SQLServerDatabaseManager._user_activity.start_flusher(self.flush_user_activity)
         
     def connect(self):
         """Establish SQL Server connection using SQLAlchemy"""
@@ -284,9 +297,19 @@ class SQLServerDatabaseManager:
         """
         Get or create a user by session_id.
         Returns user_id if successful, None otherwise.
+        Known sessions come from the class-level cache; last_activity is
+        written in batches by the flusher thread (or at exit).
         """
         if not session_id or not self.engine:
             return None
+
+        tracker = SQLServerDatabaseManager._user_activity
+        user_id = tracker.user_id(session_id)
+        if user_id is not None:
+            tracker.touch(user_id)
+            if tracker.write_through:
+                self.flush_user_activity()
+            return user_id
             
         try:
             with self.engine.connect() as conn:
@@ -295,15 +318,10 @@ class SQLServerDatabaseManager:
                 user_row = result.fetchone()
                 
                 if user_row:
-                    # User exists, update last_activity and return id
+                    # User exists, record activity and return id
                     user_id = user_row[0]
-                    conn.execute(text("""
-                        UPDATE users 
-                        SET last_activity = GETDATE() 
-                        WHERE id = ?
-                    """), (user_id,))
-                    conn.commit()
-                    return user_id
+                    tracker.remember(session_id, user_id)
+                    tracker.touch(user_id)
                 else:
                     # User doesn't exist, create new one
                     result = conn.execute(text("""
@@ -313,12 +331,47 @@ class SQLServerDatabaseManager:
                     """), (session_id,))
                     user_id = result.fetchone()[0]
                     conn.commit()
+                    tracker.remember(session_id, user_id)
                     print(f"✅ Created new user with session_id: {session_id[:8]}... (id: {user_id})")
                     return user_id
                     
         except Exception as e:
             print(f"Error getting/creating user: {e}")
             return None
+
+        if tracker.write_through:
+            self.flush_user_activity()
+        return user_id
+
+    def flush_user_activity(self, force=False):
+        """Write recorded last_activity times in one transaction (at most once per
+        USER_ACTIVITY_FLUSH_SECONDS unless force). Failed rows wait for the next flush."""
+        tracker = SQLServerDatabaseManager._user_activity
+        rows = tracker.take_pending(force)
+        if not rows:
+            return True
+        if not self.engine:
+            tracker.restore(rows)
+            return False
+        try:
+            with self.engine.connect() as conn:
+                for when, user_id in rows:
+                    # Never move last_activity back (another worker may have written a later time)
+                    conn.execute(text("""
+                        UPDATE users SET last_activity = ?
+                        WHERE id = ? AND (last_activity IS NULL OR last_activity < ?)
+                    """), (when, user_id, when))
+                conn.commit()
+            tracker.flushed(rows)
+            return True
+        except Exception as e:
+            print(f"Error flushing user activity: {e}")
+            tracker.restore(rows)
+            return False
+
+    @classmethod
+    def user_cache_stats(cls):
+        return cls._user_activity.stats()
     
     def log_chat(self, user_message, bot_response, session_id=None):
         """Log chat interaction"""
@@ -0,0 +1,108 @@
+"""
+Test script for the BM25 candidate index
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bm25_index import BM25Index
+from nlp_processor import NLPProcessor
+
+DOCS = {
+    1: ['zakat', 'fitrah', 'beras'],
+    2: ['zakat', 'pendapatan', 'gaji', 'gaji'],
+    3: ['nisab', 'emas', 'zakat'],
+    4: ['lznk', 'pejabat', 'alor', 'setar'],
+}
+
+
+def _index():
+    index = BM25Index()
+    for doc_id, tokens in DOCS.items():
+        index.add_document(doc_id, tokens)
+    return index
+
+
+def test_search_ranks_rare_and_repeated_terms_first():
+    index = _index()
+    assert [doc for doc, _ in index.search(['gaji'])] == [2]
+    # 'fitrah' is in one document, 'zakat' in three, so the fitrah document wins
+    ranked = index.search(['zakat', 'fitrah'])
+    assert ranked[0][0] == 1
+    assert {doc for doc, _ in ranked} == {1, 2, 3}
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+    assert index.idf('fitrah') > index.idf('zakat')
+    assert len(index.search(['zakat'], top_k=2)) == 2
+    assert index.search(['hello']) == []
+    assert BM25Index().search(['zakat']) == []
+
+
+def test_re_adding_and_removing_documents():
+    index = _index()
+    index.add_document(2, ['zakat', 'fitrah'])
+    assert 'gaji' not in index.postings
+    assert index.total_length == sum(len(tokens) for doc, tokens in DOCS.items() if doc != 2) + 2
+
+    assert index.remove_document(4)
+    assert not index.remove_document(4)
+    assert 4 not in index and len(index) == 3
+    assert not any(term in index.postings for term in DOCS[4])
+
+
+def test_copy_is_isolated_both_ways():
+    original = _index()
+    clone = original.copy()
+    assert clone.postings['zakat'] is original.postings['zakat']
+
+    clone.add_document(5, ['zakat', 'kripto'])
+    clone.remove_document(1)
+    original.add_document(6, ['nisab', 'perak'])
+
+    assert set(original.postings['zakat']) == {1, 2, 3}
+    assert 'kripto' not in original.postings and 5 not in original
+    assert set(clone.postings['zakat']) == {2, 3, 5}
+    assert 6 not in clone.postings['nisab'] and 'perak' not in clone.postings
+    assert original.search(['fitrah'])[0][0] == 1
+    assert clone.search(['fitrah']) == []
+
+
+def test_load_postings_round_trip():
+    built = _index()
+    built.add_document(7, [])
+    loaded = BM25Index()
+    loaded.load_postings({term: dict(docs) for term, docs in built.postings.items()}, doc_ids=built.doc_lengths)
+
+    assert loaded.postings == built.postings
+    assert loaded.doc_terms == built.doc_terms
+    assert loaded.doc_lengths == built.doc_lengths
+    assert loaded.total_length == built.total_length
+    assert 7 in loaded
+    for query in (['zakat', 'fitrah'], ['gaji'], ['lznk', 'emas']):
+        assert loaded.search(query) == built.search(query)
+
+
+def test_question_without_index_terms_has_no_candidates():
+    faqs = [{'id_faq': i, 'question': f'Apa itu zakat jenis {i}?', 'answer': 'Zakat wajib.', 'category': 'Umum'}
+            for i in range(1, 6)]
+
+    # More FAQs than the candidate pool: nothing is retrieved, so nothing is scored
+    pooled = NLPProcessor(enable_gemini=False, candidate_pool_size=2)
+    pooled.train_from_faqs(faqs)
+    assert pooled._candidate_keys(pooled.extract_keywords('hello'), pooled.faq_store) == []
+    assert pooled.find_best_match('hello') == (None, 0.0)
+
+    # A table that fits in the pool is still scanned in full
+    scanned = NLPProcessor(enable_gemini=False, candidate_pool_size=50)
+    scanned.train_from_faqs(faqs)
+    assert len(scanned._candidate_keys(scanned.extract_keywords('hello'), scanned.faq_store)) == 5
+
+
+if __name__ == "__main__":
+    test_search_ranks_rare_and_repeated_terms_first()
+    test_re_adding_and_removing_documents()
+    test_copy_is_isolated_both_ways()
+    test_load_postings_round_trip()
+    test_question_without_index_terms_has_no_candidates()
+    print("✅ BM25 index tests passed")
@@ -0,0 +1,83 @@
+"""
+Test script for the write-behind chat log queue
+"""
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chat_log_queue import ChatLogQueue
+
+
+class FakeWriter:
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, rows):
+        self.gate.wait()
+        if self.fail_times:
+            self.fail_times -= 1
+            return False
+        self.batches.append(list(rows))
+        return True
+
+
+def test_rows_are_written_in_batches():
+    writer = FakeWriter()
+    writer.gate.clear()
+    log = ChatLogQueue(writer, batch_size=50, flush_seconds=0.01)
+    for i in range(120):
+        assert log.submit(f"soalan {i}", f"jawapan {i}", "s1")
+    writer.gate.set()
+    log.drain()
+
+    rows = [row for batch in writer.batches for row in batch]
+    assert [row[0] for row in rows] == [f"soalan {i}" for i in range(120)]
+    assert all(len(batch) <= 50 for batch in writer.batches)
+    assert len(writer.batches) < 120
+    assert log.stats()['written'] == 120
+
+
+def test_full_queue_drops_and_counts():
+    writer = FakeWriter()
+    writer.gate.clear()
+    log = ChatLogQueue(writer, capacity=5, batch_size=1, flush_seconds=0.01)
+    accepted = sum(log.submit("soalan", "jawapan", "s1") for _ in range(20))
+    # The writer holds one row, the queue holds `capacity` more
+    assert accepted <= 6
+    assert log.stats()['dropped'] == 20 - accepted
+
+    writer.gate.set()
+    log.drain()
+    assert log.stats()['written'] == accepted
+
+
+def test_failed_batch_is_retried():
+    writer = FakeWriter(fail_times=1)
+    log = ChatLogQueue(writer, flush_seconds=0.01, retry_delay=0.01)
+    log.submit("soalan", "jawapan", "s1")
+    time.sleep(0.2)
+    log.drain()
+    assert log.stats()['written'] == 1
+    assert log.stats()['failed'] == 0
+
+
+def test_submit_after_drain_is_dropped():
+    log = ChatLogQueue(FakeWriter(), flush_seconds=0.01)
+    log.drain()
+    assert not log.submit("soalan", "jawapan", "s1")
+    assert log.stats()['dropped'] == 1
+
+
+if __name__ == "__main__":
+    test_rows_are_written_in_batches()
+    test_full_queue_drops_and_counts()
+    test_failed_batch_is_retried()
+    test_submit_after_drain_is_dropped()
+    print("✅ Chat log queue tests passed")
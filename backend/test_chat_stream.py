@@ -0,0 +1,266 @@
+"""
+Test script for the /chat/stream Server-Sent Events endpoint
+Runs against a local fake Gemini model, so no API key or network is needed.
+"""
+
+import os
+import sys
+import json
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+import routes.chat_routes as chat_routes
+from gemini_service import GeminiService
+from llm_cache import ResponseCache, SmartAnswerCache
+from llm_guard import GeminiGuard
+from nlp_engine import NLPEngine
+from nlp_processor import NLPProcessor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# Keeps the FAQ's figures (1, 2) and ends with an emoji, so it passes FAQ validation
+VALID_CHUNKS = ["Zakat fitrah ", "wajib ke atas ", "setiap Muslim. ", "Perkara 1 dan 2 ", "dalam FAQ. ✅"]
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel.generate_content."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.prompts = []
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.prompts.append(prompt)
+        if stream:
+            return iter(FakeChunk(text) for text in self.chunks)
+        return FakeChunk("".join(self.chunks))
+
+
+class FakeDB:
+    def __init__(self):
+        self.logged = []
+
+    def log_chat(self, user_msg, bot_reply, session_id=None):
+        self.logged.append((user_msg, bot_reply, session_id))
+        return True
+
+    def get_faqs(self, force_refresh=False):
+        return []
+
+    def faq_version(self):
+        return None
+
+
+def _client(tmp_path, chunks):
+    # A copy: FAQ edits made by a test are persisted to the training file
+    training_file = str(tmp_path / 'training_data.json')
+    shutil.copy(os.path.join(HERE, 'training_data.json'), training_file)
+    engine = NLPEngine(
+        factory=lambda: NLPProcessor(enable_gemini=False),
+        snapshot_file=str(tmp_path / 'nlp_index.bin'),
+        training_file=training_file
+    )
+    model = FakeModel(chunks)
+    chat_routes.nlp_engine = engine
+    chat_routes.gemini = GeminiService(model=model, guard=GeminiGuard(rate_per_minute=0))
+    chat_routes.db = FakeDB()
+    # Log inline so the tests can see what was written
+    chat_routes.chat_log = None
+    chat_routes.response_cache = ResponseCache()
+    chat_routes.smart_cache = SmartAnswerCache()
+
+    app = Flask(__name__)
+    app.register_blueprint(chat_routes.chat_bp)
+    return app.test_client(), model
+
+
+def _frames(body):
+    frames = []
+    for block in body.decode('utf-8').strip().split('\n\n'):
+        event, data = block.split('\n', 1)
+        frames.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return frames
+
+
+def test_stream_sends_faq_then_tokens_then_done(tmp_path):
+    client, model = _client(tmp_path, VALID_CHUNKS)
+
+    response = client.post('/chat/stream', json={'message': 'apa itu zakat fitrah', 'session_id': 's1'})
+    assert response.mimetype == 'text/event-stream'
+    frames = _frames(response.data)
+    events = [event for event, _ in frames]
+
+    assert events[0] == 'faq'
+    assert events[-1] == 'done'
+    assert set(events[1:-1]) == {'token'}
+    assert frames[0][1]['session_id'] == 's1'
+    assert model.prompts, "Gemini was not called"
+
+    streamed = "".join(data['text'] for event, data in frames if event == 'token')
+    done = frames[-1][1]
+    assert done['replace'] is False
+    assert streamed.strip() == done['reply']
+    assert chat_routes.db.logged == [('apa itu zakat fitrah', done['reply'], 's1')]
+
+
+def test_repeated_question_served_from_cache(tmp_path):
+    client, model = _client(tmp_path, VALID_CHUNKS)
+
+    first = _frames(client.post('/chat/stream', json={'message': 'apa itu zakat fitrah'}).data)
+    assert first[0][1]['confidence'] >= 0.75
+    second = _frames(client.post('/chat/stream', json={'message': 'Zakat fitrah itu apa?'}).data)
+
+    assert len(model.prompts) == 1
+    assert second[-1][1]['from_cache'] is True
+    assert second[-1][1]['reply'] == first[-1][1]['reply']
+
+
+def test_stream_error_falls_back_to_faq(tmp_path):
+    client, model = _client(tmp_path, [])
+
+    def broken(prompt, generation_config=None, stream=False):
+        raise RuntimeError("quota exceeded")
+    model.generate_content = broken
+
+    frames = _frames(client.post('/chat/stream', json={'message': 'apa itu zakat fitrah'}).data)
+    done = frames[-1][1]
+    assert frames[-1][0] == 'done'
+    assert done['replace'] is True
+    assert done['answer_source'] == 'faq_fallback'
+    assert done['reply']
+    assert frames[-2] == ('replace', {'text': done['reply']})
+
+
+def test_invalid_stream_is_replaced_and_not_cached(tmp_path):
+    # Drops the FAQ's figures and uses a forbidden phrase: /chat would reject it too
+    client, model = _client(tmp_path, ["Zakat fitrah ", "biasanya wajib. ✅"])
+
+    frames = _frames(client.post('/chat/stream', json={'message': 'apa itu zakat fitrah'}).data)
+    events = [event for event, _ in frames]
+    done = frames[-1][1]
+    assert events[-2:] == ['replace', 'done']
+    assert done['replace'] is True
+    assert done['answer_source'] == 'faq_fallback'
+    assert 'biasanya' not in done['reply']
+    assert frames[-2][1]['text'] == done['reply']
+    assert chat_routes.response_cache.stats()['stores'] == 0
+
+    # Asked again, Gemini is called again rather than the rejected text being reused
+    _frames(client.post('/chat/stream', json={'message': 'apa itu zakat fitrah'}).data)
+    assert len(model.prompts) == 2
+
+
+def test_invalid_smart_answer_is_not_cached(tmp_path):
+    # Too short and unstructured for _validate_smart_answer
+    client, model = _client(tmp_path, ["Tak pasti."])
+
+    frames = _frames(client.post('/chat/stream', json={'message': 'zakat kripto macam mana'}).data)
+    assert frames[0][1]['confidence'] < 0.75
+    assert frames[-1][1]['replace'] is True
+    assert chat_routes.smart_cache.stats()['stores'] == 0
+
+
+def test_confused_smart_answer_is_validated_before_slang(tmp_path):
+    # Kedah slang would turn 'saya tidak tahu' into 'kami tidak tahu', slipping past validation
+    client, model = _client(tmp_path, ["Maaf saya tidak tahu ", "tentang zakat kripto.\n",
+                                       "• Sila hubungi LZNK untuk maklumat lanjut 😊"])
+
+    frames = _frames(client.post('/chat/stream', json={'message': 'zakat kripto macam mana'}).data)
+    tokens = "".join(data['text'] for event, data in frames if event == 'token')
+    assert 'kami tidak tahu' in tokens
+    done = frames[-1][1]
+    assert done['replace'] is True
+    assert 'tidak tahu' not in done['reply']
+    assert chat_routes.smart_cache.stats()['stores'] == 0
+
+
+def test_valid_smart_answer_streams_in_slang(tmp_path):
+    client, model = _client(tmp_path, ["Anda boleh ", "tunaikan zakat kripto.\n",
+                                       "• Kira 2.5% daripada nilai pegangan. ", "Saya cadangkan semak dengan LZNK 😊"])
+
+    frames = _frames(client.post('/chat/stream', json={'message': 'zakat kripto macam mana'}).data)
+    done = frames[-1][1]
+    assert done['replace'] is False and done['answer_source'] == 'gemini_knowledge'
+    tokens = "".join(data['text'] for event, data in frames if event == 'token')
+    assert tokens.strip() == done['reply']
+    assert done['reply'].startswith('hampa boleh tunaikan') and 'kami cadangkan' in done['reply']
+    assert chat_routes.smart_cache.stats()['stores'] == 1
+
+
+def test_single_faq_sync_purges_smart_cache(tmp_path):
+    import routes.admin_routes as admin_routes
+    _client(tmp_path, VALID_CHUNKS)
+    engine = chat_routes.nlp_engine
+    engine.initialize(lambda: [])
+    admin_routes.nlp_engine = engine
+    cache = admin_routes.get_smart_answer_cache()
+    nlp = engine.get()
+    cache.store('zakat kripto macam mana', 'scope', 'Jawapan lama 😊', nlp.text_features)
+
+    assert admin_routes.sync_nlp_faq(9999, {'id_faq': 9999, 'question': 'Zakat kripto macam mana?',
+                                            'answer': 'Jawapan baru.', 'category': 'Umum'})
+    assert len(cache) == 0
+
+
+def test_match_batch_validates_and_clamps_workers(tmp_path):
+    import routes.admin_routes as admin_routes
+    _client(tmp_path, VALID_CHUNKS)
+    admin_routes.nlp_engine = chat_routes.nlp_engine
+    seen = []
+    chat_routes.nlp_engine.get().match_batch = lambda questions, top_k, workers: seen.append(workers) or []
+    app = Flask(__name__)
+    app.register_blueprint(admin_routes.admin_bp)
+    client = app.test_client()
+
+    for bad in ('abc', -1, 2.5):
+        response = client.post('/admin/nlp/match-batch', json={'questions': ['zakat'], 'workers': bad})
+        assert response.status_code == 400, bad
+    assert client.post('/admin/nlp/match-batch', json={'questions': ['zakat'], 'workers': 10 ** 6}).status_code == 200
+    assert client.post('/admin/nlp/match-batch', json={'questions': ['zakat']}).status_code == 200
+    assert seen == [min(10 ** 6, os.cpu_count() or 1), None]
+
+
+def test_error_outside_gemini_ends_stream_cleanly(tmp_path):
+    client, model = _client(tmp_path, VALID_CHUNKS)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+    chat_routes.nlp_engine.get().generate_response = broken
+
+    frames = _frames(client.post('/chat/stream', json={'message': 'apa itu zakat fitrah'}).data)
+    assert [event for event, _ in frames] == ['replace', 'done']
+    assert frames[-1][1]['answer_source'] == 'error'
+
+
+def test_open_breaker_skips_gemini(tmp_path):
+    client, model = _client(tmp_path, ["tidak sepatutnya dipanggil"])
+    breaker = chat_routes.gemini.guard.breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    frames = _frames(client.post('/chat/stream', json={'message': 'apa itu zakat fitrah'}).data)
+    assert frames[-1][1]['answer_source'] == 'faq_circuit_open'
+    assert model.prompts == []
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_stream_sends_faq_then_tokens_then_done, test_repeated_question_served_from_cache,
+                 test_stream_error_falls_back_to_faq, test_invalid_stream_is_replaced_and_not_cached,
+                 test_invalid_smart_answer_is_not_cached,
+                 test_confused_smart_answer_is_validated_before_slang, test_valid_smart_answer_streams_in_slang,
+                 test_single_faq_sync_purges_smart_cache,
+                 test_match_batch_validates_and_clamps_workers, test_error_outside_gemini_ends_stream_cleanly, test_open_breaker_skips_gemini):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ chat stream tests passed")
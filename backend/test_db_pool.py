@@ -0,0 +1,159 @@
+"""
+Test script for per-request connection leases from the MySQL pool
+"""
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from mysql.connector import pooling
+import database
+from database import DatabaseManager
+
+
+class FakeConnection:
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+
+    def is_connected(self):
+        return True
+
+    def ping(self, **kwargs):
+        pass
+
+    def close(self):
+        self.pool.free.append(self)
+
+
+class FakePool:
+    def __init__(self, size):
+        self.free = []
+        for i in range(size):
+            self.free.append(FakeConnection(self, i))
+
+    def get_connection(self):
+        if not self.free:
+            raise pooling.PoolError("Failed getting connection; pool exhausted")
+        return self.free.pop()
+
+
+def _install_pool(size, timeout=0.2):
+    pool = FakePool(size)
+    DatabaseManager._pool = pool
+    DatabaseManager.POOL_TIMEOUT = timeout
+    DatabaseManager._leased.clear()
+    for key in DatabaseManager._pool_stats:
+        DatabaseManager._pool_stats[key] = 0
+    return pool
+
+
+def _manager():
+    db = DatabaseManager.__new__(DatabaseManager)
+    db._connection = None
+    db.max_retries = 1
+    db.retry_delay = 0
+    return db
+
+
+def _app():
+    app = Flask(__name__)
+    DatabaseManager.init_app(app)
+    return app
+
+
+def test_lease_outside_request_is_returned():
+    pool = _install_pool(2)
+    try:
+        with _manager().lease():
+            assert len(pool.free) == 1
+            assert DatabaseManager.pool_stats()['in_use'] == 1
+        assert len(pool.free) == 2
+        stats = DatabaseManager.pool_stats()
+        assert stats['checkouts'] == 1 and stats['returned'] == 1 and stats['in_use'] == 0
+    finally:
+        DatabaseManager._pool = None
+
+
+def test_managers_share_one_lease_per_request():
+    pool = _install_pool(3)
+    app = _app()
+    shared, local = _manager(), _manager()
+    try:
+        with app.test_request_context('/chat'):
+            assert shared.connect()
+            assert local.connect()
+            assert shared.connection is local.connection
+            assert len(pool.free) == 2
+            app.do_teardown_request()
+            assert shared.connection is None
+        assert len(pool.free) == 3
+
+        with app.test_request_context('/chat'):
+            assert shared.connection is None
+    finally:
+        DatabaseManager._pool = None
+
+
+def test_close_returns_lease_once():
+    pool = _install_pool(2)
+    app = _app()
+    db = _manager()
+    try:
+        with app.test_request_context('/chat'):
+            assert db.connect()
+            db.close()
+            assert len(pool.free) == 2
+            assert db.connect()
+            app.do_teardown_request()
+        assert len(pool.free) == 2
+        assert DatabaseManager.pool_stats()['returned'] == 2
+    finally:
+        DatabaseManager._pool = None
+
+
+def test_checkout_waits_for_a_returned_connection():
+    _install_pool(1, timeout=2)
+    try:
+        held = DatabaseManager._checkout()
+        timer = threading.Timer(0.1, DatabaseManager._return, args=(held,))
+        timer.start()
+        started = time.monotonic()
+        with _manager().lease():
+            assert time.monotonic() - started >= 0.05
+        stats = DatabaseManager.pool_stats()
+        assert stats['waited'] == 1 and stats['max_wait_seconds'] > 0
+    finally:
+        DatabaseManager._pool = None
+
+
+def test_exhausted_pool_does_not_open_direct_connections():
+    _install_pool(1, timeout=0.1)
+    app = _app()
+    try:
+        DatabaseManager._checkout()
+        direct = []
+        saved = database.mysql.connector.connect
+        database.mysql.connector.connect = lambda **kwargs: direct.append(kwargs)
+        try:
+            with app.test_request_context('/chat'):
+                assert not _manager().connect()
+        finally:
+            database.mysql.connector.connect = saved
+        assert direct == []
+        assert DatabaseManager.pool_stats()['timeouts'] == 1
+    finally:
+        DatabaseManager._pool = None
+
+
+if __name__ == "__main__":
+    test_lease_outside_request_is_returned()
+    test_managers_share_one_lease_per_request()
+    test_close_returns_lease_once()
+    test_checkout_waits_for_a_returned_connection()
+    test_exhausted_pool_does_not_open_direct_connections()
+    print("✅ Connection pool tests passed")
@@ -0,0 +1,146 @@
+"""
+Test script for the process-wide FAQ cache and its version check
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from database import DatabaseManager
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        faqs = self.conn.faqs
+        if sql.startswith("SELECT version FROM faq_version"):
+            self._rows = [{'version': self.conn.version}]
+        elif sql.startswith("UPDATE faq_version"):
+            self.conn.version += 1
+        elif sql.startswith("SELECT * FROM faqs"):
+            self._rows = [dict(faq) for faq in faqs.values()]
+        elif sql.startswith("UPDATE faqs"):
+            question, answer, category, faq_id = params
+            faqs[faq_id].update(question=question, answer=answer, category=category)
+            self.rowcount = 1
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.faqs = {
+            1: {'id_faq': 1, 'question': 'Apa itu zakat?', 'answer': 'Rukun Islam ketiga.', 'category': 'Umum'},
+            2: {'id_faq': 2, 'question': 'Apa itu nisab?', 'answer': 'Had minimum harta.', 'category': None},
+        }
+        self.version = 0
+        self.statements = []
+        self.commits = 0
+
+    def is_connected(self):
+        return True
+
+    def ping(self, **kwargs):
+        pass
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def reloads(self):
+        return sum(s.startswith("SELECT * FROM faqs") for s in self.statements)
+
+
+def _manager(ttl):
+    db = DatabaseManager.__new__(DatabaseManager)
+    db.connection = FakeConnection()
+    DatabaseManager.FAQ_CACHE_TTL = ttl
+    DatabaseManager.invalidate_faq_cache()
+    return db
+
+
+def test_repeat_reads_are_served_from_cache():
+    db = _manager(ttl=60)
+    first = db.get_faqs()
+    assert db.get_faqs() == first
+    assert db.connection.reloads() == 1
+    assert len(db.connection.statements) == 2
+
+
+def test_unchanged_version_skips_the_reload():
+    db = _manager(ttl=0)
+    db.get_faqs()
+    db.get_faqs()
+    assert db.connection.reloads() == 1
+    assert db.connection.statements.count("SELECT version FROM faq_version WHERE id = 1") == 2
+
+
+def test_another_workers_edit_changes_the_version():
+    db = _manager(ttl=0)
+    before = db.faq_version()
+    db.get_faqs()
+    # Another worker edits an answer in the same second: it bumps the counter
+    db.connection.faqs[2]['answer'] = 'Had minimum harta yang wajib dizakat.'
+    db.connection.version += 1
+    assert db.faq_version() != before
+    assert db.get_faqs()[1]['answer'] == 'Had minimum harta yang wajib dizakat.'
+    assert db.connection.reloads() == 2
+
+
+def test_crud_bumps_version_and_invalidates_the_cache():
+    db = _manager(ttl=60)
+    db.get_faqs()
+    assert db.update_faq(1, 'Apa itu zakat?', 'Rukun Islam yang ketiga.', 'Umum')
+    assert db.connection.version == 1
+    assert db.get_faqs()[0]['answer'] == 'Rukun Islam yang ketiga.'
+    assert db.connection.reloads() == 2
+
+
+def test_version_check_does_not_commit_the_request_lease():
+    app = Flask(__name__)
+    db = DatabaseManager.__new__(DatabaseManager)
+    DatabaseManager.FAQ_CACHE_TTL = 0
+    DatabaseManager.invalidate_faq_cache()
+    with app.test_request_context('/chat'):
+        # The lease other managers in this request may have a transaction open on
+        db.connection = FakeConnection()
+        lease = db.connection
+        db.get_faqs()
+        assert db.faq_version() == 0
+        assert lease.commits == 0
+        db.connection = None
+
+    # A manager's own connection is committed to end its read snapshot
+    own = _manager(ttl=0)
+    own.faq_version()
+    assert own.connection.commits == 1
+
+
+if __name__ == "__main__":
+    test_repeat_reads_are_served_from_cache()
+    test_unchanged_version_skips_the_reload()
+    test_another_workers_edit_changes_the_version()
+    test_crud_bumps_version_and_invalidates_the_cache()
+    test_version_check_does_not_commit_the_request_lease()
+    print("✅ FAQ cache tests passed")
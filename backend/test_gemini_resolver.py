@@ -0,0 +1,84 @@
+"""
+Test script for lazy Gemini model selection
+Uses fake models, so no API key or network is needed.
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gemini_service import ModelResolver
+
+
+class FakeResponse:
+    text = "OK"
+
+
+class FakeModel:
+    def __init__(self, name, working):
+        self.name = name
+        self.working = working  # shared set of model names currently answering
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        if self.name not in self.working:
+            raise RuntimeError(f"404 {self.name} not found")
+        return FakeResponse()
+
+
+def _resolver(tmp_path, working, **kwargs):
+    made = []
+
+    def factory(name):
+        model = FakeModel(name, working)
+        made.append(model)
+        return model
+
+    resolver = ModelResolver(candidates=['model-a', 'model-b'], cache_file=str(tmp_path / 'model.json'),
+                             probe_interval=0, model_factory=factory, **kwargs)
+    return resolver, made
+
+
+def test_nothing_is_probed_until_first_use(tmp_path):
+    resolver, made = _resolver(tmp_path, working={'model-b'})
+    resolver.start_probe()  # disabled by probe_interval=0
+    assert made == [] and resolver.model_name is None
+
+    resolver.get()
+    assert resolver.model_name == 'model-b'
+    assert json.load(open(tmp_path / 'model.json'))['model'] == 'model-b'
+
+
+def test_cached_choice_skips_probing(tmp_path):
+    _resolver(tmp_path, working={'model-b'})[0].get()
+
+    restarted, made = _resolver(tmp_path, working={'model-b'})
+    restarted.get()
+    assert restarted.model_name == 'model-b'
+    assert restarted.health['source'] == 'cache'
+    assert sum(model.calls for model in made) == 0
+
+
+def test_health_check_reselects_when_model_stops_answering(tmp_path):
+    working = {'model-a', 'model-b'}
+    resolver, _ = _resolver(tmp_path, working=working)
+    resolver.get()
+    assert resolver.model_name == 'model-a'
+
+    working.discard('model-a')
+    assert resolver.check()
+    assert resolver.model_name == 'model-b'
+    assert resolver.health['status'] == 'ok'
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_nothing_is_probed_until_first_use, test_cached_choice_skips_probing,
+                 test_health_check_reselects_when_model_stops_answering):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("✅ Gemini model resolver tests passed")
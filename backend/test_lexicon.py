@@ -0,0 +1,115 @@
+"""
+Test script for the compiled NLP lexicon
+"""
+
+import os
+import re
+import sys
+import json
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lexicon import CompiledLexicon, WordReplacer, get_lexicon
+from gemini_service import KEDAH_REPLY_SLANG
+from nlp_processor import KEDAH_SLANG_NORMALIZER
+
+
+def _lexicon():
+    return CompiledLexicon(
+        stopwords=['itu'],
+        typo_corrections={
+            'bagaimana': ['bgmn', 'mcm mana', 'macam mana'],
+            'berapa': ['brp', 'how much'],
+            'lznk': ['lembaga zakat', 'lembaga zakat negeri kedah', 'lembaga'],
+            # 'brp' already belongs to 'berapa'; the first entry in the file wins
+            'bersih': ['brp', 'brsh'],
+        },
+        synonyms={'bayar': ['membayar', 'pay']}
+    )
+
+
+def test_phrases_are_rewritten_longest_first():
+    lexicon = _lexicon()
+    assert lexicon.correct_tokens('zakat macam mana'.split()) == ['zakat', 'bagaimana']
+    assert lexicon.correct_tokens('mcm mana nak bayar'.split()) == ['bagaimana', 'nak', 'bayar']
+    assert lexicon.correct_tokens('lembaga zakat negeri kedah'.split()) == ['lznk']
+    # A longer phrase that breaks off part-way falls back to the longest complete one
+    assert lexicon.correct_tokens('lembaga zakat negeri perlis'.split()) == ['lznk', 'negeri', 'perlis']
+    assert lexicon.correct_tokens('macam biasa'.split()) == ['macam', 'biasa']
+    assert lexicon.correct_tokens([]) == []
+    # The shipped lexicon
+    assert get_lexicon().correct_tokens('zakat macam mana'.split()) == ['zakat', 'bagaimana']
+
+
+def test_typo_map_corrects_single_words():
+    lexicon = _lexicon()
+    assert lexicon.correct_tokens(['bgmn', 'brsh', 'lembaga']) == ['bagaimana', 'bersih', 'lznk']
+    assert lexicon.typo_map['brp'] == 'berapa'
+    assert lexicon.correct_tokens(['zakat']) == ['zakat']
+    assert lexicon.expand_synonyms({'bayar', 'zakat'}) == {'bayar', 'membayar', 'pay', 'zakat'}
+
+
+def test_fingerprint_follows_content():
+    assert _lexicon().fingerprint == _lexicon().fingerprint
+    changed = CompiledLexicon(stopwords=['itu', 'ini'], typo_corrections=_lexicon().typo_corrections,
+                              synonyms=_lexicon().synonyms)
+    assert changed.fingerprint != _lexicon().fingerprint
+
+
+def test_get_lexicon_reloads_when_the_file_changes(tmp_path=None):
+    tmp_dir = str(tmp_path) if tmp_path else os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(tmp_dir, 'test_lexicon.json')
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'typo_corrections': {'zakat': ['zakt']}}, f)
+        os.utime(path, (1000, 1000))
+        first = get_lexicon(path)
+        assert get_lexicon(path) is first
+        assert first.typo_map == {'zakt': 'zakat'}
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'typo_corrections': {'zakat': ['zakt', 'zkat']}}, f)
+        os.utime(path, (2000, 2000))
+        second = get_lexicon(path)
+        assert second is not first
+        assert second.typo_map == {'zakt': 'zakat', 'zkat': 'zakat'}
+        assert second.fingerprint != first.fingerprint
+    finally:
+        if not tmp_path:
+            os.remove(path)
+
+
+def _sequential(mapping, text):
+    """The replacement loop WordReplacer took over: one re.sub per entry, in order."""
+    for word, replacement in mapping.items():
+        text = re.sub(rf"\b{word}\b", replacement, text, flags=re.IGNORECASE)
+    return text
+
+
+def test_word_replacer_matches_sequential_substitution():
+    assert KEDAH_REPLY_SLANG('Kenapa ANDA tak datang?') == 'pasai apa hampa dak datang?'
+    # Whole words only, and 'apa' inside the 'pasai apa' replacement is not rewritten again
+    assert KEDAH_REPLY_SLANG('kenapakah apabila kenapa') == 'kenapakah apabila pasai apa'
+    assert KEDAH_SLANG_NORMALIZER('Hang nak APE kat mano?') == 'hampa nak apa kat mana?'
+    assert WordReplacer({'zakat': 'zakah'})('') == ''
+
+    rng = random.Random(6)
+    for replacer in (KEDAH_REPLY_SLANG, KEDAH_SLANG_NORMALIZER):
+        vocabulary = list(replacer.mapping) + [v for value in replacer.mapping.values() for v in value.split()]
+        vocabulary += ['zakat', 'kenapakah', 'apabila', 'tak2', 'sudahlah', '_tak', 'hang-out']
+        for _ in range(2000):
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 8))]
+            words = [word.upper() if rng.random() < 0.2 else word.capitalize() if rng.random() < 0.2 else word
+                     for word in words]
+            text = ''.join(word + rng.choice([' ', ' ', ', ', '. ', '?', '-', '']) for word in words)
+            assert replacer(text) == _sequential(replacer.mapping, text), text
+
+
+if __name__ == "__main__":
+    test_phrases_are_rewritten_longest_first()
+    test_typo_map_corrects_single_words()
+    test_fingerprint_follows_content()
+    test_get_lexicon_reloads_when_the_file_changes()
+    test_word_replacer_matches_sequential_substitution()
+    print("✅ Lexicon tests passed")
@@ -0,0 +1,108 @@
+"""
+Test script for the Gemini response cache
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_cache import ResponseCache, SmartAnswerCache, cache_key, content_version
+from nlp_processor import NLPProcessor
+
+
+def test_lru_keeps_recent_entries():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.put('a', 'jawapan a')
+    cache.put('b', 'jawapan b')
+    assert cache.get('a') == 'jawapan a'
+    cache.put('c', 'jawapan c')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'jawapan a'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(ttl_seconds=0.05)
+    cache.put('a', 'jawapan a')
+    time.sleep(0.1)
+    assert cache.get('a') is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / 'llm_cache.db')
+    ResponseCache(disk_path=path).put('a', 'jawapan a')
+
+    restarted = ResponseCache(disk_path=path)
+    assert restarted.get('a') == 'jawapan a'
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_key_changes_with_faq_version():
+    first = cache_key('apa zakat', 7, content_version('Zakat ialah 2.5%'), 'prompt')
+    edited = cache_key('apa zakat', 7, content_version('Zakat ialah 2.577%'), 'prompt')
+    assert first != edited
+    assert first == cache_key('apa zakat', 7, content_version('Zakat ialah 2.5%'), 'prompt')
+
+
+def test_smart_cache_reuses_answer_for_paraphrase():
+    nlp = NLPProcessor(enable_gemini=False)
+    cache = SmartAnswerCache(radius=0.85)
+    cache.store('boleh ke saya bayar zakat guna kad kredit', 'v1', 'Boleh, melalui portal LZNK.', nlp.text_features)
+
+    hit = cache.lookup('boleh saya bayar zakat guna kad kredit?', 'v1', nlp.text_features, nlp.features_similarity)
+    assert hit is not None and hit[0] == 'Boleh, melalui portal LZNK.'
+    assert cache.lookup('zakat kripto macam mana kira', 'v1', nlp.text_features, nlp.features_similarity) is None
+    # Answers made with another prompt / model are not reused
+    assert cache.lookup('boleh saya bayar zakat guna kad kredit?', 'v2', nlp.text_features, nlp.features_similarity) is None
+
+
+def test_smart_cache_purge_and_ttl():
+    nlp = NLPProcessor(enable_gemini=False)
+    cache = SmartAnswerCache(ttl_seconds=60)
+    cache.store('zakat kripto macam mana kira', 'v1', 'Jawapan kripto', nlp.text_features)
+    cache.store('boleh bayar zakat guna kad kredit', 'v1', 'Jawapan kad', nlp.text_features)
+    assert cache.purge('kripto') == 1
+    assert len(cache) == 1
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.lookup('boleh bayar zakat guna kad kredit', 'v1', nlp.text_features, nlp.features_similarity) is None
+    assert len(cache) == 0
+
+
+def test_smart_cache_scores_only_the_closest_candidates():
+    nlp = NLPProcessor(enable_gemini=False)
+    cache = SmartAnswerCache(radius=0.85, max_candidates=4)
+    for i in range(50):
+        cache.store(f'zakat perniagaan cawangan nombor {i}', 'v1', f'Jawapan {i}', nlp.text_features)
+    cache.store('boleh bayar zakat guna kad kredit', 'v1', 'Jawapan kad', nlp.text_features)
+
+    scored = []
+
+    def similarity(f1, f2):
+        # Scoring happens without holding the cache lock
+        assert not cache._lock.locked()
+        scored.append(f2)
+        return nlp.features_similarity(f1, f2)
+
+    hit = cache.lookup('boleh bayar zakat guna kad kredit?', 'v1', nlp.text_features, similarity)
+    assert hit is not None and hit[0] == 'Jawapan kad'
+    assert len(scored) == 4
+    assert cache.stats()['max_candidates'] == 4
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    test_lru_keeps_recent_entries()
+    test_entries_expire_after_ttl()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_disk_tier_survives_restart(Path(tmp))
+    test_key_changes_with_faq_version()
+    test_smart_cache_reuses_answer_for_paraphrase()
+    test_smart_cache_purge_and_ttl()
+    test_smart_cache_scores_only_the_closest_candidates()
+    print("✅ LLM cache tests passed")
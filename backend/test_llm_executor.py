@@ -0,0 +1,43 @@
+"""
+Test script for deadline-bounded Gemini calls
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_executor import LLMDeadline, GeminiTimeout
+
+
+def test_fast_call_returns_result():
+    assert LLMDeadline(1.0).run(lambda text: text.upper(), "zakat") == "ZAKAT"
+
+
+def test_slow_call_times_out_at_deadline():
+    deadline = LLMDeadline(0.1)
+    started = time.monotonic()
+    with pytest.raises(GeminiTimeout):
+        deadline.run(time.sleep, 1.0)
+    assert time.monotonic() - started < 0.5
+
+    # The deadline is per request: later calls fail straight away
+    with pytest.raises(GeminiTimeout):
+        deadline.run(lambda: "late")
+
+
+def test_errors_propagate():
+    def broken():
+        raise ValueError("quota")
+    with pytest.raises(ValueError):
+        LLMDeadline(1.0).run(broken)
+
+
+if __name__ == "__main__":
+    test_fast_call_returns_result()
+    test_slow_call_times_out_at_deadline()
+    test_errors_propagate()
+    print("✅ LLM executor tests passed")
@@ -0,0 +1,102 @@
+"""
+Test script for Gemini admission control (circuit breaker, rate limit, concurrency cap)
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_guard import GeminiGuard, GeminiUnavailable
+
+
+def _failing():
+    raise RuntimeError("429 Resource exhausted")
+
+
+def test_breaker_opens_then_recovers_through_half_open():
+    guard = GeminiGuard(failure_threshold=2, reset_seconds=0.1, rate_per_minute=0)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            guard.call(_failing)
+    assert guard.stats()['breaker']['state'] == 'open'
+    assert not guard.allows_calls()
+
+    calls = []
+    with pytest.raises(GeminiUnavailable):
+        guard.call(calls.append, 'x')
+    assert calls == []
+
+    time.sleep(0.15)
+    assert guard.stats()['breaker']['state'] == 'half_open'
+    assert guard.call(lambda: 'OK') == 'OK'
+    assert guard.stats()['breaker']['state'] == 'closed'
+
+
+def test_slow_calls_count_as_failures():
+    guard = GeminiGuard(failure_threshold=1, slow_call_seconds=0.01, rate_per_minute=0)
+    guard.call(time.sleep, 0.05)
+    assert guard.stats()['breaker']['state'] == 'open'
+
+
+def test_slow_stream_that_flows_does_not_trip_breaker():
+    guard = GeminiGuard(failure_threshold=1, slow_call_seconds=0.05, rate_per_minute=0)
+
+    def chunks():
+        for i in range(5):
+            yield f"chunk {i} "
+            time.sleep(0.03)
+
+    # Quick first chunk, whole stream well past slow_call_seconds
+    assert len(list(guard.stream(chunks))) == 5
+    # Abandoned part-way (client gone) after a quick first chunk
+    stream = guard.stream(chunks)
+    next(stream)
+    time.sleep(0.1)
+    stream.close()
+    assert guard.stats()['breaker']['state'] == 'closed'
+    assert guard.stats()['slow_calls'] == 0
+
+    def late_first_chunk():
+        time.sleep(0.1)
+        yield "akhirnya"
+    list(guard.stream(late_first_chunk))
+    assert guard.stats()['breaker']['state'] == 'open'
+
+
+def test_token_bucket_limits_bursts():
+    guard = GeminiGuard(rate_per_minute=60, burst=2)
+    guard.call(lambda: None)
+    guard.call(lambda: None)
+    with pytest.raises(GeminiUnavailable) as rejected:
+        guard.call(lambda: None)
+    assert rejected.value.reason == 'rate limited'
+    # Rejections are ours, not Gemini's: the breaker stays closed
+    assert guard.stats()['breaker']['state'] == 'closed'
+
+
+def test_concurrency_cap_rejects_when_busy():
+    guard = GeminiGuard(max_concurrency=1, queue_timeout=0.05, rate_per_minute=0)
+    release = threading.Event()
+    worker = threading.Thread(target=guard.call, args=(release.wait, 1.0))
+    worker.start()
+    time.sleep(0.02)
+    with pytest.raises(GeminiUnavailable) as rejected:
+        guard.call(lambda: None)
+    release.set()
+    worker.join()
+    assert rejected.value.reason == 'too many concurrent calls'
+    assert guard.stats()['in_flight'] == 0
+
+
+if __name__ == "__main__":
+    test_breaker_opens_then_recovers_through_half_open()
+    test_slow_calls_count_as_failures()
+    test_slow_stream_that_flows_does_not_trip_breaker()
+    test_token_bucket_limits_bursts()
+    test_concurrency_cap_rejects_when_busy()
+    print("✅ Gemini guard tests passed")
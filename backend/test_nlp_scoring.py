@@ -0,0 +1,549 @@
+"""
+Test script for the NLP matching engine
+Checks scoring backends against the pure Python similarity blend and
+incremental index updates against a full retrain
+"""
+
+import os
+import gc
+import sys
+import json
+import weakref
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nlp_processor import NLPProcessor
+from faq_matrix import NUMPY_AVAILABLE
+from nlp_engine import NLPEngine
+
+TOLERANCE = 1e-9
+
+QUESTIONS = [
+    "apa itu zakat",
+    "zakat tu apa",
+    "macam mana nak bayar zakat",
+    "berapa nisab emas",
+    "hang nak bayar zakat kat mano",
+    "how to pay zakat online",
+    "Apakah perbezaan di antara asnaf faqir dan miskin?",
+    "zakat pendapatan gaji RM5000",
+]
+
+
+def load_faqs():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'training_data.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        pairs = json.load(f)['training_pairs']
+    return [dict(pair, id_faq=i + 1) for i, pair in enumerate(pairs)]
+
+
+def build_processors(faqs):
+    python_nlp = NLPProcessor(enable_gemini=False, scoring_backend='python')
+    numpy_nlp = NLPProcessor(enable_gemini=False, scoring_backend='numpy')
+    python_nlp.train_from_faqs(faqs)
+    numpy_nlp.train_from_faqs(faqs)
+    return python_nlp, numpy_nlp
+
+
+def test_numpy_scores_match_python():
+    """Vectorized Jaccard terms must reproduce the 0.4/0.45/0.15 blend"""
+    if not NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+
+    faqs = load_faqs()
+    python_nlp, numpy_nlp = build_processors(faqs)
+    numpy_nlp._ensure_scoring_matrix()
+    assert numpy_nlp.scoring_matrix is not None
+
+    for question in QUESTIONS:
+        user = numpy_nlp._text_features(question)
+        row_scores = numpy_nlp.scoring_matrix.score(user)
+        for key, pair in numpy_nlp.faq_store.items():
+            features = numpy_nlp._get_faq_features(pair)
+            idx = numpy_nlp.scoring_matrix.row_of(key, features)
+            assert idx is not None
+            expected_q = python_nlp.calculate_similarity(question, pair['question'])
+            expected_a = python_nlp.calculate_similarity(question, pair['answer'])
+            got_q = numpy_nlp._score_features(user, features.question, jaccards=row_scores.question(idx))
+            got_a = numpy_nlp._score_features(user, features.answer, jaccards=row_scores.answer(idx))
+            assert abs(got_q - expected_q) <= TOLERANCE, (question, pair['question'])
+            assert abs(got_a - expected_a) <= TOLERANCE, (question, pair['question'])
+
+
+def test_numpy_best_match_matches_python():
+    """Both backends pick the same FAQ with the same score"""
+    if not NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+
+    faqs = load_faqs()
+    python_nlp, numpy_nlp = build_processors(faqs)
+
+    for question in QUESTIONS:
+        expected, expected_score = python_nlp.find_best_match(question, faqs)
+        got, got_score = numpy_nlp.find_best_match(question, faqs)
+        assert (got or {}).get('question') == (expected or {}).get('question'), question
+        assert abs(got_score - expected_score) <= TOLERANCE, question
+
+
+def test_trigram_mode_matches_exact_questions():
+    """Trigram mode still ranks an FAQ's own question first"""
+    faqs = load_faqs()
+    nlp = NLPProcessor(enable_gemini=False, similarity_mode='trigram')
+    nlp.train_from_faqs(faqs)
+
+    assert nlp.calculate_similarity("apa itu zakat", "apa itu zakat") == 1.0
+    assert nlp.calculate_similarity("apa itu zakat", "") == 0.0
+
+    for faq in faqs[:20]:
+        match, score = nlp.find_best_match(faq['question'], faqs)
+        assert match is not None
+        assert match['question'].lower() == faq['question'].lower(), faq['question']
+
+
+def test_numpy_matrix_survives_single_edits():
+    """Edits keep the scoring matrix until enough rows are stale; candidate rows score as the full pass"""
+    if not NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+
+    faqs = load_faqs()
+    python_nlp, numpy_nlp = build_processors(faqs)
+    numpy_nlp._ensure_scoring_matrix()
+    matrix = numpy_nlp.scoring_matrix
+
+    user = numpy_nlp._text_features(QUESTIONS[0])
+    full = matrix.score(user)
+    subset = matrix.score(user, [7, 2])
+    assert subset.question(0) == full.question(7) and subset.answer(1) == full.answer(2)
+
+    edited = dict(faqs[5], answer="Jawapan baharu tentang zakat pendapatan dan nisab.")
+    for nlp in (python_nlp, numpy_nlp):
+        assert nlp.update_faq(edited)
+    numpy_nlp._ensure_scoring_matrix()
+    assert numpy_nlp.scoring_matrix is matrix
+    # The edited FAQ's row is stale, so it is scored by the Python path
+    assert matrix.row_of(edited['id_faq'], numpy_nlp._get_faq_features(edited)) is None
+    for question in QUESTIONS + [edited['answer']]:
+        expected, expected_score = python_nlp.find_best_match(question)
+        got, got_score = numpy_nlp.find_best_match(question)
+        assert (got or {}).get('id_faq') == (expected or {}).get('id_faq'), question
+        assert abs(got_score - expected_score) <= TOLERANCE, question
+
+    for faq in faqs[10:10 + len(faqs) // 10]:
+        numpy_nlp.remove_faq(faq['id_faq'])
+    numpy_nlp._ensure_scoring_matrix()
+    assert numpy_nlp.scoring_matrix is not matrix
+    assert len(numpy_nlp.scoring_matrix) == len(numpy_nlp.faq_store)
+
+
+def test_incremental_updates_match_full_retrain():
+    """add/update/remove by id_faq leave the index as a full retrain would"""
+    faqs = load_faqs()
+    edited = dict(faqs[5], answer="Jawapan baharu tentang zakat pendapatan dan nisab.")
+    added = {'id_faq': 9999, 'question': 'Bagaimana kira zakat KWSP?',
+             'answer': 'Zakat KWSP dikira 2.5% daripada jumlah pengeluaran.', 'category': 'KWSP'}
+    final_faqs = [edited if f['id_faq'] == edited['id_faq'] else f for f in faqs[1:]] + [added]
+
+    incremental = NLPProcessor(enable_gemini=False)
+    incremental.train_from_faqs(faqs)
+    assert incremental.remove_faq(faqs[0]['id_faq'])
+    assert incremental.update_faq(edited)
+    assert incremental.add_faq(added)
+
+    retrained = NLPProcessor(enable_gemini=False)
+    retrained.train_from_faqs(final_faqs)
+
+    assert incremental.faq_store == retrained.faq_store
+    assert {k: sorted(v) for k, v in incremental.keyword_index.items()} == \
+        {k: sorted(v) for k, v in retrained.keyword_index.items()}
+    assert incremental.bm25.postings == retrained.bm25.postings
+
+    for question in QUESTIONS + [added['question']]:
+        expected, expected_score = retrained.find_best_match(question, final_faqs)
+        got, got_score = incremental.find_best_match(question, final_faqs)
+        assert got['id_faq'] == expected['id_faq'], question
+        assert abs(got_score - expected_score) <= TOLERANCE, question
+
+
+def test_store_matching_ignores_db_order():
+    """Matching from the id-keyed store agrees with a shuffled FAQ list"""
+    faqs = load_faqs()
+    nlp = NLPProcessor(enable_gemini=False)
+    nlp.train_from_faqs(faqs)
+    shuffled = list(reversed(faqs))
+
+    for question in QUESTIONS:
+        expected, expected_score = nlp.find_best_match(question, shuffled)
+        got, got_score = nlp.find_best_match(question)
+        assert (got or {}).get('id_faq') == (expected or {}).get('id_faq'), question
+        assert abs(got_score - expected_score) <= TOLERANCE, question
+
+    for faq in faqs[:20]:
+        match, _ = nlp.find_best_match(faq['question'])
+        assert match['id_faq'] == faq['id_faq'] or match['question'].lower() == faq['question'].lower()
+
+
+def test_match_batch_agrees_with_single_queries():
+    """match_batch's top match is what find_best_match returns for each question"""
+    faqs = load_faqs()
+    nlp = NLPProcessor(enable_gemini=False)
+    nlp.train_from_faqs(faqs)
+    questions = QUESTIONS + [faq['question'] for faq in faqs[:10]] + QUESTIONS + ["xyz qwerty"]
+
+    results = nlp.match_batch(questions, top_k=3)
+    assert [r['question'] for r in results] == questions
+    for result in results:
+        match, score = nlp.find_best_match(result['question'])
+        if match is None:
+            assert result['matches'] == []
+            continue
+        assert len(result['matches']) <= 3
+        assert result['matches'][0]['id_faq'] == match['id_faq'], result['question']
+        assert result['confidence'] == round(score, 4)
+        scores = [m['score'] for m in result['matches']]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_match_batch_keys_shared_work_on_all_features():
+    """Questions with the same normalized text but different keywords are scored separately"""
+    nlp = NLPProcessor(enable_gemini=False)
+    nlp.train_from_faqs(load_faqs())
+    text_features = nlp._text_features
+
+    def features(question):
+        # Same preprocessed text for both, keywords still taken from the raw question
+        found = text_features(question)
+        return found._replace(text=text_features('zakat').text)
+    nlp._text_features = features
+
+    questions = ['apa itu zakat fitrah', 'berapa nisab emas']
+    results = nlp.match_batch(questions, top_k=3)
+    assert results[0]['matches'] != results[1]['matches']
+    for question, result in zip(questions, results):
+        assert result == nlp.match_batch([question], top_k=3)[0]
+
+
+def test_rank_matches_single_pass_matches_full_sort():
+    """Heap-ranked suggestions equal a full sort of question scores"""
+    faqs = load_faqs()
+    nlp = NLPProcessor(enable_gemini=False)
+    nlp.train_from_faqs(faqs)
+
+    for question in QUESTIONS:
+        best, score, suggestions = nlp.rank_matches(question, top_n=3)
+        assert (best, score) == nlp.find_best_match(question)
+
+        features = nlp._text_features(question)
+        scored = [(q_score, nlp.faq_store[key]['question'])
+                  for key, _, q_score in nlp._score_candidates(features, nlp.faq_store)]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        assert suggestions == [q for s, q in scored[:3] if s > 0.2], question
+
+        response = nlp.generate_response(question)
+        assert response['similar_questions'] == suggestions
+
+
+def test_snapshot_round_trip(tmp_path=None):
+    """A processor restored from a snapshot matches the one that wrote it"""
+    tmp_dir = str(tmp_path) if tmp_path else os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(tmp_dir, 'test_nlp_index.bin')
+    faqs = load_faqs()
+
+    trained = NLPProcessor(enable_gemini=False)
+    trained.train_from_faqs(faqs)
+    assert trained.save_snapshot(path)
+    assert trained.save_snapshot(path)
+    # Each save writes its own temp file and renames it into place
+    assert not [name for name in os.listdir(tmp_dir) if name.startswith('test_nlp_index.bin.')]
+
+    restored = NLPProcessor(enable_gemini=False)
+    try:
+        assert restored.load_snapshot(path)
+        # A snapshot built for another similarity mode is rejected
+        assert not NLPProcessor(enable_gemini=False, similarity_mode='trigram').load_snapshot(path)
+        # So is a truncated one
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        assert not NLPProcessor(enable_gemini=False).load_snapshot(path)
+    finally:
+        if not tmp_path:
+            os.remove(path)
+
+    assert restored.faq_store == trained.faq_store
+    assert restored._faq_features == trained._faq_features
+    assert restored.bm25.postings == trained.bm25.postings
+    assert restored.bm25.doc_lengths == trained.bm25.doc_lengths
+
+    for question in QUESTIONS:
+        expected, expected_score = trained.find_best_match(question, faqs)
+        got, got_score = restored.find_best_match(question, faqs)
+        assert (got or {}).get('id_faq') == (expected or {}).get('id_faq'), question
+        assert abs(got_score - expected_score) <= TOLERANCE, question
+
+
+def test_snapshot_keeps_non_integer_keys(tmp_path=None):
+    """String FAQ ids round-trip as strings; keys the format cannot hold fail the save"""
+    tmp_dir = str(tmp_path) if tmp_path else os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(tmp_dir, 'test_nlp_keys.bin')
+    faqs = [
+        {'id_faq': 'json-7', 'question': 'Apa itu zakat fitrah?', 'answer': 'Zakat diri.', 'category': 'Fitrah'},
+        {'id_faq': 12, 'question': 'Berapa nisab emas?', 'answer': '85 gram.', 'category': None},
+        {'question': 'Bila bayar zakat?', 'answer': 'Cukup haul.', 'category': 'Umum'},
+    ]
+    trained = NLPProcessor(enable_gemini=False)
+    trained.train_from_faqs(faqs)
+    restored = NLPProcessor(enable_gemini=False)
+    try:
+        assert trained.save_snapshot(path)
+        assert restored.load_snapshot(path)
+
+        trained.faq_store[('json', 8)] = dict(trained.faq_store['json-7'])
+        assert not trained.save_snapshot(path)
+        assert not [name for name in os.listdir(tmp_dir) if name.startswith('test_nlp_keys.bin.')]
+    finally:
+        if not tmp_path:
+            os.remove(path)
+
+    assert list(restored.faq_store) == ['json-7', 12, 2]
+    assert restored.faq_store['json-7']['id_faq'] == 'json-7'
+    assert restored.faq_store[2]['id_faq'] is None
+    assert restored.find_best_match('zakat fitrah')[0]['id_faq'] == 'json-7'
+
+
+def test_cache_stats_count_hits_and_misses():
+    nlp = NLPProcessor(enable_gemini=False, cache_size=2)
+    for text in ('Apa itu zakat?', 'Apa itu zakat?', 'Berapa nisab emas?'):
+        nlp.preprocess_text(text)
+    nlp.extract_keywords('Apa itu zakat?')
+
+    stats = nlp.cache_stats()
+    assert stats['preprocess_text'] == {'hits': 1, 'misses': 2, 'size': 2, 'maxsize': 2, 'hit_rate': 0.333}
+    assert stats['extract_keywords']['misses'] == 1 and stats['extract_keywords']['hits'] == 0
+
+    # Least recently used entries are evicted at maxsize
+    nlp.preprocess_text('Bila zakat fitrah dibayar?')
+    assert nlp.cache_stats()['preprocess_text']['size'] == 2
+    assert nlp.get_stats()['cache'] == nlp.cache_stats()
+
+
+def test_caches_survive_retrain_and_fork():
+    """The caches depend only on the lexicon: forks share them and retraining keeps them valid"""
+    faqs = load_faqs()
+    nlp = NLPProcessor(enable_gemini=False)
+    nlp.train_from_faqs(faqs)
+    for question in QUESTIONS:
+        nlp.extract_keywords(question)
+
+    fork = nlp.fork(copy_index=False)
+    fork.train_from_faqs(faqs[:5])
+    assert fork._keywords_cached is nlp._keywords_cached
+    hits = nlp.cache_stats()['extract_keywords']['hits']
+    for question in QUESTIONS:
+        assert sorted(fork.extract_keywords(question)) == \
+            sorted(NLPProcessor._extract_keywords_uncached(fork.lexicon, question))
+        assert fork.preprocess_text(question) == NLPProcessor._preprocess_text_uncached(question)
+    assert fork.cache_stats()['extract_keywords']['hits'] == hits + len(set(QUESTIONS))
+
+    # The shared caches do not keep the retired processor and its index alive
+    retired = weakref.ref(nlp)
+    del nlp
+    gc.collect()
+    assert retired() is None
+    assert fork.find_best_match(faqs[0]['question'])[0]['id_faq'] == faqs[0]['id_faq']
+
+
+def test_fork_is_copy_on_write():
+    """A fork shares postings until it edits them; edits never reach the original"""
+    faqs = load_faqs()
+    original = NLPProcessor(enable_gemini=False)
+    original.train_from_faqs(faqs)
+    keywords_before = {k: list(v) for k, v in original.keyword_index.items()}
+    postings_before = {t: dict(d) for t, d in original.bm25.postings.items()}
+
+    fork = original.fork()
+    assert fork.bm25.postings['zakat'] is original.bm25.postings['zakat']
+    assert fork.remove_faq(faqs[0]['id_faq'])
+    assert fork.add_faq(dict(faqs[0], id_faq=10_000, question='Zakat kripto bagaimana?'))
+
+    assert original.keyword_index == keywords_before
+    assert original.bm25.postings == postings_before
+    assert 10_000 in fork.bm25.postings['zakat'] and 10_000 not in original.bm25.postings['zakat']
+    # Terms the fork never touched are still shared
+    untouched = next(t for t in fork.bm25.postings if t not in fork.bm25._owned)
+    assert fork.bm25.postings[untouched] is original.bm25.postings[untouched]
+
+
+def test_engine_batches_file_writes(tmp_path=None):
+    """A burst of edits rewrites the snapshot once, after persist_delay"""
+    import time
+    tmp_dir = str(tmp_path) if tmp_path else os.path.dirname(os.path.abspath(__file__))
+    snapshot_file = os.path.join(tmp_dir, 'test_batch_index.bin')
+    training_file = os.path.join(tmp_dir, 'test_batch_training.json')
+    faqs = load_faqs()
+    engine = NLPEngine(factory=lambda: NLPProcessor(enable_gemini=False),
+                       snapshot_file=snapshot_file, training_file=training_file, persist_delay=0.2)
+    try:
+        assert engine.initialize(lambda: faqs)
+        writes = []
+        current_save = NLPProcessor.save_snapshot
+        NLPProcessor.save_snapshot = lambda self, path: writes.append(path) or True
+        try:
+            for faq in faqs[:5]:
+                assert engine.update(lambda nlp, faq=faq: nlp.remove_faq(faq['id_faq']))
+            assert writes == []
+            time.sleep(0.5)
+        finally:
+            NLPProcessor.save_snapshot = current_save
+        assert writes == [snapshot_file]
+    finally:
+        if not tmp_path:
+            for path in (snapshot_file, training_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def test_engine_swaps_copies_without_touching_readers(tmp_path=None):
+    """Engine writers publish a new processor; one already handed out stays as it was"""
+    tmp_dir = str(tmp_path) if tmp_path else os.path.dirname(os.path.abspath(__file__))
+    snapshot_file = os.path.join(tmp_dir, 'test_engine_index.bin')
+    training_file = os.path.join(tmp_dir, 'test_engine_training.json')
+    faqs = load_faqs()
+
+    engine = NLPEngine(factory=lambda: NLPProcessor(enable_gemini=False),
+                       snapshot_file=snapshot_file, training_file=training_file)
+    try:
+        assert not engine.is_trained()
+        assert engine.initialize(lambda: faqs)
+        reader = engine.get()
+        reader.add_to_context('s1', 'zakat pendapatan', 'user')
+
+        removed = faqs[0]
+        assert engine.update(lambda nlp: nlp.remove_faq(removed['id_faq']))
+        current = engine.get()
+        assert current is not reader
+        assert removed['id_faq'] in reader.faq_store
+        assert removed['id_faq'] not in current.faq_store
+        # Session context is shared across generations
+        assert current.get_conversation_history('s1') == reader.get_conversation_history('s1')
+
+        # Edits are written out together, later (or at exit)
+        assert engine.update(lambda nlp: nlp.remove_faq(faqs[1]['id_faq']))
+        current = engine.get()
+        assert engine.flush()
+        assert not engine.flush()
+
+        # A new engine starts from the files the writers persisted
+        restarted = NLPEngine(factory=lambda: NLPProcessor(enable_gemini=False),
+                              snapshot_file=snapshot_file, training_file=training_file)
+        assert restarted.get().faq_store == current.faq_store
+    finally:
+        if not tmp_path:
+            for path in (snapshot_file, training_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def test_engine_sync_picks_up_database_changes(tmp_path=None):
+    """sync() retrains when the database version differs from the index's, and only then"""
+    tmp_dir = str(tmp_path) if tmp_path else os.path.dirname(os.path.abspath(__file__))
+    snapshot_file = os.path.join(tmp_dir, 'test_sync_index.bin')
+    training_file = os.path.join(tmp_dir, 'test_sync_training.json')
+    faqs = load_faqs()
+    db = {'version': 1, 'faqs': faqs, 'loads': 0}
+
+    def loader():
+        db['loads'] += 1
+        return db['faqs']
+
+    def new_engine(sync_seconds=0):
+        return NLPEngine(factory=lambda: NLPProcessor(enable_gemini=False), snapshot_file=snapshot_file,
+                         training_file=training_file, sync_seconds=sync_seconds, persist_delay=0)
+
+    def snapshot_version():
+        processor = NLPProcessor(enable_gemini=False)
+        assert processor.load_snapshot(snapshot_file)
+        return processor.faq_version
+
+    engine = new_engine()
+    try:
+        # No file yet: the first check trains and writes the version into the snapshot
+        assert engine.sync(lambda: db['version'], loader)
+        assert not engine.sync(lambda: db['version'], loader)
+        assert db['loads'] == 1
+        assert engine.faq_version == '1' and snapshot_version() == '1'
+
+        # A restart on an up-to-date snapshot does not retrain
+        restarted = new_engine()
+        assert not restarted.sync(lambda: db['version'], loader)
+        assert db['loads'] == 1
+        assert restarted.faq_version == '1'
+
+        # Another worker removes an FAQ; only the writing worker rewrites the files
+        db['faqs'] = faqs[1:]
+        db['version'] = 2
+        assert engine.sync(lambda: db['version'], loader)
+        assert faqs[0]['id_faq'] not in engine.get().faq_store
+        assert snapshot_version() == '1'
+
+        # This worker's own edit records the version it bumped to
+        db['faqs'] = faqs[2:]
+        db['version'] = 3
+        assert engine.update(lambda nlp: nlp.remove_faq(faqs[1]['id_faq']), faq_version=3)
+        assert engine.faq_version == '3' and snapshot_version() == '3'
+        assert not engine.sync(lambda: db['version'], loader)
+        assert db['loads'] == 2
+
+        # A jump past the next version means an edit this index lacks: sync still retrains
+        db['faqs'] = faqs[4:]
+        db['version'] = 5
+        engine.update(lambda nlp: nlp.remove_faq(faqs[2]['id_faq']), faq_version=5)
+        assert engine.faq_version == '3'
+        assert engine.sync(lambda: db['version'], loader)
+        assert faqs[3]['id_faq'] not in engine.get().faq_store
+
+        # Database unreachable: keep serving the current index
+        assert not engine.sync(lambda: None, loader)
+
+        # Background sync: the caller returns at once, the thread swaps the index in
+        purged = []
+        served = restarted.get()
+        assert restarted.sync_in_background(lambda: db['version'], loader, on_change=lambda: purged.append(1))
+        restarted._sync_thread.join()
+        assert restarted.get() is not served
+        assert restarted.faq_version == '5' and purged == [1]
+
+        throttled = new_engine(sync_seconds=3600)
+        db['version'] = 6
+        assert throttled.sync(lambda: db['version'], loader)
+        db['version'] = 7
+        assert not throttled.sync(lambda: db['version'], loader)
+        assert not throttled.sync_in_background(lambda: db['version'], loader)
+    finally:
+        if not tmp_path:
+            for path in (snapshot_file, training_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+if __name__ == "__main__":
+    test_numpy_scores_match_python()
+    test_numpy_best_match_matches_python()
+    test_trigram_mode_matches_exact_questions()
+    test_numpy_matrix_survives_single_edits()
+    test_incremental_updates_match_full_retrain()
+    test_store_matching_ignores_db_order()
+    test_match_batch_agrees_with_single_queries()
+    test_match_batch_keys_shared_work_on_all_features()
+    test_rank_matches_single_pass_matches_full_sort()
+    test_snapshot_round_trip()
+    test_snapshot_keeps_non_integer_keys()
+    test_cache_stats_count_hits_and_misses()
+    test_caches_survive_retrain_and_fork()
+    test_fork_is_copy_on_write()
+    test_engine_batches_file_writes()
+    test_engine_swaps_copies_without_touching_readers()
+    test_engine_sync_picks_up_database_changes()
+    print("✅ Scoring backend tests passed")
@@ -0,0 +1,120 @@
+"""
+Test script for Gemini prompt building and token accounting
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import google.generativeai as genai
+
+import gemini_service
+from gemini_service import GeminiService, TokenUsage, TOKEN_USAGE
+from llm_guard import GeminiGuard
+from prompt_templates import topics_for, SMART_EXAMPLES
+
+
+class FakeUsage:
+    prompt_token_count = 420
+    candidates_token_count = 90
+    cached_content_token_count = 0
+
+
+class FakeResponse:
+    text = "Haul ialah tempoh genap setahun memegang harta sebelum zakat wajib dikira. 😊"
+    usage_metadata = FakeUsage()
+
+
+class FakeModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.prompts.append(prompt)
+        return FakeResponse()
+
+
+def test_topics_come_from_question_and_category():
+    assert topics_for('Berapa zakat gaji saya?') == {'pendapatan'}
+    assert 'emas' in topics_for('Boleh ke tolak barang kemas yang dipakai?', 'Zakat Emas')
+    assert topics_for('zakat kripto macam mana') == set()
+
+
+def test_smart_prompt_keeps_only_relevant_examples():
+    service = GeminiService(model=FakeModel(), guard=GeminiGuard(rate_per_minute=0))
+    prompt = service._smart_prompt('Apa itu haul dalam zakat?')
+
+    haul_example = dict(SMART_EXAMPLES)['haul'].strip()
+    saham_example = dict(SMART_EXAMPLES)['saham'].strip()
+    assert haul_example in prompt
+    assert saham_example not in prompt
+    # The fixed rules travel as the system instruction, not in every prompt
+    assert service.smart_context not in prompt
+
+
+def test_injected_model_gets_instruction_inline_and_usage_is_recorded():
+    model = FakeModel()
+    service = GeminiService(model=model, guard=GeminiGuard(rate_per_minute=0))
+    before = TOKEN_USAGE.stats()['modes'].get('smart', {}).get('calls', 0)
+
+    service.answer_zakat_question('Apa itu haul dalam zakat?')
+
+    assert model.prompts[0].startswith(service.smart_context)
+    smart = TOKEN_USAGE.stats()['modes']['smart']
+    assert smart['calls'] == before + 1
+    assert smart['input_tokens'] >= 420
+
+
+class FakeResolver:
+    model_name = 'gemini-1.5-flash'
+
+    def get(self):
+        return 'resolved-model'
+
+
+def _resolved_service():
+    service = GeminiService(model=FakeModel(), guard=GeminiGuard(rate_per_minute=0))
+    service._resolver = FakeResolver()
+    return service
+
+
+def test_installed_sdk_builds_models_with_system_instruction():
+    # Real GenerativeModel from the pinned SDK (construction needs no network)
+    assert gemini_service.SUPPORTS_SYSTEM_INSTRUCTION
+    service = _resolved_service()
+    model, inline = service._model_for(service.strict_context)
+    assert isinstance(model, genai.GenerativeModel)
+    assert not inline
+    assert service._model_for(service.strict_context)[0] is model
+
+
+def test_old_sdk_sends_instruction_inline():
+    service = _resolved_service()
+    saved = gemini_service.SUPPORTS_SYSTEM_INSTRUCTION
+    gemini_service.SUPPORTS_SYSTEM_INSTRUCTION = False
+    try:
+        assert service._model_for(service.strict_context) == ('resolved-model', True)
+    finally:
+        gemini_service.SUPPORTS_SYSTEM_INSTRUCTION = saved
+
+
+def test_token_usage_averages():
+    usage = TokenUsage()
+    usage.record('faq', FakeUsage())
+    usage.record('faq', FakeUsage())
+    usage.record('faq', None)
+    stats = usage.stats()
+    assert stats['modes']['faq']['calls'] == 2
+    assert stats['modes']['faq']['avg_input_tokens'] == 420
+    assert len(stats['recent']) == 2
+
+
+if __name__ == "__main__":
+    test_topics_come_from_question_and_category()
+    test_smart_prompt_keeps_only_relevant_examples()
+    test_injected_model_gets_instruction_inline_and_usage_is_recorded()
+    test_installed_sdk_builds_models_with_system_instruction()
+    test_old_sdk_sends_instruction_inline()
+    test_token_usage_averages()
+    print("✅ Prompt template tests passed")
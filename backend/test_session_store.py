@@ -0,0 +1,181 @@
+"""
+Test script for the bounded session context store
+Checks LRU, idle TTL and memory-ceiling eviction and the NLPProcessor wiring
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from session_store import InMemorySessionStore, RedisSessionStore, REDIS_AVAILABLE, redis
+from nlp_processor import NLPProcessor
+
+
+def entry(message):
+    return {'role': 'user', 'message': message, 'timestamp': '', 'keywords': []}
+
+
+class FakeRedis:
+    """The commands RedisSessionStore uses; no scan_iter/keys, so a keyspace scan fails."""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def rpush(self, key, value):
+        self.data.setdefault(key, []).append(value.encode('utf-8'))
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data[key][start:] if end == -1 else self.data[key][start:end + 1]
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def hincrby(self, key, field, amount):
+        fields = self.data.setdefault(key, {})
+        fields[field.encode('utf-8')] = fields.get(field.encode('utf-8'), 0) + amount
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def expire(self, key, seconds):
+        pass
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        self.data.get(key, {}).pop(member, None)
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.data.get(key, {})
+        for member in [m for m, score in members.items() if score <= high]:
+            del members[member]
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class FailingRedis:
+    """A Redis server that has gone away: every command raises a connection error."""
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def __getattr__(self, name):
+        def command(*args):
+            error = redis.ConnectionError if REDIS_AVAILABLE else ConnectionError
+            raise error("Error 111 connecting to localhost:6379. Connection refused.")
+        return command
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((getattr(self.client, name), args))
+
+    def execute(self):
+        return [method(*args) for method, args in self.calls]
+
+
+def test_lru_eviction_keeps_recent_sessions():
+    store = InMemorySessionStore(max_sessions=2)
+    store.append('a', entry('satu'))
+    store.append('b', entry('dua'))
+    store.history('a')  # touch a, so b is least recently used
+    store.append('c', entry('tiga'))
+
+    assert store.history('b') == []
+    assert [e['message'] for e in store.history('a')] == ['satu']
+    assert store.stats()['evictions']['lru'] == 1
+
+
+def test_idle_sessions_expire():
+    store = InMemorySessionStore(ttl_seconds=0.05)
+    store.append('a', entry('satu'), ['zakat'])
+    time.sleep(0.06)
+
+    assert store.keywords('a') == {}
+    assert len(store) == 0
+    assert store.stats()['evictions']['ttl'] == 1
+
+
+def test_memory_ceiling_and_history_limit():
+    store = InMemorySessionStore(max_bytes=4000, max_history=3)
+    for i in range(5):
+        store.append('a', entry(f'mesej {i}'))
+    assert [e['message'] for e in store.history('a')] == ['mesej 2', 'mesej 3', 'mesej 4']
+
+    for i in range(20):
+        store.append(f's{i}', entry('x' * 500))
+    stats = store.stats()
+    assert stats['approx_bytes'] <= 4000
+    assert stats['evictions']['memory'] > 0
+    assert store.history('s19')
+
+
+def test_processor_uses_store_for_context():
+    store = InMemorySessionStore()
+    nlp = NLPProcessor(enable_gemini=False, session_store=store)
+    nlp.add_to_context('s1', 'berapa nisab zakat emas', 'user')
+    nlp.add_to_context('s1', 'Nisab emas ialah 85 gram.', 'bot')
+
+    assert [e['role'] for e in nlp.get_conversation_history('s1')] == ['user', 'bot']
+    assert 'emas' in store.keywords('s1')
+    assert nlp.get_stats()['active_sessions'] == 1
+
+    nlp.clear_session_context('s1')
+    assert nlp.get_conversation_history('s1') == []
+
+
+def test_redis_store_counts_sessions_without_scanning():
+    client = FakeRedis()
+    store = RedisSessionStore(client, ttl_seconds=60)
+    store.append('s1', entry('berapa nisab'), ['nisab'])
+    store.append('s1', entry('zakat emas'), ['emas'])
+    store.append('s2', entry('zakat fitrah'))
+    assert len(store) == 2
+    assert [e['message'] for e in store.history('s1')] == ['berapa nisab', 'zakat emas']
+    assert store.keywords('s1') == {'nisab': 1, 'emas': 1}
+
+    store.clear('s2')
+    assert len(store) == 1 and store.history('s2') == []
+
+    # Sessions idle past the TTL drop out of the count
+    client.data[store.active_key]['s1'] -= 61
+    assert len(store) == 0
+
+
+def test_redis_outage_serves_requests_without_context():
+    store = RedisSessionStore(FailingRedis(), ttl_seconds=60)
+    store.append('s1', entry('berapa nisab'), ['nisab'])
+    assert store.history('s1') == []
+    assert store.keywords('s1') == {}
+    assert len(store) == 0
+    store.clear('s1')
+
+    nlp = NLPProcessor(enable_gemini=False, session_store=store)
+    nlp.add_to_context('s1', 'berapa nisab zakat emas', 'user')
+    assert nlp.get_conversation_history('s1') == []
+    assert nlp.get_stats()['active_sessions'] == 0
+
+
+if __name__ == "__main__":
+    test_lru_eviction_keeps_recent_sessions()
+    test_idle_sessions_expire()
+    test_memory_ceiling_and_history_limit()
+    test_processor_uses_store_for_context()
+    test_redis_store_counts_sessions_without_scanning()
+    test_redis_outage_serves_requests_without_context()
+    print("✅ Session store tests passed")
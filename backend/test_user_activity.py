@@ -0,0 +1,170 @@
+"""
+Test script for the session -> user cache and batched last_activity writes
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from user_activity import UserActivityTracker
+from database import DatabaseManager
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastrowid = None
+        self._result = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self.conn.statements.append(sql)
+        if sql.startswith("SELECT id_user FROM users"):
+            user_id = self.conn.users.get(params[0])
+            self._result = [(user_id,)] if user_id else []
+        elif sql.startswith("INSERT INTO users"):
+            self.lastrowid = len(self.conn.users) + 1
+            self.conn.users[params[0]] = self.lastrowid
+
+    def executemany(self, sql, rows):
+        self.conn.statements.append(" ".join(sql.split()))
+        self.conn.batches.append(list(rows))
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.users = {'lama': 7}
+        self.statements = []
+        self.batches = []
+        self.commits = 0
+
+    def is_connected(self):
+        return True
+
+    def ping(self, **kwargs):
+        pass
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def _manager(flush_seconds):
+    db = DatabaseManager.__new__(DatabaseManager)
+    db.connection = FakeConnection()
+    DatabaseManager._user_activity = UserActivityTracker(max_entries=100, flush_seconds=flush_seconds)
+    return db
+
+
+def test_lru_evicts_least_recently_used_session():
+    tracker = UserActivityTracker(max_entries=2, flush_seconds=60)
+    tracker.remember('a', 1)
+    tracker.remember('b', 2)
+    assert tracker.user_id('a') == 1
+    tracker.remember('c', 3)
+    assert tracker.user_id('b') is None
+    assert tracker.user_id('a') == 1 and tracker.user_id('c') == 3
+    assert tracker.stats()['evictions'] == 1
+
+
+def test_touches_are_coalesced_per_user():
+    tracker = UserActivityTracker(flush_seconds=60)
+    now = datetime.now()
+    tracker.touch(1, now)
+    tracker.touch(1, now + timedelta(seconds=5))
+    tracker.touch(1, now - timedelta(seconds=5))
+    tracker.touch(2, now)
+    assert tracker.take_pending() == []
+    rows = tracker.take_pending(force=True)
+    assert sorted(rows, key=lambda row: row[1]) == [(now + timedelta(seconds=5), 1), (now, 2)]
+    assert tracker.take_pending(force=True) == []
+
+    tracker.restore(rows)
+    assert tracker.stats()['pending_users'] == 2
+
+
+def test_known_session_skips_the_users_table():
+    db = _manager(flush_seconds=60)
+    for _ in range(5):
+        assert db.get_or_create_user('lama') == 7
+    assert db.connection.statements == ["SELECT id_user FROM users WHERE session_id = %s"]
+
+    assert db.flush_user_activity(force=True)
+    assert len(db.connection.batches) == 1
+    assert [user_id for _, user_id in db.connection.batches[0]] == [7]
+
+
+def test_request_path_never_flushes():
+    db = _manager(flush_seconds=60)
+    db.get_or_create_user('lama')
+    # The interval has passed: the flusher thread writes it, not the request
+    DatabaseManager._user_activity._last_flush -= 61
+    db.get_or_create_user('lama')
+    assert db.connection.batches == []
+    assert DatabaseManager._user_activity.stats()['pending_users'] == 1
+
+
+def test_new_user_is_cached():
+    db = _manager(flush_seconds=60)
+    user_id = db.get_or_create_user('baru')
+    assert db.get_or_create_user('baru') == user_id
+    assert sum(s.startswith("INSERT INTO users") for s in db.connection.statements) == 1
+
+
+def test_zero_interval_writes_every_time():
+    db = _manager(flush_seconds=0)
+    db.get_or_create_user('lama')
+    db.get_or_create_user('lama')
+    assert len(db.connection.batches) == 2
+
+
+def test_flusher_writes_activity_of_quiet_sessions():
+    tracker = UserActivityTracker(flush_seconds=0.05)
+    written = []
+    calls = []
+
+    def flush():
+        calls.append(1)
+        written.extend(tracker.take_pending())
+
+    assert tracker.start_flusher(flush)
+    assert not tracker.start_flusher(flush)
+    try:
+        time.sleep(0.2)
+        # Nothing pending: the flusher does not touch the database
+        assert calls == []
+        tracker.touch(7)
+        deadline = time.monotonic() + 2
+        while not written and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [user_id for _, user_id in written] == [7]
+        assert tracker.stats()['flusher_running'] is True
+    finally:
+        tracker.stop_flusher()
+    assert tracker.stats()['flusher_running'] is False
+    assert not UserActivityTracker(flush_seconds=0).start_flusher(flush)
+
+
+if __name__ == "__main__":
+    test_lru_evicts_least_recently_used_session()
+    test_touches_are_coalesced_per_user()
+    test_known_session_skips_the_users_table()
+    test_request_path_never_flushes()
+    test_new_user_is_cached()
+    test_zero_interval_writes_every_time()
+    test_flusher_writes_activity_of_quiet_sessions()
+    print("✅ User activity tests passed")
@@ -6,13 +6,13 @@ This script trains the NLP model with FAQ data and tests its performance
 
 import sys
 from database import DatabaseManager
-from nlp_processor import EnhancedNLPProcessor
+from nlp_processor import NLPProcessor
 import json
 
 class ChatbotTrainer:
     def __init__(self):
         self.db = DatabaseManager()
-        self.nlp = EnhancedNLPProcessor()
+        self.nlp = NLPProcessor(enable_gemini=False)
         self.test_results = []
         
     def load_faq_data(self):
@@ -121,21 +121,25 @@ class ChatbotTrainer:
         ]
         
         self.test_results = []
+        answers = {faq['question']: faq['answer'] for faq in faqs}
         
-        for i, test_input in enumerate(test_cases, 1):
-            response = self.nlp.generate_response(test_input, faqs)
+        # One batch call instead of a generate_response() per test case
+        for i, result in enumerate(self.nlp.match_batch(test_cases, top_k=1), 1):
+            best = result['matches'][0] if result['matches'] else None
+            confidence = result['confidence']
+            matched = best['question'] if best and confidence >= 0.35 else None
             
             self.test_results.append({
-                'input': test_input,
-                'matched': response.get('matched_question'),
-                'confidence': response.get('confidence', 0),
-                'confidence_level': response.get('confidence_level', 'none')
+                'input': result['question'],
+                'matched': matched,
+                'confidence': confidence,
+                'confidence_level': self.nlp.confidence_level(confidence) if matched else 'none'
             })
             
-            print(f"Test {i}: {test_input}")
-            print(f"  ├─ Matched: {response.get('matched_question', 'No match')}")
-            print(f"  ├─ Confidence: {response.get('confidence', 0):.2f} ({response.get('confidence_level', 'none')})")
-            print(f"  └─ Answer: {response['reply'][:80]}...")
+            print(f"Test {i}: {result['question']}")
+            print(f"  ├─ Matched: {matched or 'No match'}")
+            print(f"  ├─ Confidence: {confidence:.2f} ({self.test_results[-1]['confidence_level']})")
+            print(f"  └─ Answer: {answers.get(matched, '')[:80]}...")
             print()
     
     def generate_performance_report(self):
@@ -212,7 +216,7 @@ class ChatbotTrainer:
         print("=" * 60)
         print("\n📋 Next Steps:")
         print("1. Review the test_report.json file")
-        print("2. Update app.py to use EnhancedNLPProcessor")
+        print("2. Evaluate more questions via POST /admin/nlp/match-batch")
         print("3. Test the chatbot with real users")
         print("4. Collect feedback and retrain as needed")
         
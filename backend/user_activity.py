@@ -0,0 +1,145 @@
+"""
+Session -> user id cache with coalesced last_activity updates
+Every logged message used to look its session up in `users` and bump
+last_activity with its own commit. The database managers now keep the
+session_id -> id_user mapping here (LRU, session ids never move to another
+user) and only record when a user was last seen. The recorded times are
+written in one batch per USER_ACTIVITY_FLUSH_SECONDS by a daemon thread
+(start_flusher) and at exit, so a chatty session costs one UPDATE per
+interval instead of one per message, and requests never wait for the write.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000'))
+# 0 writes last_activity on every call, as before
+USER_ACTIVITY_FLUSH_SECONDS = float(os.getenv('USER_ACTIVITY_FLUSH_SECONDS', '60'))
+
+
+class UserActivityTracker:
+    def __init__(self, max_entries: int = USER_CACHE_MAX_ENTRIES,
+                 flush_seconds: float = USER_ACTIVITY_FLUSH_SECONDS):
+        self.max_entries = max_entries
+        self.flush_seconds = flush_seconds
+        # session_id -> user id, least recently used first
+        self._users: "OrderedDict[str, int]" = OrderedDict()
+        # user id -> latest activity not yet written
+        self._pending: Dict[int, datetime] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._stopping = threading.Event()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'touches': 0, 'flushes': 0, 'flushed_users': 0}
+
+    def user_id(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            user_id = self._users.get(session_id)
+            if user_id is None:
+                self._stats['misses'] += 1
+                return None
+            self._users.move_to_end(session_id)
+            self._stats['hits'] += 1
+            return user_id
+
+    def remember(self, session_id: str, user_id: int):
+        if not session_id or user_id is None:
+            return
+        with self._lock:
+            self._users[session_id] = user_id
+            self._users.move_to_end(session_id)
+            while len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def touch(self, user_id: int, when: datetime = None):
+        """Record activity for user_id; written by the next flush."""
+        when = when or datetime.now()
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or when > previous:
+                self._pending[user_id] = when
+            self._stats['touches'] += 1
+
+    def take_pending(self, force: bool = False) -> List[Tuple[datetime, int]]:
+        """(last_activity, user id) rows to write now, or [] if the flush interval has not passed."""
+        with self._lock:
+            if not self._pending:
+                return []
+            if not force and time.monotonic() - self._last_flush < self.flush_seconds:
+                return []
+            rows = [(when, user_id) for user_id, when in self._pending.items()]
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+            return rows
+
+    def flushed(self, rows: List[Tuple[datetime, int]]):
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['flushed_users'] += len(rows)
+
+    def restore(self, rows: List[Tuple[datetime, int]]):
+        """Put back rows whose write failed, keeping any newer activity seen since."""
+        with self._lock:
+            for when, user_id in rows:
+                previous = self._pending.get(user_id)
+                if previous is None or when > previous:
+                    self._pending[user_id] = when
+
+    @property
+    def write_through(self) -> bool:
+        """flush_seconds 0: there is no flusher thread, so callers write each touch themselves."""
+        return self.flush_seconds <= 0
+
+    def start_flusher(self, flush: Callable[[], object]) -> bool:
+        """Call flush() every flush_seconds on a daemon thread while activity is pending.
+
+        This is what writes request activity (get_or_create_user only records it).
+        Started once per tracker; False if already running or flush_seconds is 0.
+        """
+        if self.flush_seconds <= 0:
+            return False
+        with self._lock:
+            if self._flusher is not None:
+                return False
+            self._stopping.clear()
+            self._flusher = threading.Thread(target=self._run_flusher, args=(flush,),
+                                             name='user-activity-flusher', daemon=True)
+            self._flusher.start()
+            return True
+
+    def stop_flusher(self, timeout: float = 5.0):
+        with self._lock:
+            flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            self._stopping.set()
+            flusher.join(timeout)
+
+    def _run_flusher(self, flush: Callable[[], object]):
+        while not self._stopping.wait(self.flush_seconds):
+            with self._lock:
+                idle = not self._pending
+            if idle:
+                continue
+            try:
+                flush()
+            except Exception as e:
+                print(f"⚠️ User activity flush error: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._pending.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats,
+                        cached_sessions=len(self._users),
+                        pending_users=len(self._pending),
+                        max_entries=self.max_entries,
+                        flush_seconds=self.flush_seconds,
+                        flusher_running=self._flusher is not None and self._flusher.is_alive())